@@ -0,0 +1,189 @@
+"""
+Admin list definitions for Future Mech
+Each admin list (users, bookings, orders, ...) is described once here and
+served both by the HTML management pages and the /api/admin/* JSON endpoints.
+"""
+
+from datetime import timedelta
+
+from pagination import fetch_page, parse_page_size, parse_date
+
+
+class AdminList:
+    """Column map, sort key and filters for one keyset-paginated admin list"""
+
+    def __init__(self, columns, from_sql, sort_keys, filters, descending=True):
+        self.columns = columns
+        self.from_sql = from_sql
+        self.sort_keys = sort_keys
+        self.filters = filters
+        self.descending = descending
+
+    def select_sql(self, fields=None):
+        """SELECT clause for the requested fields (always including the sort key)"""
+        names = [name for name in self.columns if fields is None or name in fields]
+        for _, row_key in self.sort_keys:
+            if row_key not in names:
+                names.append(row_key)
+        select = ', '.join(f'{self.columns[name]} AS {name}' for name in names)
+        return f'SELECT {select} FROM {self.from_sql}'
+
+    def parse_fields(self, value):
+        """Known column names from a comma-separated ?fields= value, or None for all"""
+        if not value:
+            return None
+        fields = [name for name in value.split(',') if name in self.columns]
+        return fields or None
+
+    def fetch(self, cur, args, fields=None):
+        conditions, params = [], []
+        self.filters(args, conditions, params)
+        return fetch_page(cur, self.select_sql(fields), self.sort_keys, conditions, params,
+                          cursor=args.get('cursor'), page_size=parse_page_size(args.get('per_page')),
+                          descending=self.descending)
+
+
+def add_date_range(args, conditions, params, column):
+    """Add sargable date_from/date_to filters on a timestamp column"""
+    date_from = parse_date(args.get('date_from'))
+    date_to = parse_date(args.get('date_to'))
+    if date_from:
+        conditions.append(f"{column} >= %s")
+        params.append(date_from)
+    if date_to:
+        conditions.append(f"{column} < %s")
+        params.append(date_to + timedelta(days=1))
+
+
+def add_status(args, conditions, params, column, allowed, arg='status'):
+    value = args.get(arg)
+    if value in allowed:
+        conditions.append(f"{column} = %s")
+        params.append(value)
+
+
+def add_active(args, conditions, params, column='is_active'):
+    value = args.get('status')
+    if value in ('active', 'inactive'):
+        conditions.append(f"{column} = %s")
+        params.append(value == 'active')
+
+
+def _user_filters(args, conditions, params):
+    add_status(args, conditions, params, 'role', ('client', 'service', 'admin'), arg='role')
+    add_active(args, conditions, params)
+    add_date_range(args, conditions, params, 'created_at')
+
+
+def _service_filters(args, conditions, params):
+    add_active(args, conditions, params)
+    if args.get('service_type'):
+        conditions.append("service_type = %s")
+        params.append(args.get('service_type'))
+
+
+def _car_part_filters(args, conditions, params):
+    if args.get('category'):
+        conditions.append("category = %s")
+        params.append(args.get('category'))
+    add_active(args, conditions, params)
+    stock = args.get('stock')
+    if stock == 'low':
+        conditions.append("stock < 10")
+    elif stock == 'out':
+        conditions.append("stock <= 0")
+
+
+def _booking_filters(args, conditions, params):
+    add_status(args, conditions, params, 'b.status',
+               ('pending', 'confirmed', 'in_progress', 'completed', 'cancelled'))
+    assigned_to = args.get('assigned_to', type=int)
+    if assigned_to:
+        conditions.append("b.assigned_to = %s")
+        params.append(assigned_to)
+    add_date_range(args, conditions, params, 'b.created_at')
+
+
+def _order_filters(args, conditions, params):
+    add_status(args, conditions, params, 'o.payment_status', ('pending', 'paid', 'failed', 'refunded'))
+    add_status(args, conditions, params, 'o.shipping_status',
+               ('pending', 'shipped', 'delivered', 'cancelled'), arg='shipping_status')
+    add_date_range(args, conditions, params, 'o.created_at')
+
+
+def _discount_filters(args, conditions, params):
+    add_active(args, conditions, params)
+    add_status(args, conditions, params, 'discount_type', ('percentage', 'fixed'), arg='type')
+    add_date_range(args, conditions, params, 'created_at')
+
+
+ADMIN_LISTS = {
+    'users': AdminList(
+        columns={
+            'id': 'id', 'username': 'username', 'email': 'email', 'phone': 'phone',
+            'role': 'role', 'is_active': 'is_active', 'created_at': 'created_at',
+        },
+        from_sql='users',
+        sort_keys=[('created_at', 'created_at'), ('id', 'id')],
+        filters=_user_filters,
+    ),
+    'services': AdminList(
+        columns={
+            'id': 'id', 'name': 'name', 'description': 'description', 'price': 'price',
+            'duration': 'duration', 'service_type': 'service_type', 'is_active': 'is_active',
+            'is_featured': 'is_featured', 'image_url': 'image_url',
+        },
+        from_sql='services',
+        sort_keys=[('name', 'name'), ('id', 'id')],
+        filters=_service_filters,
+        descending=False,
+    ),
+    'car_parts': AdminList(
+        columns={
+            'id': 'id', 'name': 'name', 'description': 'description', 'price': 'price',
+            'stock': 'stock', 'category': 'category', 'brand': 'brand', 'part_number': 'part_number',
+            'image_url': 'image_url', 'is_active': 'is_active',
+        },
+        from_sql='car_parts',
+        sort_keys=[('name', 'name'), ('id', 'id')],
+        filters=_car_part_filters,
+        descending=False,
+    ),
+    'bookings': AdminList(
+        columns={
+            'id': 'b.id', 'status': 'b.status', 'scheduled_date': 'b.scheduled_date',
+            'total_amount': 'b.total_amount', 'created_at': 'b.created_at',
+            'client_name': 'u.username', 'phone': 'u.phone', 'service_name': 's.name', 'price': 's.price',
+            'registration_no': 'v.registration_no', 'model': 'v.model', 'service_person': 'sp.username',
+        },
+        from_sql="""bookings b
+            JOIN users u ON b.user_id = u.id
+            JOIN services s ON b.service_id = s.id
+            LEFT JOIN vehicles v ON b.vehicle_id = v.id
+            LEFT JOIN users sp ON b.assigned_to = sp.id""",
+        sort_keys=[('b.created_at', 'created_at'), ('b.id', 'id')],
+        filters=_booking_filters,
+    ),
+    'orders': AdminList(
+        columns={
+            'id': 'o.id', 'total_price': 'o.total_price', 'discount_amount': 'o.discount_amount',
+            'payment_status': 'o.payment_status', 'shipping_status': 'o.shipping_status',
+            'created_at': 'o.created_at', 'username': 'u.username',
+            'item_count': '(SELECT COUNT(*) FROM order_items oi WHERE oi.order_id = o.id)',
+        },
+        from_sql="""orders o
+            JOIN users u ON o.user_id = u.id""",
+        sort_keys=[('o.created_at', 'created_at'), ('o.id', 'id')],
+        filters=_order_filters,
+    ),
+    'discounts': AdminList(
+        columns={
+            'id': 'id', 'code': 'code', 'discount_type': 'discount_type', 'value': 'value',
+            'min_order_value': 'min_order_value', 'usage_limit': 'usage_limit', 'used_count': 'used_count',
+            'expiry_date': 'expiry_date', 'is_active': 'is_active', 'created_at': 'created_at',
+        },
+        from_sql='discounts',
+        sort_keys=[('created_at', 'created_at'), ('id', 'id')],
+        filters=_discount_filters,
+    ),
+}
@@ -0,0 +1,198 @@
+"""
+Admin analytics for Future Mech
+Time-bucketed revenue, booking and new-customer series for the admin charts.
+
+Series are read from two incrementally maintained rollups, never from the
+raw orders/bookings/users tables:
+- daily_revenue  (paid order revenue per day, see stats.record_paid_order)
+- daily_metrics  (per-day counters bumped as bookings and customers are created)
+so a chart costs one range scan over at most a year of daily rows.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+
+# period -> (days covered, default bucket)
+PERIODS = {
+    '7d': (7, 'day'),
+    '30d': (30, 'day'),
+    '90d': (90, 'week'),
+    '12m': (365, 'month'),
+}
+DEFAULT_PERIOD = '30d'
+BUCKETS = ('day', 'week', 'month')
+TOP_SERVICES = 8
+
+
+def bump_daily_metric(cur, metric, amount=1, dimension=''):
+    """Add ``amount`` to today's counter; runs on the caller's cursor so it commits with the write"""
+    cur.execute("""
+        INSERT INTO daily_metrics (day, metric, dimension, value)
+        VALUES (CURDATE(), %s, %s, %s)
+        ON DUPLICATE KEY UPDATE value = value + VALUES(value)
+    """, (metric, str(dimension), amount))
+
+
+def rebuild_daily_metrics(conn, since=None):
+    """Recompute daily_metrics from bookings and users, optionally only from ``since`` onwards
+
+    Returns the number of rows written.
+    """
+    since_sql = " AND created_at >= %s" if since else ""
+    since_params = (since,) if since else ()
+    cur = conn.cursor()
+    try:
+        if since:
+            cur.execute("DELETE FROM daily_metrics WHERE day >= %s", (since,))
+        else:
+            cur.execute("DELETE FROM daily_metrics")
+        written = 0
+        for sql in (
+            """SELECT DATE(created_at), 'bookings', '', COUNT(*)
+               FROM bookings WHERE 1 = 1{since}
+               GROUP BY DATE(created_at)""",
+            """SELECT DATE(created_at), 'service_bookings', service_id, COUNT(*)
+               FROM bookings WHERE 1 = 1{since}
+               GROUP BY DATE(created_at), service_id""",
+            """SELECT DATE(created_at), 'new_customers', '', COUNT(*)
+               FROM users WHERE role = 'client'{since}
+               GROUP BY DATE(created_at)""",
+        ):
+            cur.execute("INSERT INTO daily_metrics (day, metric, dimension, value) "
+                        + sql.format(since=since_sql), since_params)
+            written += cur.rowcount
+        conn.commit()
+        return written
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def bucket_start(day, bucket):
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def bucket_starts(first, last, bucket):
+    """Every bucket start from the bucket containing ``first`` up to ``last``"""
+    starts = []
+    current = bucket_start(first, bucket)
+    while current <= last:
+        starts.append(current)
+        if bucket == 'month':
+            current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+        elif bucket == 'week':
+            current += timedelta(days=7)
+        else:
+            current += timedelta(days=1)
+    return starts
+
+
+def bucket_label(start, bucket):
+    if bucket == 'month':
+        return start.strftime('%b %Y')
+    return start.strftime('%b %d')
+
+
+def load_daily_rows(conn, days):
+    """Read the last ``days`` days of both rollups plus service names and today's date"""
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT CURDATE() AS today")
+        today = cur.fetchone()['today']
+        since = today - timedelta(days=days - 1)
+
+        cur.execute("SELECT day, paid_revenue FROM daily_revenue WHERE day >= %s", (since,))
+        revenue = {row['day']: float(row['paid_revenue']) for row in cur.fetchall()}
+
+        cur.execute("SELECT day, metric, dimension, value FROM daily_metrics WHERE day >= %s", (since,))
+        metrics = defaultdict(lambda: defaultdict(dict))
+        for row in cur.fetchall():
+            metrics[row['metric']][row['dimension']][row['day']] = float(row['value'])
+
+        cur.execute("SELECT id, name FROM services")
+        service_names = {str(row['id']): row['name'] for row in cur.fetchall()}
+    finally:
+        cur.close()
+    return today, revenue, metrics, service_names
+
+
+def build_series(today, revenue, metrics, service_names, days, bucket):
+    """Chart payload for one period/bucket from already loaded daily rows"""
+    first = today - timedelta(days=days - 1)
+    starts = bucket_starts(first, today, bucket)
+    index = {start: i for i, start in enumerate(starts)}
+
+    def bucketed(daily):
+        values = [0] * len(starts)
+        for day, value in daily.items():
+            if first <= day <= today:
+                values[index[bucket_start(day, bucket)]] += value
+        return values
+
+    service_totals = []
+    for service_id, daily in metrics.get('service_bookings', {}).items():
+        total = sum(value for day, value in daily.items() if first <= day <= today)
+        if total:
+            service_totals.append((total, service_names.get(service_id, f'Service #{service_id}')))
+    service_totals.sort(reverse=True)
+    service_totals = service_totals[:TOP_SERVICES]
+
+    labels = [bucket_label(start, bucket) for start in starts]
+    return {
+        'bucket': bucket,
+        'revenue': {'labels': labels, 'data': [round(value, 2) for value in bucketed(revenue)]},
+        'booking_trend': {'labels': labels, 'data': [int(v) for v in bucketed(metrics.get('bookings', {}).get('', {}))]},
+        'customers': {'labels': labels, 'data': [int(v) for v in bucketed(metrics.get('new_customers', {}).get('', {}))]},
+        'services': {
+            'labels': [name for _, name in service_totals],
+            'data': [int(total) for total, _ in service_totals]
+        },
+    }
+
+
+class AnalyticsCache:
+    """Per-process cache of chart payloads
+
+    On a miss every common period is built from a single read of the longest
+    window, so switching periods in the dashboard is served from memory.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._payloads = {}
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def precompute(self, conn, extra=()):
+        """Build every common period (plus any ``extra`` (period, bucket) pairs) in one pass"""
+        keys = [(period, default) for period, (_, default) in PERIODS.items()]
+        keys.extend(key for key in extra if key not in keys)
+        longest = max(PERIODS[period][0] for period, _ in keys)
+        today, revenue, metrics, service_names = load_daily_rows(conn, longest)
+        return {
+            (period, bucket): build_series(today, revenue, metrics, service_names, PERIODS[period][0], bucket)
+            for period, bucket in keys
+        }
+
+    def get(self, conn_factory, period, bucket):
+        key = (period, bucket)
+        if time.monotonic() < self._expires_at and key in self._payloads:
+            return self._payloads[key]
+        with self._lock:
+            if not (time.monotonic() < self._expires_at and key in self._payloads):
+                self._payloads = self.precompute(conn_factory(), extra=[key])
+                self._expires_at = time.monotonic() + self.ttl
+            return self._payloads[key]
+
+    def invalidate(self):
+        with self._lock:
+            self._expires_at = 0.0
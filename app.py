@@ -1,29 +1,33 @@
 import os
 import logging
-import uuid
 from logging.handlers import RotatingFileHandler
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_file
-from flask_mysqldb import MySQL
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, session, jsonify
+from database import MySQLPool
+from assets import StaticAssets, build_assets
+from stats import SnapshotCache, load_admin_stats, record_paid_order, rebuild_daily_revenue
+from admin_lists import ADMIN_LISTS
+from responses import json_response, file_response
+from analytics import AnalyticsCache, PERIODS, DEFAULT_PERIOD, BUCKETS, bump_daily_metric, rebuild_daily_metrics
+from inventory import InsufficientStock, set_reservation, convert_reservations, start_reservation_sweeper
+from mailer import enqueue_email, run_outbox_worker
+from events import EventBroker, publish_event, prune_events
+from changes import bump_version, booking_rows, dashboard_changes
+from search import CatalogSearch, fulltext_search
+from catalog_cache import CatalogCache
+from notifications import record_notification, unread_notifications, unread_count, mark_read, rebuild_notification_counts, rebuild_notification_read_state
+from images import ImagePipeline, manifest_path
+from image_store import store_upload, attach_image, detach_image, collect_image, collect_orphaned_images, adopt_legacy_images
+from reports import ReportJobQueue, BOOKING_QUERY as REPORT_BOOKING_QUERY, evict_stale_reports, generate_report_batch
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from functools import wraps
 import stripe
+import click
 import json
-from datetime import datetime, timedelta
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
+from datetime import datetime, date, timedelta
 from itsdangerous import URLSafeTimedSerializer
 import secrets
 import string
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT
-import io
 import math
 from config import Config
 import requests
@@ -37,8 +41,42 @@ load_dotenv()  # Load environment variables from .env file
 app = Flask(__name__)
 app.config.from_object(Config)
 
-# Initialize MySQL
-mysql = MySQL(app)
+# Fingerprinted, long-cached static assets
+assets = StaticAssets(app)
+
+# Initialize MySQL (pooled connections, borrowed per request)
+mysql = MySQLPool(app)
+
+# Release expired cart holds back into stock in the background
+if app.config['RESERVATION_SWEEPER_ENABLED']:
+    start_reservation_sweeper(mysql, app.config['RESERVATION_SWEEP_INTERVAL'], app.logger)
+
+# Admin dashboard counters, shared by every admin hitting this worker
+admin_stats_cache = SnapshotCache(app.config['ADMIN_STATS_TTL'])
+analytics_cache = AnalyticsCache(app.config['ANALYTICS_TTL'])
+
+# PDI reports are rendered in a process pool, off the request thread
+report_jobs = ReportJobQueue(mysql, app.config['REPORT_WORKERS'], app.config['REPORTS_DIR'], app.logger)
+
+# Uploaded images are resized into WebP/JPEG derivatives in a process pool
+image_pipeline = ImagePipeline(app.static_folder, app.config['IMAGE_WORKERS'], app.logger)
+
+# Notifications and booking changes pushed to open /api/events streams
+event_broker = EventBroker(
+    mysql,
+    poll_interval=app.config['EVENTS_POLL_INTERVAL'],
+    max_subscribers=app.config['EVENTS_MAX_SUBSCRIBERS'],
+    heartbeat=app.config['EVENTS_HEARTBEAT'],
+    max_stream_age=app.config['EVENTS_STREAM_MAX_AGE'],
+    logger=app.logger,
+)
+
+# Car parts search index, kept in step with the catalog through change versions
+catalog_search = CatalogSearch(app.config['SEARCH_SYNC_INTERVAL'], app.config['SEARCH_REBUILD_INTERVAL'], app.logger)
+
+# Services and car parts as the public pages show them, cleared by the admin catalog APIs
+catalog_cache = CatalogCache(app.config['CATALOG_CACHE_TTL'], app.config['CATALOG_CACHE_SIZE'],
+                             app.config['CATALOG_CACHE_DIR'], app.logger)
 
 # Initialize Stripe
 stripe.api_key = app.config['STRIPE_SECRET_KEY']
@@ -72,12 +110,14 @@ app.logger.setLevel(logging.INFO)
 app.logger.info('Future Mech startup')
 
 # Create directories if they don't exist
-for directory in ['logs', 'reports', 'static/images', 'static/uploads', 'static/uploads/services', 'static/uploads/car_parts', 'static/uploads/avatars']:
+for directory in ['logs', app.config['REPORTS_DIR'], 'static/images', 'static/uploads', 'static/uploads/services', 'static/uploads/car_parts', 'static/uploads/avatars']:
     os.makedirs(directory, exist_ok=True)
+if app.config['CATALOG_CACHE_DIR']:
+    os.makedirs(app.config['CATALOG_CACHE_DIR'], exist_ok=True)
 
 # Helper functions
 def save_image(file, subfolder):
-    """Validate and save image, returns public URL or None"""
+    """Validate and store image under its content hash, returns public URL or None"""
     if not file or not getattr(file, 'filename', None):
         return None
     filename = secure_filename(file.filename)
@@ -87,37 +127,77 @@ def save_image(file, subfolder):
     allowed = {'.png', '.jpg', '.jpeg', '.gif', '.webp'}
     if ext not in allowed:
         return None
-    unique_name = f"{uuid.uuid4().hex}{ext}"
-    upload_dir = os.path.join('static', 'uploads', subfolder)
+    if ext == '.jpeg':
+        ext = '.jpg'
+    upload_dir = os.path.join(app.static_folder, 'uploads', subfolder)
     os.makedirs(upload_dir, exist_ok=True)
-    full_path = os.path.join(upload_dir, unique_name)
-    file.save(full_path)
-    return f"/static/uploads/{subfolder}/{unique_name}"
+    url, full_path, created = store_upload(mysql.connection, file.stream, upload_dir,
+                                           f"/static/uploads/{subfolder}", ext)
+    # Identical uploads share one file and its derivatives
+    if created or not os.path.exists(manifest_path(full_path)):
+        image_pipeline.submit(full_path)
+    return url
+
+def release_images(*urls):
+    """Delete stored images whose last reference has just been removed"""
+    for url in urls:
+        if not url:
+            continue
+        try:
+            if collect_image(mysql.connection, url, app.static_folder, app.config['IMAGE_GC_GRACE_MINUTES']):
+                image_pipeline.forget(url)
+        except Exception as e:
+            app.logger.error(f'Image cleanup error for {url}: {str(e)}')
+
+@app.template_global()
+def image_variant(url, size='card', ext='jpg'):
+    """URL of an uploaded image's derivative (the original until it is ready)"""
+    return image_pipeline.variant_url(url, size, ext)
+
+@app.template_global()
+def image_srcset(url, ext='webp'):
+    """srcset listing an uploaded image's derivatives ('' until they are ready)"""
+    return image_pipeline.srcset(url, ext)
+
+@app.template_global()
+def url_with_args(**overrides):
+    """Current URL with some query arguments replaced (None drops them)"""
+    args = request.args.to_dict()
+    args.update(overrides)
+    args = {key: value for key, value in args.items() if value is not None}
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+ACTIVE_SERVICES_QUERY = "SELECT * FROM services WHERE is_active = TRUE"
+ACTIVE_PARTS_QUERY = "SELECT * FROM car_parts WHERE is_active = TRUE"
+
+def catalog_rows(query, params=()):
+    """Rows of a services / car_parts query, read through the catalog cache"""
+    def load(conn):
+        cur = conn.cursor()
+        try:
+            cur.execute(query, params)
+            return cur.fetchall()
+        finally:
+            cur.close()
+    return catalog_cache.get((query, tuple(params)), lambda: mysql.connection, load)
+
+def load_parts(part_ids):
+    """Active car_parts rows for ``part_ids``, in that order (from the catalog cache)"""
+    by_id = catalog_cache.get('parts_by_id', lambda: mysql.connection,
+                              lambda conn: {part['id']: part for part in catalog_rows(ACTIVE_PARTS_QUERY)})
+    return [by_id[part_id] for part_id in part_ids if part_id in by_id]
 
-def send_email(to, subject, body, attachment=None):
-    """Send email with optional attachment"""
+def send_email(to, subject, body, attachment=None, cur=None):
+    """Queue an email for the outbox worker (on ``cur`` to commit with the caller's transaction)"""
     try:
-        if app.config.get('MAIL_SERVER') and app.config.get('MAIL_USERNAME'):
-            msg = MIMEMultipart()
-            msg['From'] = app.config['MAIL_DEFAULT_SENDER']
-            msg['To'] = to
-            msg['Subject'] = subject
-            msg.attach(MIMEText(body, 'html'))
-            
-            if attachment and os.path.exists(attachment):
-                with open(attachment, 'rb') as f:
-                    attach = MIMEApplication(f.read(), _subtype="pdf")
-                    attach.add_header('Content-Disposition', 'attachment', filename=os.path.basename(attachment))
-                    msg.attach(attach)
-            
-            server = smtplib.SMTP(app.config['MAIL_SERVER'], app.config['MAIL_PORT'])
-            server.starttls()
-            server.login(app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
-            server.send_message(msg)
-            server.quit()
+        if cur is not None:
+            enqueue_email(cur, to, subject, body, attachment)
+        else:
+            with mysql.transaction() as cur:
+                enqueue_email(cur, to, subject, body, attachment)
         return True
     except Exception as e:
-        app.logger.error(f'Email sending failed: {str(e)}')
+        app.logger.error(f'Email queueing failed: {str(e)}')
         return False
 
 def login_required(f):
@@ -150,72 +230,22 @@ def role_required(roles):
 def get_admin_stats():
     """Get comprehensive statistics for admin dashboard"""
     try:
-        cur = mysql.connection.cursor()
-        
-        # Total users by role
-        cur.execute("SELECT role, COUNT(*) as count FROM users WHERE is_active = TRUE GROUP BY role")
-        role_counts = {row['role']: row['count'] for row in cur.fetchall()}
-        
-        # Total bookings by status
-        cur.execute("SELECT status, COUNT(*) as count FROM bookings GROUP BY status")
-        booking_status = {row['status']: row['count'] for row in cur.fetchall()}
-        
-        # Total orders by payment status
-        cur.execute("SELECT payment_status, COUNT(*) as count FROM orders GROUP BY payment_status")
-        order_status = {row['payment_status']: row['count'] for row in cur.fetchall()}
-        
-        # Revenue statistics
-        cur.execute("SELECT COALESCE(SUM(total_price), 0) as total_revenue FROM orders WHERE payment_status = 'paid'")
-        total_revenue = float(cur.fetchone()['total_revenue'])
-        
-        cur.execute("""
-            SELECT COALESCE(SUM(total_price), 0) as monthly_revenue 
-            FROM orders 
-            WHERE payment_status = 'paid' AND created_at >= DATE_SUB(NOW(), INTERVAL 30 DAY)
-        """)
-        monthly_revenue = float(cur.fetchone()['monthly_revenue'])
-        
-        # Recent bookings (last 5)
-        cur.execute("""
-            SELECT b.*, u.username as customer_name, s.name as service_name 
-            FROM bookings b 
-            JOIN users u ON b.user_id = u.id 
-            JOIN services s ON b.service_id = s.id 
-            ORDER BY b.created_at DESC 
-            LIMIT 5
-        """)
-        recent_bookings = cur.fetchall()
-        
-        # Recent orders (last 5)
-        cur.execute("""
-            SELECT o.*, u.username as customer_name 
-            FROM orders o 
-            JOIN users u ON o.user_id = u.id 
-            ORDER BY o.created_at DESC 
-            LIMIT 5
-        """)
-        recent_orders = cur.fetchall()
-        
-        # Service person stats
-        cur.execute("SELECT COUNT(*) as count FROM users WHERE role = 'service' AND is_active = TRUE")
-        service_person_count = cur.fetchone()['count']
-        
-        cur.close()
+        stats = admin_stats_cache.get(lambda: load_admin_stats(mysql.connection))
         
         return {
-            'total_users': role_counts.get('client', 0),
-            'total_service_persons': service_person_count,
-            'total_admins': role_counts.get('admin', 0),
-            'total_bookings': sum(booking_status.values()),
-            'pending_bookings': booking_status.get('pending', 0),
-            'completed_bookings': booking_status.get('completed', 0),
-            'total_orders': sum(order_status.values()),
-            'pending_orders': order_status.get('pending', 0),
-            'paid_orders': order_status.get('paid', 0),
-            'total_revenue': total_revenue,
-            'monthly_revenue': monthly_revenue,
-            'recent_bookings': recent_bookings,
-            'recent_orders': recent_orders
+            'total_users': stats['active_clients'],
+            'total_service_persons': stats['active_service_persons'],
+            'total_admins': stats['active_admins'],
+            'total_bookings': stats['total_bookings'],
+            'pending_bookings': stats['pending_bookings'],
+            'completed_bookings': stats['completed_bookings'],
+            'total_orders': stats['total_orders'],
+            'pending_orders': stats['pending_orders'],
+            'paid_orders': stats['paid_orders'],
+            'total_revenue': stats['total_revenue'],
+            'monthly_revenue': stats['monthly_revenue'],
+            'recent_bookings': stats['recent_bookings'],
+            'recent_orders': stats['recent_orders']
         }
     except Exception as e:
         app.logger.error(f'Error getting admin stats: {str(e)}')
@@ -235,119 +265,6 @@ def get_admin_stats():
             'recent_orders': []
         }
 
-def generate_pdi_report(booking_id):
-    """Generate PDF report for PDI service"""
-    try:
-        cur = mysql.connection.cursor()
-        
-        # Get booking details
-        cur.execute("""
-            SELECT b.*, u.username, u.email, u.phone, s.name as service_name, s.price, s.description
-            FROM bookings b 
-            JOIN users u ON b.user_id = u.id 
-            JOIN services s ON b.service_id = s.id 
-            WHERE b.id = %s
-        """, (booking_id,))
-        booking = cur.fetchone()
-        
-        if not booking:
-            return None
-        
-        # Create PDF
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4)
-        story = []
-        styles = getSampleStyleSheet()
-        
-        # Title
-        title_style = ParagraphStyle(
-            'Title',
-            parent=styles['Heading1'],
-            fontSize=20,
-            textColor=colors.HexColor('#1e40af'),
-            spaceAfter=30,
-            alignment=TA_CENTER
-        )
-        
-        story.append(Paragraph("FUTURE MECH - SERVICE REPORT", title_style))
-        story.append(Spacer(1, 20))
-        
-        # Customer Information
-        customer_data = [
-            ['Customer Information', ''],
-            ['Name:', booking['username']],
-            ['Email:', booking['email']],
-            ['Phone:', booking['phone'] or 'N/A'],
-            ['Service Date:', booking['scheduled_date'].strftime('%B %d, %Y') if booking['scheduled_date'] else 'N/A'],
-            ['Report ID:', f'FM-{booking_id:06d}']
-        ]
-        
-        customer_table = Table(customer_data, colWidths=[2*inch, 4*inch])
-        customer_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e5e7eb')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1e40af')),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-            ('GRID', (0, 0), (-1, -1), 1, colors.grey)
-        ]))
-        story.append(customer_table)
-        story.append(Spacer(1, 20))
-        
-        # Service Details
-        service_data = [
-            ['Service Details', ''],
-            ['Service:', booking['service_name']],
-            ['Description:', booking['description']],
-            ['Price:', f"${booking['price']}"],
-            ['Status:', booking['status'].replace('_', ' ').title()],
-            ['Notes:', booking['notes'] or 'No additional notes']
-        ]
-        
-        service_table = Table(service_data, colWidths=[2*inch, 4*inch])
-        service_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e5e7eb')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1e40af')),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-            ('GRID', (0, 0), (-1, -1), 1, colors.grey)
-        ]))
-        story.append(service_table)
-        story.append(Spacer(1, 20))
-        
-        # Footer
-        footer_style = ParagraphStyle(
-            'Footer',
-            parent=styles['Normal'],
-            fontSize=10,
-            textColor=colors.HexColor('#6b7280'),
-            alignment=TA_CENTER
-        )
-        
-        story.append(Spacer(1, 30))
-        story.append(Paragraph("Thank you for choosing Future Mech!", footer_style))
-        story.append(Paragraph("Drive the Future with Precision and Power", footer_style))
-        story.append(Paragraph(f"Generated on: {datetime.now().strftime('%B %d, %Y at %I:%M %p')}", footer_style))
-        
-        # Build PDF
-        doc.build(story)
-        buffer.seek(0)
-        
-        # Save to file
-        filename = f"reports/PDI_Report_{booking_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        with open(filename, 'wb') as f:
-            f.write(buffer.getvalue())
-        
-        return filename
-    except Exception as e:
-        app.logger.error(f'Error generating PDI report: {str(e)}')
-        return None
-    finally:
-        cur.close()
-
 # =============================================================================
 # ROUTES - PUBLIC PAGES
 # =============================================================================
@@ -356,10 +273,7 @@ def generate_pdi_report(booking_id):
 def index():
     """Home page"""
     try:
-        cur = mysql.connection.cursor()
-        cur.execute("SELECT * FROM services WHERE is_active = TRUE LIMIT 6")
-        services = cur.fetchall()
-        cur.close()
+        services = catalog_rows(ACTIVE_SERVICES_QUERY)[:6]
         return render_template('home.html', services=services)
     except Exception as e:
         app.logger.error(f'Error loading home page: {str(e)}')
@@ -369,10 +283,7 @@ def index():
 def services():
     """Services page"""
     try:
-        cur = mysql.connection.cursor()
-        cur.execute("SELECT * FROM services WHERE is_active = TRUE")
-        services = cur.fetchall()
-        cur.close()
+        services = catalog_rows(ACTIVE_SERVICES_QUERY)
         return render_template('services.html', services=services)
     except Exception as e:
         app.logger.error(f'Error loading services: {str(e)}')
@@ -385,29 +296,52 @@ def car_parts():
     try:
         category = request.args.get('category', '')
         search = request.args.get('search', '')
+        vehicle = request.args.get('vehicle', '')
         
-        cur = mysql.connection.cursor()
-        query = "SELECT * FROM car_parts WHERE is_active = TRUE"
-        params = []
-        
-        if category:
-            query += " AND category = %s"
-            params.append(category)
+        # "Parts for my vehicle": one of the client's vehicles, or 'all' of them
+        vehicles, fitting = [], None
+        if session.get('role') == 'client':
+            cur = mysql.connection.cursor()
+            cur.execute("""
+                SELECT id, registration_no, make, model, year FROM vehicles
+                WHERE user_id = %s ORDER BY created_at DESC
+            """, (session['user_id'],))
+            vehicles = cur.fetchall()
+            cur.close()
+            if vehicle:
+                selected = vehicles if vehicle == 'all' else [v for v in vehicles if str(v['id']) == vehicle]
+                fitting = catalog_search.parts_for(lambda: mysql.connection, selected, category=category or None)
         
+        # Catalog rows come from the catalog cache, so a steady-state visitor costs no queries
+        limit = app.config['SEARCH_MAX_RESULTS']
         if search:
-            query += " AND (name LIKE %s OR description LIKE %s)"
-            params.extend([f'%{search}%', f'%{search}%'])
-        
-        cur.execute(query, params)
-        parts = cur.fetchall()
+            # Ranked ids from the search index, then the rows themselves by primary key
+            # (all matches when some are about to be dropped by the vehicle filter)
+            search_limit = limit if fitting is None else None
+            if app.config['SEARCH_INDEX_ENABLED']:
+                part_ids = catalog_search.search(lambda: mysql.connection, search, category=category or None,
+                                                 limit=search_limit)
+            else:
+                cur = mysql.connection.cursor()
+                part_ids = fulltext_search(cur, search, category=category or None, limit=search_limit)
+                cur.close()
+            if fitting is not None:
+                part_ids = [part_id for part_id in part_ids if part_id in fitting][:limit]
+            parts = load_parts(part_ids)
+        elif fitting is not None:
+            parts = load_parts(sorted(fitting)[:limit])
+        elif category:
+            parts = catalog_rows(ACTIVE_PARTS_QUERY + " AND category = %s", (category,))
+        else:
+            parts = catalog_rows(ACTIVE_PARTS_QUERY)
         
         # Get categories for filter
-        cur.execute("SELECT DISTINCT category FROM car_parts WHERE is_active = TRUE AND category IS NOT NULL")
-        categories = [cat['category'] for cat in cur.fetchall()]
+        categories = [cat['category'] for cat in catalog_rows(
+            "SELECT DISTINCT category FROM car_parts WHERE is_active = TRUE AND category IS NOT NULL")]
         
-        cur.close()
         return render_template('car_parts.html', parts=parts, categories=categories, 
-                             selected_category=category, search_term=search)
+                             selected_category=category, search_term=search,
+                             vehicles=vehicles, selected_vehicle=vehicle)
     except Exception as e:
         app.logger.error(f'Error loading car parts: {str(e)}')
         flash('Error loading car parts. Please try again.', 'danger')
@@ -518,9 +452,10 @@ def google_callback():
                 INSERT INTO users (username, email, password, role, is_active, email_verified, profile_image) 
                 VALUES (%s, %s, %s, %s, %s, %s, %s)
             """, (username, email, 'google_oauth', 'client', True, True, picture))
-            mysql.connection.commit()
-            
+            # Read before the metric upsert, which resets lastrowid
             new_user_id = cur.lastrowid
+            bump_daily_metric(cur, 'new_customers')
+            mysql.connection.commit()
             
             # Set session
             session['user_id'] = new_user_id
@@ -662,10 +597,9 @@ def register():
             cur = mysql.connection.cursor()
             cur.execute("INSERT INTO users (username, email, password, phone) VALUES (%s, %s, %s, %s)", 
                        (username, email, hashed_password, phone))
-            mysql.connection.commit()
-            cur.close()
+            bump_daily_metric(cur, 'new_customers')
             
-            # Send welcome email
+            # Queue the welcome email in the same commit as the account
             email_body = f"""
             <h2>Welcome to Future Mech!</h2>
             <p>Dear {username},</p>
@@ -674,7 +608,9 @@ def register():
             <br>
             <p>Best regards,<br>The Future Mech Team</p>
             """
-            send_email(email, 'Welcome to Future Mech!', email_body)
+            send_email(email, 'Welcome to Future Mech!', email_body, cur=cur)
+            mysql.connection.commit()
+            cur.close()
             
             flash('Registration successful! You can now log in.', 'success')
             return redirect(url_for('login'))
@@ -841,75 +777,26 @@ def admin_dashboard():
         return redirect(url_for('login'))
     
     try:
-        cur = mysql.connection.cursor()
-        
-        # Get total users count
-        cur.execute("SELECT COUNT(*) as count FROM users")
-        total_users = cur.fetchone()['count']
-        
-        # Get client count
-        cur.execute("SELECT COUNT(*) as count FROM users WHERE role = 'client'")
-        client_count = cur.fetchone()['count']
+        # All counters come from the shared, briefly cached stats snapshot
+        snapshot = admin_stats_cache.get(lambda: load_admin_stats(mysql.connection))
+        client_count = snapshot['all_clients']
+        service_count = snapshot['all_service_persons']
+        monthly_revenue = snapshot['revenue_this_month']
+        recent_bookings = snapshot['recent_bookings']
+        recent_orders = snapshot['recent_orders']
         
-        # Get service count
-        cur.execute("SELECT COUNT(*) as count FROM users WHERE role = 'service'")
-        service_count = cur.fetchone()['count']
-        
-        # Get total bookings count
-        cur.execute("SELECT COUNT(*) as count FROM bookings")
-        total_bookings = cur.fetchone()['count']
-        
-        # Get total orders count
-        cur.execute("SELECT COUNT(*) as count FROM orders")
-        total_orders = cur.fetchone()['count']
-        
-        # Get total revenue (all time)
-        cur.execute("SELECT COALESCE(SUM(total_price), 0) as revenue FROM orders")
-        total_revenue = cur.fetchone()['revenue']
-        
-        # Get monthly revenue
-        cur.execute("""
-            SELECT COALESCE(SUM(total_price), 0) as revenue 
-            FROM orders 
-            WHERE MONTH(created_at) = MONTH(CURRENT_DATE()) 
-            AND YEAR(created_at) = YEAR(CURRENT_DATE())
-        """)
-        monthly_revenue = cur.fetchone()['revenue']
-        
-        # Get recent bookings
-        cur.execute("""
-            SELECT b.*, u.username as customer_name, s.name as service_name 
-            FROM bookings b 
-            JOIN users u ON b.user_id = u.id 
-            JOIN services s ON b.service_id = s.id 
-            ORDER BY b.created_at DESC LIMIT 5
-        """)
-        recent_bookings = cur.fetchall()
-        
-        # Get recent orders
-        cur.execute("""
-            SELECT o.*, u.username as customer_name 
-            FROM orders o 
-            JOIN users u ON o.user_id = u.id 
-            ORDER BY o.created_at DESC LIMIT 5
-        """)
-        recent_orders = cur.fetchall()
-        
-        # Create stats object for the template (FIXED)
         stats = {
-            'total_users': total_users,
-            'total_bookings': total_bookings,
-            'total_orders': total_orders,
-            'total_revenue': total_revenue,
+            'total_users': snapshot['all_users'],
+            'total_bookings': snapshot['total_bookings'],
+            'total_orders': snapshot['total_orders'],
+            'total_revenue': snapshot['total_revenue'],
             'clients': client_count,
             'services': service_count,
             'revenue': monthly_revenue,
-            'bookings_today': 0,  # You can add this query
-            'pending_orders': 0   # You can add this query
+            'bookings_today': snapshot['bookings_today'],
+            'pending_orders': snapshot['pending_orders']
         }
         
-        cur.close()
-        
         return render_template('dashboard_admin.html',
                              client_count=client_count,
                              service_count=service_count,
@@ -980,24 +867,27 @@ def book_service(service_id):
             cur.close()
             return jsonify({'success': False, 'message': 'Service not found'}), 404
         
-        # Create booking
-        cur.execute("""
-            INSERT INTO bookings (user_id, service_id, vehicle_id, scheduled_date, notes, total_amount) 
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (session['user_id'], service_id, vehicle_id, scheduled_date, notes, service['price']))
-        mysql.connection.commit()
-        booking_id = cur.lastrowid
-        
-        # Create payment record
-        cur.execute("""
-            INSERT INTO payments (booking_id, amount, payment_method, status) 
-            VALUES (%s, %s, %s, %s)
-        """, (booking_id, service['price'], 'pending', 'pending'))
-        mysql.connection.commit()
         cur.close()
         
-        # Send confirmation email
-        try:
+        # Create booking and its payment record in a single transaction
+        with mysql.transaction() as cur:
+            cur.execute("""
+                INSERT INTO bookings (user_id, service_id, vehicle_id, scheduled_date, notes, total_amount) 
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, (session['user_id'], service_id, vehicle_id, scheduled_date, notes, service['price']))
+            booking_id = cur.lastrowid
+            
+            cur.execute("""
+                INSERT INTO payments (booking_id, amount, payment_method, status) 
+                VALUES (%s, %s, %s, %s)
+            """, (booking_id, service['price'], 'pending', 'pending'))
+            
+            bump_daily_metric(cur, 'bookings')
+            bump_daily_metric(cur, 'service_bookings', dimension=service_id)
+            publish_event(cur, 'booking_created', {'booking_id': booking_id, 'service_id': service_id,
+                                                   'scheduled_date': scheduled_date}, roles=['admin', 'service'])
+            
+            # Queue the confirmation email in the same commit as the booking
             email_body = f"""
             <h2>Booking Confirmation</h2>
             <p>Your booking for {service['name']} has been received.</p>
@@ -1006,9 +896,10 @@ def book_service(service_id):
             <p><strong>Amount:</strong> ${service['price']}</p>
             <p><strong>Notes:</strong> {notes or 'None'}</p>
             """
-            send_email(session['email'], 'Booking Confirmation - Future Mech', email_body)
-        except Exception as email_error:
-            app.logger.error(f'Booking confirmation email error: {str(email_error)}')
+            send_email(session['email'], 'Booking Confirmation - Future Mech', email_body, cur=cur)
+            # Last, so the change_versions row lock is held only until the commit
+            bump_version(cur, 'bookings', [booking_id])
+        event_broker.wake()
         
         return jsonify({
             'success': True, 
@@ -1035,13 +926,12 @@ def add_to_cart(part_id):
             flash('Invalid quantity.', 'danger')
             return redirect(url_for('car_parts'))
         
-        # Check stock
         cur = mysql.connection.cursor()
-        cur.execute("SELECT stock FROM car_parts WHERE id = %s AND is_active = TRUE", (part_id,))
+        cur.execute("SELECT id FROM car_parts WHERE id = %s AND is_active = TRUE", (part_id,))
         part = cur.fetchone()
         cur.close()
         
-        if not part or part['stock'] < quantity:
+        if not part:
             flash('Insufficient stock.', 'danger')
             return redirect(url_for('car_parts'))
         
@@ -1052,7 +942,12 @@ def add_to_cart(part_id):
         cart = session['cart']
         current_qty = cart.get(str(part_id), 0)
         
-        if part['stock'] < current_qty + quantity:
+        # Hold the new cart quantity against stock until checkout or expiry
+        try:
+            with mysql.transaction() as cur:
+                set_reservation(cur, session['user_id'], part_id, current_qty + quantity,
+                                app.config['RESERVATION_TTL_MINUTES'])
+        except InsufficientStock:
             flash('Cannot add more than available stock.', 'danger')
             return redirect(url_for('car_parts'))
         
@@ -1121,21 +1016,20 @@ def update_cart(part_id):
         
         cart = session['cart']
         
+        # Resize (or release) the stock hold to match the new quantity
+        try:
+            with mysql.transaction() as cur:
+                set_reservation(cur, session['user_id'], part_id, max(quantity, 0),
+                                app.config['RESERVATION_TTL_MINUTES'])
+        except InsufficientStock:
+            flash('Not enough stock available.', 'danger')
+            return redirect(url_for('view_cart'))
+        
         if quantity <= 0:
             if str(part_id) in cart:
                 del cart[str(part_id)]
         else:
-            # Check stock
-            cur = mysql.connection.cursor()
-            cur.execute("SELECT stock FROM car_parts WHERE id = %s", (part_id,))
-            part = cur.fetchone()
-            cur.close()
-            
-            if part and quantity <= part['stock']:
-                cart[str(part_id)] = quantity
-            else:
-                flash('Not enough stock available.', 'danger')
-                return redirect(url_for('view_cart'))
+            cart[str(part_id)] = quantity
         
         session['cart'] = cart
         session.modified = True
@@ -1162,29 +1056,37 @@ def checkout():
         
         cur = mysql.connection.cursor()
         
-        # Calculate total and validate items
+        # Fetch every cart line in one query and validate against it
+        quantities = {int(part_id): quantity for part_id, quantity in cart.items() if quantity > 0}
+        parts = {}
+        if quantities:
+            placeholders = ','.join(['%s'] * len(quantities))
+            cur.execute(f"""
+                SELECT id, name, price, stock FROM car_parts 
+                WHERE id IN ({placeholders}) AND is_active = TRUE
+            """, list(quantities))
+            parts = {part['id']: part for part in cur.fetchall()}
+        
         total = 0
         valid_items = []
         
-        for part_id_str, quantity in cart.items():
-            if quantity > 0:
-                part_id = int(part_id_str)
-                cur.execute("SELECT * FROM car_parts WHERE id = %s AND is_active = TRUE", (part_id,))
-                part = cur.fetchone()
-                
-                if part and part['stock'] >= quantity:
-                    item_total = float(part['price']) * quantity
-                    total += item_total
-                    valid_items.append((part, quantity))
-                else:
-                    flash(f'Item {part["name"]} is no longer available in the requested quantity.', 'danger')
-                    return redirect(url_for('view_cart'))
+        # Stock for held lines is already set aside; the conversion below enforces the rest
+        for part_id, quantity in quantities.items():
+            part = parts.get(part_id)
+            if part:
+                item_total = float(part['price']) * quantity
+                total += item_total
+                valid_items.append((part, quantity))
+            else:
+                flash(f'Item #{part_id} is no longer available.', 'danger')
+                return redirect(url_for('view_cart'))
         
         if not valid_items:
             flash('No valid items in cart.', 'danger')
             return redirect(url_for('view_cart'))
         
         # Apply discount if valid
+        discount = None
         discount_amount = 0
         if discount_code:
             cur.execute("""
@@ -1202,38 +1104,47 @@ def checkout():
                     discount_amount = min(discount['value'], total)
                 
                 total -= discount_amount
-                cur.execute("UPDATE discounts SET used_count = used_count + 1 WHERE id = %s", (discount['id'],))
             else:
                 flash('Invalid discount code.', 'danger')
                 return redirect(url_for('view_cart'))
         
-        # Create order
-        cur.execute("INSERT INTO orders (user_id, total_price, discount_amount) VALUES (%s, %s, %s)", 
-                   (session['user_id'], total, discount_amount))
-        order_id = cur.lastrowid
+        cur.close()
         
-        # Add order items and update stock
-        for part, quantity in valid_items:
-            cur.execute("""
+        # Discount usage, order, items, stock and payment commit together or not at all
+        with mysql.transaction() as cur:
+            if discount:
+                cur.execute("UPDATE discounts SET used_count = used_count + 1 WHERE id = %s", (discount['id'],))
+            
+            cur.execute("INSERT INTO orders (user_id, total_price, discount_amount) VALUES (%s, %s, %s)", 
+                       (session['user_id'], total, discount_amount))
+            order_id = cur.lastrowid
+            
+            # Add all order items in one multi-row insert
+            cur.executemany("""
                 INSERT INTO order_items (order_id, part_id, quantity, price) 
                 VALUES (%s, %s, %s, %s)
-            """, (order_id, part['id'], quantity, part['price']))
-            cur.execute("UPDATE car_parts SET stock = stock - %s WHERE id = %s", (quantity, part['id']))
-        
-        # Create payment record
-        cur.execute("""
-            INSERT INTO payments (order_id, amount, payment_method, status) 
-            VALUES (%s, %s, %s, %s)
-        """, (order_id, total, payment_method, 'pending'))
-        mysql.connection.commit()
+            """, [(order_id, part['id'], quantity, part['price']) for part, quantity in valid_items])
+            
+            # Turn the cart's stock holds into the sale, topping up any that expired
+            convert_reservations(cur, session['user_id'], [(part['id'], quantity) for part, quantity in valid_items])
+            
+            # Create payment record
+            cur.execute("""
+                INSERT INTO payments (order_id, amount, payment_method, status) 
+                VALUES (%s, %s, %s, %s)
+            """, (order_id, total, payment_method, 'pending'))
+            # Last, so concurrent checkouts only queue on the change_versions row for the commit
+            bump_version(cur, 'orders', [order_id])
         
         # Clear cart
         session['cart'] = {}
         session.modified = True
-        cur.close()
         
         flash('Order placed successfully! Please complete payment.', 'success')
         return redirect(url_for('payment_order', order_id=order_id))
+    except InsufficientStock:
+        flash('Some items are no longer available in the requested quantity.', 'danger')
+        return redirect(url_for('view_cart'))
     except Exception as e:
         app.logger.error(f'Checkout error: {str(e)}')
         flash('Error processing order. Please try again.', 'danger')
@@ -1350,6 +1261,7 @@ def payment_success():
         
         if intent.status == 'succeeded':
             cur = mysql.connection.cursor()
+            changed = None
             
             if payment_type == 'booking':
                 cur.execute("""
@@ -1358,6 +1270,7 @@ def payment_success():
                     WHERE booking_id = %s
                 """, (payment_intent, item_id))
                 cur.execute("UPDATE bookings SET status = 'confirmed' WHERE id = %s", (item_id,))
+                changed = ('bookings', item_id)
                 
                 # Send confirmation
                 cur.execute("""
@@ -1375,7 +1288,7 @@ def payment_success():
                     <p>Your payment for {booking['name']} has been processed.</p>
                     <p><strong>Scheduled:</strong> {booking['scheduled_date'].strftime('%B %d, %Y at %I:%M %p')}</p>
                     """
-                    send_email(booking['email'], 'Payment Confirmed - Future Mech', email_body)
+                    send_email(booking['email'], 'Payment Confirmed - Future Mech', email_body, cur=cur)
                 
             elif payment_type == 'order':
                 cur.execute("""
@@ -1383,7 +1296,11 @@ def payment_success():
                     SET status = 'completed', transaction_id = %s 
                     WHERE order_id = %s
                 """, (payment_intent, item_id))
-                cur.execute("UPDATE orders SET payment_status = 'paid' WHERE id = %s", (item_id,))
+                # Only the first confirmation of an order counts towards the revenue rollup
+                cur.execute("UPDATE orders SET payment_status = 'paid' WHERE id = %s AND payment_status != 'paid'", (item_id,))
+                if cur.rowcount:
+                    record_paid_order(cur, item_id)
+                    changed = ('orders', item_id)
                 
                 # Send confirmation
                 cur.execute("""
@@ -1400,8 +1317,11 @@ def payment_success():
                     <p>Your order #{order['id']} has been confirmed.</p>
                     <p><strong>Total:</strong> ${order['total_price']}</p>
                     """
-                    send_email(order['email'], 'Order Confirmed - Future Mech', email_body)
+                    send_email(order['email'], 'Order Confirmed - Future Mech', email_body, cur=cur)
             
+            # Stamped last, so the change_versions row lock is held only until the commit
+            if changed:
+                bump_version(cur, changed[0], [changed[1]])
             mysql.connection.commit()
             cur.close()
             flash('Payment successful! Thank you for your purchase.', 'success')
@@ -1425,8 +1345,7 @@ def admin_users():
     """User management"""
     try:
         cur = mysql.connection.cursor()
-        cur.execute("SELECT * FROM users ORDER BY created_at DESC")
-        users = cur.fetchall()
+        users = ADMIN_LISTS['users'].fetch(cur, request.args)
         cur.close()
         return render_template('admin_users.html', users=users)
     except Exception as e:
@@ -1441,8 +1360,7 @@ def admin_services():
     """Service management"""
     try:
         cur = mysql.connection.cursor()
-        cur.execute("SELECT * FROM services ORDER BY name")
-        services = cur.fetchall()
+        services = ADMIN_LISTS['services'].fetch(cur, request.args)
         cur.close()
         return render_template('admin_services.html', services=services)
     except Exception as e:
@@ -1457,10 +1375,18 @@ def admin_car_parts():
     """Car parts management"""
     try:
         cur = mysql.connection.cursor()
-        cur.execute("SELECT * FROM car_parts ORDER BY name")
-        parts = cur.fetchall()
+        parts = ADMIN_LISTS['car_parts'].fetch(cur, request.args)
+        
+        # Inventory summary tiles
+        cur.execute("""
+            SELECT COUNT(*) AS total_parts,
+                   COALESCE(SUM(stock < 10), 0) AS low_stock_count,
+                   COALESCE(SUM(stock <= 0), 0) AS out_of_stock_count
+            FROM car_parts
+        """)
+        summary = cur.fetchone()
         cur.close()
-        return render_template('admin_car_parts.html', parts=parts)
+        return render_template('admin_car_parts.html', parts=parts, **summary)
     except Exception as e:
         app.logger.error(f'Admin car parts error: {str(e)}')
         flash('Error loading car parts.', 'danger')
@@ -1473,14 +1399,7 @@ def admin_bookings():
     """Booking management"""
     try:
         cur = mysql.connection.cursor()
-        cur.execute("""
-            SELECT b.*, u.username as client_name, s.name as service_name 
-            FROM bookings b 
-            JOIN users u ON b.user_id = u.id 
-            JOIN services s ON b.service_id = s.id 
-            ORDER BY b.created_at DESC
-        """)
-        bookings = cur.fetchall()
+        bookings = ADMIN_LISTS['bookings'].fetch(cur, request.args)
         
         # Get service persons for assignment
         cur.execute("SELECT id, username FROM users WHERE role = 'service' AND is_active = TRUE")
@@ -1500,13 +1419,7 @@ def admin_orders():
     """Order management"""
     try:
         cur = mysql.connection.cursor()
-        cur.execute("""
-            SELECT o.*, u.username 
-            FROM orders o 
-            JOIN users u ON o.user_id = u.id 
-            ORDER BY o.created_at DESC
-        """)
-        orders = cur.fetchall()
+        orders = ADMIN_LISTS['orders'].fetch(cur, request.args)
         cur.close()
         return render_template('admin_orders.html', orders=orders)
     except Exception as e:
@@ -1521,29 +1434,32 @@ def admin_discounts():
     """Discount management"""
     try:
         cur = mysql.connection.cursor()
-        cur.execute("SELECT * FROM discounts ORDER BY created_at DESC")
-        discounts = cur.fetchall()
+        discounts = ADMIN_LISTS['discounts'].fetch(cur, request.args)
         cur.close()
-        return render_template('admin_discounts.html', discounts=discounts)
+        return render_template('admin_discounts.html', discounts=discounts, current_date=date.today())
     except Exception as e:
         app.logger.error(f'Admin discounts error: {str(e)}')
         flash('Error loading discounts.', 'danger')
-        return render_template('admin_discounts.html', discounts=[])
+        return render_template('admin_discounts.html', discounts=[], current_date=date.today())
 
 # =============================================================================
 # API ENDPOINTS - FIXED BOOLEAN HANDLING
 # =============================================================================
 
 def create_notification(role, message, notification_type, related_id=None):
-    """Create a notification for users with specific role"""
+    """Create a notification for users with specific role and push it to their open streams"""
     try:
-        cur = mysql.connection.cursor()
-        cur.execute("""
-            INSERT INTO notifications (role, message, type, related_id, created_at)
-            VALUES (%s, %s, %s, %s, NOW())
-        """, (role, message, notification_type, related_id))
-        mysql.connection.commit()
-        cur.close()
+        with mysql.transaction() as cur:
+            notification_id = record_notification(cur, role, message, notification_type, related_id)
+            publish_event(cur, 'notification', {
+                'id': notification_id,
+                'message': message,
+                'type': notification_type,
+                'time': datetime.now().strftime('%Y-%m-%d %H:%M'),
+                'title': get_notification_title(notification_type)
+            }, roles=[role])
+            bump_version(cur, 'notifications', [notification_id])
+        event_broker.wake()
         return True
     except Exception as e:
         app.logger.error(f'Create notification error: {str(e)}')
@@ -1560,19 +1476,200 @@ def get_notification_title(notification_type):
     }
     return titles.get(notification_type, 'Notification')
 
+# Response key used by dashboard_admin.js for each admin list
+ADMIN_LIST_KEYS = {
+    'users': 'users',
+    'services': 'services',
+    'car_parts': 'parts',
+    'bookings': 'bookings',
+    'orders': 'orders',
+    'discounts': 'discounts'
+}
+
+@app.route('/api/admin/<any(users, services, car_parts, bookings, orders, discounts):list_name>')
+@login_required
+@role_required(['admin'])
+def api_admin_list(list_name):
+    """Paginated admin list as compact JSON (?cursor, ?per_page, ?fields and list filters)"""
+    try:
+        admin_list = ADMIN_LISTS[list_name]
+        fields = admin_list.parse_fields(request.args.get('fields'))
+        
+        cur = mysql.connection.cursor()
+        page = admin_list.fetch(cur, request.args, fields)
+        cur.close()
+        
+        return json_response({
+            'success': True,
+            ADMIN_LIST_KEYS[list_name]: page.items,
+            'next_cursor': page.next_cursor,
+            'prev_cursor': page.prev_cursor
+        })
+    except Exception as e:
+        app.logger.error(f'Admin {list_name} API error: {str(e)}')
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/analytics')
+@login_required
+@role_required(['admin'])
+def api_admin_analytics():
+    """Revenue, booking and new-customer chart series (?period=7d|30d|90d|12m, ?bucket=day|week|month)"""
+    try:
+        period = request.args.get('period')
+        if period not in PERIODS:
+            period = DEFAULT_PERIOD
+        bucket = request.args.get('bucket')
+        if bucket not in BUCKETS:
+            bucket = PERIODS[period][1]
+        
+        payload = dict(analytics_cache.get(lambda: mysql.connection, period, bucket))
+        
+        # Booking status split is a current-state figure, taken from the stats snapshot
+        stats = admin_stats_cache.get(lambda: load_admin_stats(mysql.connection))
+        payload['bookings'] = [stats['pending_bookings'], stats['confirmed_bookings'],
+                               stats['in_progress_bookings'], stats['completed_bookings'],
+                               stats['cancelled_bookings']]
+        payload['period'] = period
+        payload['success'] = True
+        return json_response(payload)
+    except Exception as e:
+        app.logger.error(f'Admin analytics error: {str(e)}')
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/pool_stats')
+@login_required
+@role_required(['admin'])
+def api_pool_stats():
+    """Database connection pool statistics for this worker"""
+    return jsonify({'success': True, 'pid': os.getpid(), 'pool': mysql.stats(), 'events': event_broker.stats(),
+                    'catalog_cache': catalog_cache.stats()})
+
+@app.route('/api/dashboard/changes')
+@login_required
+def api_dashboard_changes():
+    """Bookings, orders and notifications changed since ?since=<version> (one key lookup when idle)"""
+    try:
+        cur = mysql.connection.cursor()
+        result = dashboard_changes(cur, session.get('role'), session.get('user_id'), request.args.get('since'))
+        cur.close()
+        
+        result['success'] = True
+        return json_response(result)
+    except Exception as e:
+        app.logger.error(f'Dashboard changes error: {str(e)}')
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/service/<any(assigned_jobs, completed_jobs):job_list>')
+@login_required
+@role_required(['service'])
+def api_service_jobs(job_list):
+    """Bookings assigned to the current service person (open jobs, or completed ones)"""
+    try:
+        conditions, params = ['b.assigned_to = %s'], [session['user_id']]
+        if job_list == 'completed_jobs':
+            conditions.append("b.status = 'completed'")
+            order_by = 'b.completed_at DESC'
+        else:
+            conditions.append("b.status NOT IN ('completed', 'cancelled')")
+            order_by = 'b.scheduled_date'
+        
+        cur = mysql.connection.cursor()
+        jobs = booking_rows(cur, conditions, params, order_by=order_by, limit=200)
+        cur.close()
+        
+        return json_response({'success': True, 'jobs': jobs})
+    except Exception as e:
+        app.logger.error(f'Service {job_list} error: {str(e)}')
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/events')
+@login_required
+def api_events():
+    """Server-sent event stream of notifications and booking changes for the current user"""
+    subscriber = event_broker.subscribe(session.get('role'), session.get('user_id'))
+    if subscriber is None:
+        # This worker is at capacity; EventSource gives up on a non-200 and the page polls instead
+        return jsonify({'success': False, 'error': 'Too many open event streams'}), 503
+    
+    backlog = []
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    if last_event_id is not None:
+        try:
+            backlog = event_broker.replay(mysql.connection, subscriber, last_event_id)
+        except Exception as e:
+            app.logger.error(f'Event replay error: {str(e)}')
+    
+    response = Response(event_broker.stream(subscriber, backlog), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # stop nginx buffering the stream
+    return response
+
+@app.route('/api/search/suggest')
+def api_search_suggest():
+    """Typeahead suggestions for ?q= from part names, part numbers, brands and services"""
+    try:
+        limit = max(1, min(request.args.get('limit', app.config['SUGGEST_LIMIT'], type=int), 20))
+        # Served from memory; the database is only asked whether the catalog changed, at most every sync interval
+        suggestions = catalog_search.suggest(lambda: mysql.connection, request.args.get('q', ''), limit)
+        return json_response({'success': True, 'suggestions': suggestions},
+                             max_age=app.config['SUGGEST_MAX_AGE'], public=True)
+    except Exception as e:
+        app.logger.error(f'Search suggest error: {str(e)}')
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/car_parts/fitting')
+def api_fitting_parts():
+    """Active car parts that fit ?vehicle_id= (one of the client's, or 'all') or ?make=&model=&year="""
+    try:
+        vehicle_id = request.args.get('vehicle_id', '')
+        category = request.args.get('category') or None
+        limit = max(1, min(request.args.get('limit', app.config['SEARCH_MAX_RESULTS'], type=int),
+                           app.config['SEARCH_MAX_RESULTS']))
+        
+        cur = mysql.connection.cursor()
+        if vehicle_id:
+            if 'user_id' not in session:
+                cur.close()
+                return jsonify({'success': False, 'error': 'Please log in to use your vehicles'}), 401
+            query = "SELECT id, registration_no, make, model, year FROM vehicles WHERE user_id = %s"
+            params = [session['user_id']]
+            if vehicle_id != 'all':
+                query += " AND id = %s"
+                params.append(vehicle_id)
+            cur.execute(query, params)
+            vehicles = cur.fetchall()
+            if not vehicles:
+                cur.close()
+                return jsonify({'success': False, 'error': 'Vehicle not found'}), 404
+        else:
+            make = request.args.get('make', '').strip()
+            if not make:
+                cur.close()
+                return jsonify({'success': False, 'error': 'vehicle_id or make is required'}), 400
+            vehicles = [{'make': make, 'model': request.args.get('model', ''), 'year': request.args.get('year', type=int)}]
+        
+        part_ids = sorted(catalog_search.parts_for(lambda: mysql.connection, vehicles, category=category))
+        # Count what load_parts returns, which skips parts the index still holds but MySQL no longer has
+        rows = load_parts(part_ids)
+        parts = [{
+            'id': part['id'], 'name': part['name'], 'brand': part['brand'], 'part_number': part['part_number'],
+            'category': part['category'], 'price': part['price'], 'stock': part['stock'],
+            'image_url': part['image_url'], 'compatibility': part['compatibility']
+        } for part in rows[:limit]]
+        cur.close()
+        
+        return json_response({'success': True, 'vehicles': vehicles, 'total': len(rows), 'parts': parts})
+    except Exception as e:
+        app.logger.error(f'Fitting parts error: {str(e)}')
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/check_notifications')
 @login_required
 def api_check_notifications():
     """Check for new notifications"""
     try:
         cur = mysql.connection.cursor()
-        cur.execute("""
-            SELECT * FROM notifications 
-            WHERE (role = %s OR role = 'all') 
-            AND id NOT IN (SELECT notification_id FROM notification_reads WHERE user_id = %s)
-            ORDER BY created_at DESC LIMIT 10
-        """, (session.get('role'), session.get('user_id')))
-        notifications = cur.fetchall()
+        notifications = unread_notifications(cur, session.get('user_id'), session.get('role'))
         cur.close()
         
         return jsonify({
@@ -1595,21 +1692,33 @@ def api_mark_notification_read():
     """Mark notification as read"""
     try:
         data = request.get_json()
-        notification_id = data.get('notification_id')
+        try:
+            notification_id = int(data.get('notification_id'))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'Invalid notification id'}), 400
         
-        cur = mysql.connection.cursor()
-        cur.execute("""
-            INSERT INTO notification_reads (user_id, notification_id, read_at)
-            VALUES (%s, %s, NOW())
-        """, (session.get('user_id'), notification_id))
-        mysql.connection.commit()
-        cur.close()
+        with mysql.transaction() as cur:
+            mark_read(cur, session.get('user_id'), session.get('role'), notification_id)
         
         return jsonify({'success': True})
     except Exception as e:
         app.logger.error(f'Mark notification read error: {str(e)}')
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/notifications/unread_count')
+@login_required
+def api_unread_notification_count():
+    """Number of unread notifications for the current user"""
+    try:
+        cur = mysql.connection.cursor()
+        count = unread_count(cur, session.get('user_id'), session.get('role'))
+        cur.close()
+        
+        return jsonify({'success': True, 'unread': count})
+    except Exception as e:
+        app.logger.error(f'Unread notification count error: {str(e)}')
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/client/vehicles', methods=['GET'])
 @login_required
 def get_client_vehicles():
@@ -1718,36 +1827,43 @@ def api_update_booking_status():
         status = request.json.get('status')
         assigned_to = request.json.get('assigned_to')
         
-        cur = mysql.connection.cursor()
-        
+        # Apply assignment, status and completion time in one UPDATE
+        updates = ["status = %s"]
+        params = [status]
         if assigned_to:
-            cur.execute("UPDATE bookings SET assigned_to = %s WHERE id = %s", (assigned_to, booking_id))
-        
-        cur.execute("UPDATE bookings SET status = %s WHERE id = %s", (status, booking_id))
-        
+            # Remember who held the job (set before assigned_to changes) so their dashboard drops it
+            updates.append("previous_assigned_to = IF(assigned_to <=> %s, previous_assigned_to, assigned_to)")
+            updates.append("assigned_to = %s")
+            params.extend([assigned_to, assigned_to])
         if status == 'completed':
-            cur.execute("UPDATE bookings SET completed_at = NOW() WHERE id = %s", (booking_id,))
-        
-        mysql.connection.commit()
+            updates.append("completed_at = NOW()")
+        params.append(booking_id)
         
-        # Notify customer
-        cur.execute("""
-            SELECT u.email, s.name 
-            FROM bookings b 
-            JOIN users u ON b.user_id = u.id 
-            JOIN services s ON b.service_id = s.id 
-            WHERE b.id = %s
-        """, (booking_id,))
-        booking = cur.fetchone()
-        
-        if booking:
-            email_body = f"""
-            <h2>Booking Status Update</h2>
-            <p>Your booking for {booking['name']} is now: <strong>{status.replace('_', ' ').title()}</strong></p>
-            """
-            send_email(booking['email'], 'Booking Status Update - Future Mech', email_body)
+        with mysql.transaction() as cur:
+            cur.execute(f"UPDATE bookings SET {', '.join(updates)} WHERE id = %s", params)
+            
+            # Notify customer by email and every open dashboard by push
+            cur.execute("""
+                SELECT b.user_id, u.email, s.name 
+                FROM bookings b 
+                JOIN users u ON b.user_id = u.id 
+                JOIN services s ON b.service_id = s.id 
+                WHERE b.id = %s
+            """, (booking_id,))
+            booking = cur.fetchone()
+            
+            if booking:
+                email_body = f"""
+                <h2>Booking Status Update</h2>
+                <p>Your booking for {booking['name']} is now: <strong>{status.replace('_', ' ').title()}</strong></p>
+                """
+                send_email(booking['email'], 'Booking Status Update - Future Mech', email_body, cur=cur)
+                publish_event(cur, 'booking_status', {'booking_id': booking_id, 'status': status,
+                                                      'service': booking['name']},
+                              roles=['admin', 'service'], user_id=booking['user_id'])
+            bump_version(cur, 'bookings', [booking_id])
+        event_broker.wake()
         
-        cur.close()
         return jsonify({'success': True, 'message': 'Status updated successfully'})
     except Exception as e:
         app.logger.error(f'Update booking status error: {str(e)}')
@@ -1793,9 +1909,14 @@ def api_add_service():
             INSERT INTO services (name, description, price, duration, service_type, is_active, is_featured, image_url)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
         """, (name, description, price, duration, service_type, is_active, is_featured, image_url))
-        mysql.connection.commit()
         service_id = cur.lastrowid
+        if image_url:
+            attach_image(cur, 'service', service_id, image_url)
+        bump_version(cur, 'services', [service_id])
+        mysql.connection.commit()
         cur.close()
+        catalog_search.expire()
+        catalog_cache.invalidate()
         
         app.logger.info(f'Service added successfully: {name}, ID: {service_id}')
         return jsonify({'success': True, 'service_id': service_id})
@@ -1843,8 +1964,11 @@ def api_update_service():
                     is_active = %s, is_featured = %s, image_url = %s
                 WHERE id = %s
             """, (name, description, price, duration, service_type, is_active, is_featured, image_url, service_id))
+            replaced_url = attach_image(cur, 'service', service_id, image_url)
+            bump_version(cur, 'services', [service_id])
             mysql.connection.commit()
             cur.close()
+            release_images(replaced_url)
         else:
             cur = mysql.connection.cursor()
             cur.execute("""
@@ -1853,8 +1977,11 @@ def api_update_service():
                     is_active = %s, is_featured = %s
                 WHERE id = %s
             """, (name, description, price, duration, service_type, is_active, is_featured, service_id))
+            bump_version(cur, 'services', [service_id])
             mysql.connection.commit()
             cur.close()
+        catalog_search.expire()
+        catalog_cache.invalidate()
         
         app.logger.info(f'Service updated successfully: {name}, ID: {service_id}')
         return jsonify({'success': True})
@@ -1901,10 +2028,19 @@ def api_add_car_part():
             INSERT INTO car_parts (name, description, price, stock, category, brand, part_number, compatibility, image_url, is_active)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
         """, (name, description, price, stock, category, brand, part_number, compatibility, image_url, is_active))
-        mysql.connection.commit()
         part_id = cur.lastrowid
+        if image_url:
+            attach_image(cur, 'car_part', part_id, image_url)
+        bump_version(cur, 'car_parts', [part_id])
+        mysql.connection.commit()
         cur.close()
         
+        catalog_cache.invalidate()
+        catalog_search.refresh_part({
+            'id': part_id, 'name': name, 'description': description, 'category': category, 'brand': brand,
+            'part_number': part_number, 'compatibility': compatibility, 'is_active': is_active
+        })
+        
         # Create notification for admins
         create_notification('admin', f'New car part added: {name}', 'inventory')
         
@@ -1954,8 +2090,11 @@ def api_update_car_part():
                     brand = %s, part_number = %s, compatibility = %s, image_url = %s, is_active = %s
                 WHERE id = %s
             """, (name, description, price, stock, category, brand, part_number, compatibility, image_url, is_active, part_id))
+            replaced_url = attach_image(cur, 'car_part', part_id, image_url)
+            bump_version(cur, 'car_parts', [part_id])
             mysql.connection.commit()
             cur.close()
+            release_images(replaced_url)
         else:
             cur = mysql.connection.cursor()
             cur.execute("""
@@ -1964,50 +2103,114 @@ def api_update_car_part():
                     brand = %s, part_number = %s, compatibility = %s, is_active = %s
                 WHERE id = %s
             """, (name, description, price, stock, category, brand, part_number, compatibility, is_active, part_id))
+            bump_version(cur, 'car_parts', [part_id])
             mysql.connection.commit()
             cur.close()
         
+        catalog_cache.invalidate()
+        catalog_search.refresh_part({
+            'id': int(part_id), 'name': name, 'description': description, 'category': category, 'brand': brand,
+            'part_number': part_number, 'compatibility': compatibility, 'is_active': is_active
+        })
+        
         app.logger.info(f'Car part updated successfully: {name}, ID: {part_id}')
         return jsonify({'success': True})
     except Exception as e:
         app.logger.error(f'Update car part error: {str(e)}')
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/generate_report/<int:booking_id>')
+@app.route('/api/generate_report/<int:booking_id>', methods=['GET', 'POST'])
 @login_required
 @role_required(['admin', 'service'])
 def api_generate_report(booking_id):
-    """Generate PDI report"""
+    """Queue PDI report generation and return the job id"""
     try:
-        report_path = generate_pdi_report(booking_id)
+        cur = mysql.connection.cursor()
+        cur.execute(REPORT_BOOKING_QUERY, (booking_id,))
+        booking = cur.fetchone()
+        cur.close()
         
-        if report_path:
-            # Send email with report
-            cur = mysql.connection.cursor()
-            cur.execute("""
-                SELECT u.email, s.name 
-                FROM bookings b 
-                JOIN users u ON b.user_id = u.id 
-                JOIN services s ON b.service_id = s.id 
-                WHERE b.id = %s
-            """, (booking_id,))
-            booking = cur.fetchone()
-            cur.close()
-            
-            if booking:
-                email_body = f"""
-                <h2>Your Service Report is Ready</h2>
-                <p>Your report for {booking['name']} is attached.</p>
-                """
-                send_email(booking['email'], 'Service Report - Future Mech', email_body, report_path)
-            
-            return jsonify({'success': True, 'message': 'Report generated and sent'})
-        else:
-            return jsonify({'success': False, 'error': 'Failed to generate report'}), 500
+        if not booking:
+            return jsonify({'success': False, 'error': 'Booking not found'}), 404
+        
+        job_id, report_id = report_jobs.submit(booking, session['user_id'])
+        if report_id:
+            # Booking unchanged since the last report: reuse the existing PDF
+            return jsonify({
+                'success': True,
+                'job_id': job_id,
+                'status': 'done',
+                'download_url': url_for('download_report', report_id=report_id)
+            })
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': url_for('api_report_job', job_id=job_id)
+        }), 202
     except Exception as e:
         app.logger.error(f'Generate report error: {str(e)}')
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/report_jobs/<int:job_id>')
+@login_required
+@role_required(['admin', 'service'])
+def api_report_job(job_id):
+    """Status of a report generation job"""
+    try:
+        cur = mysql.connection.cursor()
+        cur.execute("""
+            SELECT id, booking_id, status, report_id, error, created_at, finished_at
+            FROM report_jobs WHERE id = %s
+        """, (job_id,))
+        job = cur.fetchone()
+        cur.close()
+        
+        if not job:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        
+        job['download_url'] = url_for('download_report', report_id=job['report_id']) if job['report_id'] else None
+        return jsonify({'success': True, 'job': job})
+    except Exception as e:
+        app.logger.error(f'Report job status error: {str(e)}')
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/reports/<int:report_id>/download')
+@login_required
+def download_report(report_id):
+    """Download a generated report (staff, or the client who owns the booking)"""
+    try:
+        cur = mysql.connection.cursor()
+        cur.execute("""
+            SELECT r.id, r.pdf_path, b.user_id
+            FROM reports r
+            JOIN bookings b ON r.booking_id = b.id
+            WHERE r.id = %s
+        """, (report_id,))
+        report = cur.fetchone()
+        
+        if not report or not os.path.exists(report['pdf_path']):
+            cur.close()
+            flash('Report not found.', 'danger')
+            return redirect(url_for('index'))
+        if session.get('role') not in ('admin', 'service') and report['user_id'] != session['user_id']:
+            cur.close()
+            flash('You do not have permission to access this page.', 'danger')
+            return redirect(url_for('index'))
+        
+        # PDF viewers follow up with Range requests, which need no write or commit of their own
+        if 'Range' not in request.headers:
+            cur.execute("UPDATE reports SET status = 'downloaded' WHERE id = %s AND status != 'downloaded'", (report_id,))
+            mysql.connection.commit()
+        cur.close()
+        return file_response(report['pdf_path'], 'application/pdf', os.path.basename(report['pdf_path']),
+                             accel_root=app.config['REPORTS_DIR'],
+                             accel_prefix=app.config['REPORTS_ACCEL_REDIRECT_PREFIX'])
+    except Exception as e:
+        app.logger.error(f'Report download error: {str(e)}')
+        flash('Error downloading report. Please try again.', 'danger')
+        return redirect(url_for('index'))
+
 @app.route('/api/delete_service/<int:service_id>', methods=['POST'])
 @login_required
 @role_required(['admin'])
@@ -2023,10 +2226,16 @@ def api_delete_service(service_id):
             cur.close()
             return jsonify({'success': False, 'error': 'Service not found'}), 404
         
-        # Delete service
+        # Delete service, then its image if no other service or part uses it
+        image_url = detach_image(cur, 'service', service_id)
+        # Moves the services version so every worker drops it from its suggestions
+        bump_version(cur, 'services', [service_id])
         cur.execute("DELETE FROM services WHERE id = %s", (service_id,))
         mysql.connection.commit()
         cur.close()
+        catalog_search.expire()
+        catalog_cache.invalidate()
+        release_images(image_url)
         
         return jsonify({'success': True})
     except Exception as e:
@@ -2048,10 +2257,20 @@ def api_delete_car_part(part_id):
             cur.close()
             return jsonify({'success': False, 'error': 'Car part not found'}), 404
         
-        # Delete car part
+        # Delete car part, then its image if no other part or service uses it
+        image_url = detach_image(cur, 'car_part', part_id)
         cur.execute("DELETE FROM car_parts WHERE id = %s", (part_id,))
+        # Leave a tombstone at the next car_parts version so other workers unindex the part
+        version = bump_version(cur, 'car_parts', [part_id])
+        cur.execute("""
+            INSERT INTO car_part_deletions (part_id, change_version) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE change_version = VALUES(change_version)
+        """, (part_id, version))
         mysql.connection.commit()
         cur.close()
+        catalog_search.forget_part(part_id)
+        catalog_cache.invalidate()
+        release_images(image_url)
         
         return jsonify({'success': True})
     except Exception as e:
@@ -2079,48 +2298,163 @@ def forbidden_error(error):
     """403 error handler"""
     return render_template('403.html'), 403
 
+# =============================================================================
+# CLI COMMANDS
+# =============================================================================
+
+@app.cli.command('backfill-revenue')
+@click.option('--since', default=None, help='Only rebuild days on or after this date (YYYY-MM-DD)')
+def backfill_revenue_command(since):
+    """Rebuild the daily_revenue rollup from paid orders"""
+    with mysql.pool.connection() as conn:
+        days = rebuild_daily_revenue(conn, since)
+    click.echo(f'Rebuilt daily_revenue: {days} day(s)')
+
+@app.cli.command('backfill-analytics')
+@click.option('--since', default=None, help='Only rebuild days on or after this date (YYYY-MM-DD)')
+def backfill_analytics_command(since):
+    """Rebuild the daily_metrics rollup from bookings and users"""
+    with mysql.pool.connection() as conn:
+        rows = rebuild_daily_metrics(conn, since)
+    click.echo(f'Rebuilt daily_metrics: {rows} row(s)')
+
+@app.cli.command('backfill-notifications')
+def backfill_notifications_command():
+    """Rebuild the per-role notification totals and seed read state from notification_reads
+
+    Required once when deploying the per-user read watermark, or every user
+    sees their old notifications as unread.
+    """
+    with mysql.pool.connection() as conn:
+        roles = rebuild_notification_counts(conn)
+        users = rebuild_notification_read_state(conn)
+    click.echo(f'Rebuilt notification_counts: {roles} role(s)')
+    click.echo(f'Seeded notification_read_state: {users} user(s)')
+
+@app.cli.command('generate-reports')
+@click.option('--from', 'date_from', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='First completion date (YYYY-MM-DD, default today)')
+@click.option('--to', 'date_to', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Last completion date (YYYY-MM-DD, default --from)')
+@click.option('--workers', type=int, default=None, help='Renderer processes (default: one per CPU)')
+@click.option('--user-id', type=int, default=None, help='User recorded as generated_by (default: first admin)')
+@click.option('--resend', is_flag=True, help='Email reports that were already sent')
+def generate_reports_command(date_from, date_to, workers, user_id, resend):
+    """Render and email PDI reports for bookings completed in a date range"""
+    date_from = date_from.date() if date_from else date.today()
+    date_to = date_to.date() if date_to else date_from
+    
+    def progress(done, total, elapsed):
+        click.echo(f'  {done}/{total} reports, {done / elapsed if elapsed else 0:.1f}/s')
+    
+    with mysql.pool.connection() as conn:
+        if user_id is None:
+            cur = conn.cursor()
+            cur.execute("SELECT id FROM users WHERE role = 'admin' AND is_active = TRUE ORDER BY id LIMIT 1")
+            admin = cur.fetchone()
+            cur.close()
+            if not admin:
+                raise click.ClickException('No active admin user; pass --user-id')
+            user_id = admin['id']
+        
+        click.echo(f'Generating PDI reports for bookings completed {date_from} to {date_to}')
+        result = generate_report_batch(conn, date_from, date_to, app.config['REPORTS_DIR'], user_id,
+                                       workers=workers, resend=resend, progress=progress)
+    
+    click.echo(f"Selected {result['selected']}, skipped {result['skipped']} already sent, "
+               f"rendered {result['rendered']}, reused {result['reused']}, failed {result['failed']}")
+    click.echo(f"Queued {result['emailed']} email(s) in {result['elapsed']:.1f}s "
+               f"({result['emailed'] / result['elapsed'] if result['elapsed'] else 0:.1f} reports/s)")
+
+@app.cli.command('prune-reports')
+@click.option('--days', default=None, type=int, help='Keep superseded versions requested within this many days')
+def prune_reports_command(days):
+    """Delete superseded PDI report versions and their files"""
+    with mysql.pool.connection() as conn:
+        evicted = evict_stale_reports(conn, days if days is not None else app.config['REPORT_RETENTION_DAYS'])
+    click.echo(f'Evicted {evicted} stale report(s)')
+
+@app.cli.command('prune-events')
+@click.option('--hours', default=None, type=int, help='Keep events newer than this many hours')
+def prune_events_command(hours):
+    """Delete pushed events older than the retention window"""
+    with mysql.pool.connection() as conn:
+        deleted = prune_events(conn, hours if hours is not None else app.config['EVENTS_RETENTION_HOURS'])
+    click.echo(f'Deleted {deleted} old event(s)')
+
+@app.cli.command('gc-images')
+def gc_images_command():
+    """Delete stored images that no service or car part references"""
+    with mysql.pool.connection() as conn:
+        deleted = collect_orphaned_images(conn, app.static_folder, app.config['IMAGE_GC_GRACE_MINUTES'])
+    click.echo(f'Deleted {len(deleted)} unreferenced image(s)')
+
+@app.cli.command('dedupe-images')
+def dedupe_images_command():
+    """Move uuid-named uploads into the content-addressed image store"""
+    def on_stored(path):
+        image_pipeline.submit(path).result()
+    
+    with mysql.pool.connection() as conn:
+        updated, removed = adopt_legacy_images(conn, app.static_folder, on_stored)
+    click.echo(f'Re-stored images for {updated} service(s)/part(s), removed {removed} duplicate file(s)')
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint static assets and write their gzip/brotli variants"""
+    manifest = build_assets(app.static_folder)
+    click.echo(f"Fingerprinted {len(manifest['files'])} asset(s), "
+               f"precompressed {len(manifest['encodings'])}")
+
+@app.cli.command('send-emails')
+@click.option('--once', is_flag=True, help='Exit once the outbox has been drained')
+def send_emails_command(once):
+    """Deliver queued email_outbox messages over a reused SMTP connection"""
+    run_outbox_worker(mysql, app.config, app.logger, once=once)
+
 # =============================================================================
 # MAIN APPLICATION
 # =============================================================================
 
 if __name__ == '__main__':
-    # Create default admin user if not exists
-    try:
-        cur = mysql.connection.cursor()
-        cur.execute("SELECT COUNT(*) as count FROM users WHERE role = 'admin'")
-        admin_count = cur.fetchone()['count']
+    with app.app_context():
+        # Create default admin user if not exists
+        try:
+            cur = mysql.connection.cursor()
+            cur.execute("SELECT COUNT(*) as count FROM users WHERE role = 'admin'")
+            admin_count = cur.fetchone()['count']
         
-        if admin_count == 0:
-            hashed_password = generate_password_hash('admin123')
-            cur.execute("""
-                INSERT INTO users (username, email, password, role) 
-                VALUES (%s, %s, %s, %s)
-            """, ('admin', 'admin@futuremech.com', hashed_password, 'admin'))
-            mysql.connection.commit()
-            app.logger.info('Default admin user created: admin@futuremech.com / admin123')
-        
-        # Insert default services if none exist
-        cur.execute("SELECT COUNT(*) as count FROM services")
-        service_count = cur.fetchone()['count']
-        
-        if service_count == 0:
-            default_services = [
-                ('Pre-Depth Inspection (PDI)', 'Comprehensive vehicle inspection', 149.99, 120),
-                ('Second-Hand Insurance (SCI)', 'Insurance for pre-owned vehicles', 299.99, 60),
-                ('Basic Suspension Inspection (BSI)', 'Suspension component check', 89.99, 45),
-                ('Detailing Package', 'Complete cleaning and waxing', 199.99, 180),
-                ('HPA SOS (Battery & Tow)', 'Emergency services', 79.99, 30)
-            ]
+            if admin_count == 0:
+                hashed_password = generate_password_hash('admin123')
+                cur.execute("""
+                    INSERT INTO users (username, email, password, role) 
+                    VALUES (%s, %s, %s, %s)
+                """, ('admin', 'admin@futuremech.com', hashed_password, 'admin'))
+                mysql.connection.commit()
+                app.logger.info('Default admin user created: admin@futuremech.com / admin123')
+        
+            # Insert default services if none exist
+            cur.execute("SELECT COUNT(*) as count FROM services")
+            service_count = cur.fetchone()['count']
+        
+            if service_count == 0:
+                default_services = [
+                    ('Pre-Depth Inspection (PDI)', 'Comprehensive vehicle inspection', 149.99, 120),
+                    ('Second-Hand Insurance (SCI)', 'Insurance for pre-owned vehicles', 299.99, 60),
+                    ('Basic Suspension Inspection (BSI)', 'Suspension component check', 89.99, 45),
+                    ('Detailing Package', 'Complete cleaning and waxing', 199.99, 180),
+                    ('HPA SOS (Battery & Tow)', 'Emergency services', 79.99, 30)
+                ]
             
-            for service in default_services:
-                cur.execute("INSERT INTO services (name, description, price, duration) VALUES (%s, %s, %s, %s)", service)
+                for service in default_services:
+                    cur.execute("INSERT INTO services (name, description, price, duration) VALUES (%s, %s, %s, %s)", service)
             
-            mysql.connection.commit()
-            app.logger.info('Default services created')
+                mysql.connection.commit()
+                app.logger.info('Default services created')
         
-        cur.close()
-    except Exception as e:
-        app.logger.error(f'Initialization error: {str(e)}')
+            cur.close()
+        except Exception as e:
+            app.logger.error(f'Initialization error: {str(e)}')
     
     # Run the application
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
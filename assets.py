@@ -0,0 +1,161 @@
+"""
+Static asset fingerprinting for Future Mech
+``url_for('static', filename=...)`` gets a ``v=<content hash>`` argument for
+every CSS, JS and image file, and a request carrying the current hash is
+served with ``Cache-Control: public, max-age=31536000, immutable``. Any change
+to a file changes its URL, so browsers never need to revalidate.
+
+``flask build-assets`` writes the manifest of hashes plus .gz (and, with the
+optional ``brotli`` package, .br) variants next to each text asset. They are
+served to clients that accept them. Without a build, hashes are computed on
+first use and files are served uncompressed.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+
+from flask import abort, request, send_from_directory
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional, only needed to build .br variants
+    brotli = None
+
+
+ASSET_DIRS = ('css', 'js', 'images')
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt')
+MANIFEST_NAME = 'assets-manifest.json'
+IMMUTABLE_MAX_AGE = 31536000
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def _asset_files(static_folder):
+    for directory in ASSET_DIRS:
+        root = os.path.join(static_folder, directory)
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                if name.endswith(('.gz', '.br')):
+                    continue
+                path = os.path.join(dirpath, name)
+                yield os.path.relpath(path, static_folder).replace(os.sep, '/'), path
+
+
+def build_assets(static_folder):
+    """Hash every asset, write compressed variants and the manifest; returns the manifest"""
+    manifest = {'files': {}, 'encodings': {}}
+    for filename, path in _asset_files(static_folder):
+        manifest['files'][filename] = file_hash(path)
+        if not filename.endswith(COMPRESSIBLE):
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        variants = []
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) < len(data):
+            with open(path + '.gz', 'wb') as f:
+                f.write(compressed)
+            variants.append('gzip')
+        if brotli is not None:
+            compressed = brotli.compress(data, quality=11)
+            if len(compressed) < len(data):
+                with open(path + '.br', 'wb') as f:
+                    f.write(compressed)
+                variants.append('br')
+        if variants:
+            manifest['encodings'][filename] = variants
+
+    partial = os.path.join(static_folder, MANIFEST_NAME + '.tmp')
+    with open(partial, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(partial, os.path.join(static_folder, MANIFEST_NAME))
+    return manifest
+
+
+class StaticAssets:
+    """Fingerprinted URLs and immutable, precompressed responses for /static"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._files = {}
+        self._encodings = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.load_manifest()
+        app.url_defaults(self._add_version)
+        app.view_functions['static'] = self.serve
+
+    def load_manifest(self):
+        try:
+            with open(os.path.join(self.app.static_folder, MANIFEST_NAME)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+        self._files = dict(manifest.get('files', {}))
+        self._encodings = manifest.get('encodings', {})
+
+    def fingerprint(self, filename):
+        """Content hash of an asset, or None for files outside ASSET_DIRS"""
+        if filename.split('/', 1)[0] not in ASSET_DIRS:
+            return None
+        version = self._files.get(filename)
+        if version is None:
+            path = safe_join(self.app.static_folder, filename)
+            if path is None or not os.path.isfile(path):
+                return None
+            version = file_hash(path)
+            # The debug reloader picks up edits, so only cache hashes in production,
+            # and only under the canonical name so aliases like css//a.css can't grow it
+            canonical = os.path.relpath(path, self.app.static_folder).replace(os.sep, '/') == filename
+            if canonical and not self.app.debug:
+                with self._lock:
+                    self._files[filename] = version
+        return version
+
+    def _add_version(self, endpoint, values):
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            version = self.fingerprint(values['filename'])
+            if version:
+                values['v'] = version
+
+    def serve(self, filename):
+        """/static view: precompressed variant if accepted, immutable if the URL is current"""
+        if safe_join(self.app.static_folder, filename) is None:
+            abort(404)
+        version = request.args.get('v')
+        immutable = version is not None and version == self.fingerprint(filename)
+
+        served, encoding = filename, None
+        accepted = request.headers.get('Accept-Encoding', '').lower()
+        for name, suffix in ENCODINGS:
+            if name in self._encodings.get(filename, ()) and name in accepted:
+                served, encoding = filename + suffix, name
+                break
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_from_directory(self.app.static_folder, served, mimetype=mimetype,
+                                       max_age=IMMUTABLE_MAX_AGE if immutable else None)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if filename in self._encodings:
+            response.vary.add('Accept-Encoding')
+        if immutable:
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+        return response
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Benchmark PDI report rendering
+Compares per-report CPU time when the ReportLab styles are rebuilt for every
+report (as before the template cache) against the shared per-process template.
+
+    python bench_reports.py --count 200
+"""
+
+import argparse
+import io
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from reports import ReportTemplate, report_template, write_pdi_report
+
+
+SAMPLE_BOOKING = {
+    'id': 1234,
+    'username': 'sample_client',
+    'email': 'client@example.com',
+    'phone': '+1 555 0100',
+    'scheduled_date': datetime(2024, 5, 14, 10, 30),
+    'service_name': 'PDI Inspection',
+    'description': 'Comprehensive Pre-Depth Inspection covering all vehicle systems with detailed reporting and recommendations.',
+    'price': Decimal('150.00'),
+    'status': 'completed',
+    'notes': 'Front left tyre close to wear limit.',
+}
+
+
+def run(count, template_for_report):
+    """CPU seconds per report for ``count`` renders into memory"""
+    started = time.process_time()
+    for _ in range(count):
+        write_pdi_report(SAMPLE_BOOKING, io.BytesIO(), template_for_report())
+    return (time.process_time() - started) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=200, help='reports to render per run')
+    args = parser.parse_args()
+
+    # Warm up imports, fonts and the cached template before timing
+    run(5, report_template)
+
+    uncached = run(args.count, ReportTemplate)
+    cached = run(args.count, report_template)
+
+    print(f"Rendered {args.count} reports per run")
+    print(f"Styles rebuilt per report: {uncached * 1000:.2f} ms CPU/report")
+    print(f"Cached report template:    {cached * 1000:.2f} ms CPU/report")
+    print(f"Saved: {(uncached - cached) * 1000:.2f} ms/report ({(1 - cached / uncached) * 100:.1f}%)")
+
+
+if __name__ == '__main__':
+    main()
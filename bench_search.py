@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark the car parts search index
+Builds a SearchIndex over synthetic parts and reports build time and
+per-query latency, cold and from the result cache, for typical catalog and
+typeahead queries, then does the same for SuggestIndex prefixes and
+CompatibilityIndex vehicle lookups.
+
+    python bench_search.py --parts 100000
+"""
+
+import argparse
+import random
+import time
+
+from compatibility import CompatibilityIndex
+from search import SearchIndex, SuggestIndex
+
+
+BRANDS = ['Bosch', 'Brembo', 'Denso', 'NGK', 'Mann', 'Castrol', 'Valeo', 'Monroe', 'Gates', 'Febi',
+          'Mahle', 'Hella', 'Sachs', 'Lemforder', 'Continental']
+PARTS = ['Brake Pads', 'Brake Disc', 'Oil Filter', 'Air Filter', 'Spark Plug', 'Wiper Blade', 'Shock Absorber',
+         'Timing Belt', 'Water Pump', 'Alternator', 'Starter Motor', 'Radiator', 'Clutch Kit', 'Headlight Bulb',
+         'Fuel Pump', 'Cabin Filter', 'Control Arm', 'Wheel Bearing', 'Drive Belt', 'Ignition Coil']
+POSITIONS = ['Front', 'Rear', 'Left', 'Right', 'Upper', 'Lower', '']
+MAKES = {'Toyota': ['Corolla', 'Camry', 'RAV4'], 'Honda': ['Civic', 'Accord', 'CR-V'],
+         'Ford': ['Focus', 'Fiesta', 'F-150'], 'Volkswagen': ['Golf', 'Polo', 'Passat'],
+         'BMW': ['320i', 'X3', 'X5'], 'Hyundai': ['i20', 'Elantra', 'Tucson']}
+CATEGORIES = ['Brakes', 'Filters', 'Engine', 'Electrical', 'Suspension', 'Cooling', 'Lighting']
+QUERIES = ['brake pads', 'bosch oil filter', 'brem', 'spark plug ngk', 'civic', 'timing belt gates',
+           'wa pu', 'alternator 2015', 'x5 shock', 'filter']
+PREFIXES = ['br', 'bra', 'brake p', 'bo', 'bo-12', 'pads', 'oil', 'wat']
+GARAGES = [
+    [{'make': 'Toyota', 'model': 'Corolla', 'year': 2012}],
+    [{'make': 'Honda', 'model': 'CR-V', 'year': 2005}, {'make': 'BMW', 'model': 'X5', 'year': 2018}],
+    [{'make': 'Ford', 'model': 'Focus', 'year': 2010}, {'make': 'Hyundai', 'model': 'i20', 'year': 2016},
+     {'make': 'Volkswagen', 'model': 'Golf', 'year': 2021}],
+]
+
+
+def synthetic_parts(count, seed=1):
+    rng = random.Random(seed)
+    for part_id in range(1, count + 1):
+        brand, part = rng.choice(BRANDS), rng.choice(PARTS)
+        make = rng.choice(list(MAKES))
+        model = rng.choice(MAKES[make])
+        year = rng.randint(2000, 2022)
+        yield {
+            'id': part_id,
+            'name': f'{rng.choice(POSITIONS)} {part} {brand}'.strip(),
+            'part_number': f'{brand[:2].upper()}-{rng.randint(1000, 99999)}',
+            'brand': brand,
+            'compatibility': f'{make} {model} {year}-{year + rng.randint(0, 6)}',
+            'description': f'{part} for {make} {model}. OEM quality replacement, {rng.randint(1, 4)} year warranty.',
+            'category': rng.choice(CATEGORIES),
+            'is_active': rng.random() > 0.05,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--parts', type=int, default=100000)
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    index = SearchIndex()
+    started = time.perf_counter()
+    index.replace_all(synthetic_parts(args.parts))
+    print(f'Indexed {len(index)} parts in {time.perf_counter() - started:.2f} s')
+
+    print(f'{"query":24} {"cold":>10} {"cached":>10}')
+    for query in QUERIES:
+        cold = cached = 0.0
+        for _ in range(args.rounds):
+            index._results.clear()
+            started = time.perf_counter()
+            results = index.search(query, limit=args.limit)
+            cold += time.perf_counter() - started
+            started = time.perf_counter()
+            index.search(query, limit=args.limit)
+            cached += time.perf_counter() - started
+        total = len(index.search(query))
+        print(f'{query!r:24} {cold / args.rounds * 1000:7.3f} ms {cached / args.rounds * 1000:7.3f} ms'
+              f'  ({total} matches, top {len(results)})')
+
+    suggestions = SuggestIndex()
+    started = time.perf_counter()
+    suggestions.replace_all(synthetic_parts(args.parts), [])
+    print(f'\nBuilt suggestions in {time.perf_counter() - started:.2f} s')
+
+    print(f'{"prefix":24} {"cold":>10} {"cached":>10}')
+    for prefix in PREFIXES:
+        cold = cached = 0.0
+        for _ in range(args.rounds):
+            suggestions._results.clear()
+            started = time.perf_counter()
+            suggestions.suggest(prefix)
+            cold += time.perf_counter() - started
+            started = time.perf_counter()
+            suggestions.suggest(prefix)
+            cached += time.perf_counter() - started
+        print(f'{prefix!r:24} {cold / args.rounds * 1000:7.3f} ms {cached / args.rounds * 1000:7.3f} ms')
+
+    fitments = CompatibilityIndex()
+    started = time.perf_counter()
+    fitments.replace_all(synthetic_parts(args.parts))
+    print(f'\nFiled {len(fitments)} parts by vehicle in {time.perf_counter() - started:.2f} s')
+
+    print(f'{"vehicles":24} {"first":>10} {"steady":>10}')
+    for garage in GARAGES:
+        started = time.perf_counter()
+        fitting = fitments.parts_for(garage)
+        first = time.perf_counter() - started
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            fitments.parts_for(garage)
+        steady = (time.perf_counter() - started) / args.rounds
+        print(f'{len(garage):<24} {first * 1000:7.3f} ms {steady * 1000:7.3f} ms  ({len(fitting)} parts)')
+
+
+if __name__ == '__main__':
+    main()
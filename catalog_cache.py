@@ -0,0 +1,204 @@
+"""
+Read-through cache for Future Mech catalog pages
+The home, services and car parts pages read services and car_parts, which
+only change through the admin APIs. CatalogCache keeps those query results
+in an in-process LRU for ``ttl`` seconds, and the admin write paths call
+invalidate() after committing, so edits show at once instead of when entries
+age out. Stock changes with every checkout without invalidating anything,
+so ``ttl`` also bounds how stale a stock count can be.
+
+A missing or expired key is computed by one request while concurrent
+requests for it wait and reuse the result, so an invalidation under load
+costs one query rather than one per request.
+
+With ``store_dir`` set, the workers on a host share the cache through that
+directory (which must be private to the app, as values are pickled):
+
+- invalidate() replaces a generation file there, which every worker stats
+  before trusting its memory, so one worker's edit clears them all
+- computed values are written there and read by the other workers, and a
+  lock file per key lets one worker on the host compute each key
+
+Without a store, other workers pick up an edit when their entries expire.
+"""
+
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # no flock (Windows): workers compute shared keys independently
+    fcntl = None
+
+
+GENERATION_FILE = 'generation'
+
+_MISSING = object()
+
+
+class CatalogCache:
+    """Versioned read-through LRU of catalog query results, with single-flight loads"""
+
+    def __init__(self, ttl=60, max_entries=256, store_dir=None, logger=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.store_dir = store_dir or None
+        self.logger = logger
+        self._entries = OrderedDict()   # key -> (monotonic expiry, value)
+        self._loading = {}              # key -> lock held by the request computing it
+        self._token = 0                 # bumped on invalidation; loads started before one are not kept
+        self._stamp = None              # generation file (inode, mtime) the entries belong to
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, conn_factory, compute):
+        """Value for ``key`` from memory, the shared store, or ``compute(conn)`` on a miss"""
+        self._check_generation()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() < entry[0]:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            loading = self._loading.setdefault(key, threading.Lock())
+
+        with loading:
+            with self._lock:
+                # Filled by the request we waited for
+                entry = self._entries.get(key)
+                if entry is not None and time.monotonic() < entry[0]:
+                    self.hits += 1
+                    return entry[1]
+                token = self._token
+                self.misses += 1
+            try:
+                expires_at, value = self._load(key, conn_factory, compute)
+                with self._lock:
+                    if token == self._token:
+                        self._entries[key] = (expires_at, value)
+                        self._entries.move_to_end(key)
+                        while len(self._entries) > self.max_entries:
+                            self._entries.popitem(last=False)
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+        return value
+
+    def invalidate(self):
+        """Drop every entry, here and (with a store) in every worker; call after committing a catalog write"""
+        with self._lock:
+            self._entries.clear()
+            self._token += 1
+        if not self.store_dir:
+            return
+        path = os.path.join(self.store_dir, GENERATION_FILE)
+        try:
+            temp_path = f'{path}.{os.getpid()}.tmp'
+            with open(temp_path, 'w') as handle:
+                handle.write(str(time.time_ns()))
+            os.replace(temp_path, path)
+            for name in os.listdir(self.store_dir):
+                if name.endswith('.pickle'):
+                    try:
+                        os.remove(os.path.join(self.store_dir, name))
+                    except FileNotFoundError:
+                        pass
+        except OSError as e:
+            if self.logger:
+                self.logger.error(f'Catalog cache invalidation error: {str(e)}')
+        # This worker is already clear; don't clear it again for its own generation
+        stamp = self._read_stamp()
+        with self._lock:
+            self._stamp = stamp
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                    'shared': self.store_dir is not None}
+
+    def _read_stamp(self):
+        try:
+            stat = os.stat(os.path.join(self.store_dir, GENERATION_FILE))
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _check_generation(self):
+        """Clear this worker's entries if another worker has invalidated since (one stat)"""
+        if not self.store_dir:
+            return
+        stamp = self._read_stamp()
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            if stamp != self._stamp:
+                self._entries.clear()
+                self._token += 1
+                self._stamp = stamp
+
+    def _load(self, key, conn_factory, compute):
+        """(monotonic expiry, value) from the shared store, or freshly computed"""
+        if not self.store_dir:
+            return time.monotonic() + self.ttl, compute(conn_factory())
+        path = os.path.join(self.store_dir, hashlib.sha1(repr(key).encode('utf-8')).hexdigest())
+        with self._store_lock(f'{path}.lock'):
+            value, age = self._read_store(f'{path}.pickle')
+            if value is _MISSING:
+                stamp = self._stamp
+                value, age = compute(conn_factory()), 0.0
+                if self._read_stamp() == stamp:
+                    self._write_store(f'{path}.pickle', value)
+        return time.monotonic() + self.ttl - age, value
+
+    @contextmanager
+    def _store_lock(self, path):
+        if fcntl is None:
+            yield
+            return
+        try:
+            handle = open(path, 'a')
+        except OSError:
+            yield
+            return
+        with handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _read_store(self, path):
+        """(value, age in seconds) of a stored entry of the current generation, or (_MISSING, 0)"""
+        try:
+            stat = os.stat(path)
+            age = time.time() - stat.st_mtime
+            if age >= self.ttl or (self._stamp is not None and stat.st_mtime_ns < self._stamp[1]):
+                return _MISSING, 0.0
+            with open(path, 'rb') as handle:
+                return pickle.load(handle), max(age, 0.0)
+        except FileNotFoundError:
+            return _MISSING, 0.0
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f'Catalog cache read error: {str(e)}')
+            return _MISSING, 0.0
+
+    def _write_store(self, path, value):
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(temp_path, 'wb') as handle:
+                pickle.dump(value, handle, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f'Catalog cache write error: {str(e)}')
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
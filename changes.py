@@ -0,0 +1,163 @@
+"""
+Change versions for Future Mech dashboards
+bookings, orders and notifications each carry a change_version column. Every
+write to one of them takes the entity's next number from change_versions and
+stamps it on the rows it touched, so a dashboard can ask for "everything
+changed since version N" instead of reloading whole lists.
+
+The counter row stays locked until the writing transaction commits, so the
+versions of one entity become visible strictly in order and a client that
+has seen version N can never later miss a row stamped below it. Since every
+writer of the entity queues on that lock, bump_version must be the last
+statement before the commit.
+
+car_parts and services use the same counters so each worker's search and
+suggestion indexes can pick up catalog edits (see search.py).
+
+Clients hold a single opaque token ("<bookings>.<orders>.<notifications>")
+returned by /api/dashboard/changes and send it back as ?since=. When nothing
+has changed the endpoint costs one primary-key read of change_versions.
+"""
+
+from admin_lists import ADMIN_LISTS
+
+
+ENTITIES = ('bookings', 'orders', 'notifications')
+
+# Rows returned per entity; a client further behind than this reloads in full
+MAX_CHANGES = 200
+
+# Admin list columns plus what the service dashboard's job cards need
+BOOKING_COLUMNS = dict(ADMIN_LISTS['bookings'].columns, remarks='b.remarks', completed_at='b.completed_at',
+                       assigned_to='b.assigned_to', change_version='b.change_version')
+BOOKING_FROM = ADMIN_LISTS['bookings'].from_sql
+
+ORDER_COLUMNS = dict(ADMIN_LISTS['orders'].columns, change_version='o.change_version')
+ORDER_FROM = ADMIN_LISTS['orders'].from_sql
+
+NOTIFICATION_COLUMNS = {
+    'id': 'id', 'role': 'role', 'message': 'message', 'type': 'type', 'related_id': 'related_id',
+    'created_at': 'created_at', 'change_version': 'change_version',
+}
+
+
+def _select(columns, from_sql):
+    return f"SELECT {', '.join(f'{sql} AS {name}' for name, sql in columns.items())} FROM {from_sql}"
+
+
+def bump_version(cur, entity, ids):
+    """Stamp rows ``ids`` of ``entity`` with its next change version; runs on the caller's cursor"""
+    ids = [row_id for row_id in ids if row_id is not None]
+    if not ids:
+        return None
+    cur.execute("""
+        INSERT INTO change_versions (entity, version) VALUES (%s, LAST_INSERT_ID(1))
+        ON DUPLICATE KEY UPDATE version = LAST_INSERT_ID(version + 1)
+    """, (entity,))
+    cur.execute("SELECT LAST_INSERT_ID() AS version")
+    version = cur.fetchone()['version']
+    placeholders = ','.join(['%s'] * len(ids))
+    cur.execute(f"UPDATE {entity} SET change_version = %s WHERE id IN ({placeholders})", [version] + list(ids))
+    return version
+
+
+def current_versions(cur):
+    cur.execute("SELECT entity, version FROM change_versions")
+    versions = dict.fromkeys(ENTITIES, 0)
+    versions.update((row['entity'], row['version']) for row in cur.fetchall())
+    return versions
+
+
+def format_token(versions):
+    return '.'.join(str(versions[entity]) for entity in ENTITIES)
+
+
+def parse_token(token):
+    """Versions from a ?since= token, or None if it is missing or malformed"""
+    try:
+        values = [int(part) for part in (token or '').split('.')]
+    except ValueError:
+        return None
+    if len(values) != len(ENTITIES):
+        return None
+    return dict(zip(ENTITIES, values))
+
+
+def booking_rows(cur, conditions, params, order_by='b.scheduled_date', limit=None):
+    """Bookings with the columns shared by the admin and service dashboards"""
+    sql = _select(BOOKING_COLUMNS, BOOKING_FROM)
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += f' ORDER BY {order_by}'
+    if limit:
+        sql += ' LIMIT %s'
+        params = list(params) + [limit]
+    cur.execute(sql, params)
+    return cur.fetchall()
+
+
+def _scope(entity, role, user_id):
+    """Conditions limiting an entity to what one dashboard user may see, or None for nothing"""
+    if entity == 'bookings':
+        if role == 'admin':
+            return [], []
+        if role == 'service':
+            # Jobs reassigned away still reach their previous technician, to be dropped
+            return ['(b.assigned_to = %s OR b.previous_assigned_to = %s)'], [user_id, user_id]
+        return ['b.user_id = %s'], [user_id]
+    if entity == 'orders':
+        if role == 'admin':
+            return [], []
+        if role == 'client':
+            return ['o.user_id = %s'], [user_id]
+        return None
+    return ["role IN (%s, 'all')"], [role]
+
+
+def _changed_rows(cur, entity, conditions, params, since):
+    if entity == 'bookings':
+        return booking_rows(cur, conditions + ['b.change_version > %s'], params + [since],
+                            order_by='b.change_version', limit=MAX_CHANGES + 1)
+    if entity == 'orders':
+        sql, column = _select(ORDER_COLUMNS, ORDER_FROM), 'o.change_version'
+    else:
+        sql, column = _select(NOTIFICATION_COLUMNS, 'notifications'), 'change_version'
+    conditions = conditions + [f'{column} > %s']
+    cur.execute(f"{sql} WHERE {' AND '.join(conditions)} ORDER BY {column} LIMIT %s",
+                params + [since, MAX_CHANGES + 1])
+    return cur.fetchall()
+
+
+def dashboard_changes(cur, role, user_id, since_token):
+    """Rows changed since ``since_token`` that this user can see
+
+    Returns {'version': token, 'changes': {entity: rows}, 'reset': [entities]}.
+    Entities listed in 'reset' changed too much (or the token was unusable)
+    and should be reloaded in full.
+    """
+    versions = current_versions(cur)
+    since = parse_token(since_token)
+    result = {'version': format_token(versions), 'changes': {}, 'reset': []}
+    if since is None:
+        result['reset'] = list(ENTITIES)
+        return result
+
+    for entity in ENTITIES:
+        if since[entity] > versions[entity]:
+            # Token from before the counters were reset
+            result['reset'].append(entity)
+            continue
+        if versions[entity] == since[entity]:
+            continue
+        scope = _scope(entity, role, user_id)
+        if scope is None:
+            continue
+        rows = _changed_rows(cur, entity, scope[0], scope[1], since[entity])
+        if entity == 'bookings' and role == 'service':
+            rows = [row if row['assigned_to'] == user_id else {'id': row['id'], 'assigned_to': row['assigned_to']}
+                    for row in rows]
+        if len(rows) > MAX_CHANGES:
+            result['reset'].append(entity)
+        elif rows:
+            result['changes'][entity] = rows
+    return result
@@ -0,0 +1,329 @@
+"""
+Vehicle compatibility for Future Mech car parts
+car_parts.compatibility is free text ("Toyota Corolla 2010-2015, Camry
+2012+", "All Honda models", "Universal") or a JSON list of such strings or
+of {"make", "model", "year_from", "year_to"} objects. parse_compatibility
+turns it into Fitment entries; a missing model means every model of the
+make and a missing year means the range is open on that side.
+
+CompatibilityIndex keeps, per (make, model), a segment table of the year
+ranges: the sorted range boundaries split the years into segments, each
+holding the set of parts that fit throughout it, so finding the parts for
+one vehicle is a bisect and a few set unions however large the catalog.
+Segment tables are rebuilt lazily, only for the keys a change touched.
+"""
+
+import json
+import re
+import threading
+import unicodedata
+from bisect import bisect_right
+from collections import namedtuple
+from functools import lru_cache
+
+
+Fitment = namedtuple('Fitment', 'make model year_from year_to')
+
+# Open ends of a year range
+MIN_YEAR = 0
+MAX_YEAR = 9999
+
+# Makes recognised in free text, by their search words; aliases map to one name
+MAKES = {
+    'acura': 'acura', 'alfa romeo': 'alfa romeo', 'aston martin': 'aston martin', 'audi': 'audi',
+    'bentley': 'bentley', 'bmw': 'bmw', 'buick': 'buick', 'cadillac': 'cadillac', 'chevrolet': 'chevrolet',
+    'chevy': 'chevrolet', 'chrysler': 'chrysler', 'citroen': 'citroen', 'dacia': 'dacia', 'daewoo': 'daewoo',
+    'datsun': 'datsun', 'dodge': 'dodge', 'ferrari': 'ferrari', 'fiat': 'fiat', 'ford': 'ford', 'gmc': 'gmc',
+    'honda': 'honda', 'hyundai': 'hyundai', 'infiniti': 'infiniti', 'isuzu': 'isuzu', 'jaguar': 'jaguar',
+    'jeep': 'jeep', 'kia': 'kia', 'lamborghini': 'lamborghini', 'land rover': 'land rover', 'lexus': 'lexus',
+    'lincoln': 'lincoln', 'mahindra': 'mahindra', 'maruti': 'maruti suzuki', 'maruti suzuki': 'maruti suzuki',
+    'maserati': 'maserati', 'mazda': 'mazda', 'mercedes': 'mercedes benz', 'mercedes benz': 'mercedes benz',
+    'mg': 'mg', 'mini': 'mini', 'mitsubishi': 'mitsubishi', 'nissan': 'nissan', 'opel': 'opel',
+    'peugeot': 'peugeot', 'porsche': 'porsche', 'ram': 'ram', 'renault': 'renault', 'seat': 'seat',
+    'skoda': 'skoda', 'subaru': 'subaru', 'suzuki': 'suzuki', 'tata': 'tata', 'tesla': 'tesla',
+    'toyota': 'toyota', 'vauxhall': 'vauxhall', 'volkswagen': 'volkswagen', 'vw': 'volkswagen',
+    'volvo': 'volvo',
+}
+LONGEST_MAKE = max(len(name.split()) for name in MAKES)
+
+# Words that say nothing about the vehicle ("fits all Toyota models")
+FILLER_WORDS = {'fits', 'fit', 'for', 'all', 'models', 'model', 'compatible', 'with', 'years', 'year',
+                'vehicles', 'vehicle', 'cars', 'car', 'only', 'and', 'the'}
+UNIVERSAL_WORDS = {'universal', 'any', 'every'}
+
+WORD_RE = re.compile(r'[a-z0-9]+')
+SEGMENT_RE = re.compile(r'[;,\n|]')
+# Alternatives inside one segment; one without years takes those after it ("Golf/Polo 2009-2017")
+ALTERNATIVE_RE = re.compile(r'/|\s&\s|\sand\s(?!(?:up|newer|later|on)\b)', re.IGNORECASE)
+RANGE_RE = re.compile(
+    r"\b((?:19|20)\d{2})\s*(?:-|–|to)\s*((?:19|20)\d{2}|\d{2}\b|present|current|now|on(?:wards?)?|later)?"
+    r"|\b((?:19|20)\d{2})\s*(?:\+|(?:and\s+)?(?:up|newer|later|on(?:wards?)?)\b)"
+    r"|\b((?:19|20)\d{2})\b",
+    re.IGNORECASE)
+# Engine and trim details ("1.8L", "2.0 TDI") that vehicles are not registered with
+ENGINE_RE = re.compile(r'\b\d\.\d\s*l?\b\S*', re.IGNORECASE)
+
+
+def tokenize(text):
+    """Lower-case, accent-free alphanumeric words of ``text`` (as search.tokenize)"""
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii')
+    return WORD_RE.findall(text.lower())
+
+
+def model_key(model):
+    """Compact form a model is indexed under ("CR-V" and "CRV" both become "crv")"""
+    return ''.join(tokenize(model)) or None
+
+
+def _make_at(words, start):
+    """(canonical make, words it used) for a make name starting at words[start], or (None, 0)"""
+    for length in range(min(LONGEST_MAKE, len(words) - start), 0, -1):
+        make = MAKES.get(' '.join(words[start:start + length]))
+        if make:
+            return make, length
+    return None, 0
+
+
+def _years(segment):
+    """(year_from, year_to, text without the years) for one segment"""
+    ranges = []
+    for match in RANGE_RE.finditer(segment):
+        start, end, open_start, single = match.groups()
+        if start:
+            first = int(start)
+            if not end or not end.isdigit():
+                last = None if end else first
+            elif len(end) == 2:
+                last = first // 100 * 100 + int(end)
+            else:
+                last = int(end)
+        elif open_start:
+            first, last = int(open_start), None
+        else:
+            first = last = int(single)
+        ranges.append((first, last))
+    if not ranges:
+        return None, None, segment
+    # Several ranges in one segment ("2005-2008 2010") widen to cover them all
+    year_from = min(first for first, _ in ranges)
+    year_to = None if any(last is None for _, last in ranges) else max(last for _, last in ranges)
+    return year_from, year_to, RANGE_RE.sub(' ', segment)
+
+
+def _parse_text(text, make=None, model=None):
+    """Fitments in one free-text compatibility string; a make (and model) carries over to later segments"""
+    fitments = []
+    for segment in SEGMENT_RE.split(text):
+        alternatives = [_years(alternative) for alternative in ALTERNATIVE_RE.split(ENGINE_RE.sub(' ', segment))]
+        shared = (None, None)
+        for position in range(len(alternatives) - 1, -1, -1):
+            year_from, year_to, rest = alternatives[position]
+            if year_from is None:
+                alternatives[position] = shared + (rest,)
+            else:
+                shared = (year_from, year_to)
+        for year_from, year_to, rest in alternatives:
+            words = [word for word in tokenize(rest) if word not in FILLER_WORDS]
+            if not words and year_from is None:
+                continue
+            if UNIVERSAL_WORDS.intersection(words):
+                fitments.append(Fitment(None, None, None, None))
+                continue
+            for position in range(len(words)):
+                found, length = _make_at(words, position)
+                if found:
+                    make, model = found, ' '.join(words[position + length:]) or None
+                    break
+            else:
+                if words:
+                    model = ' '.join(words)
+            if make:
+                fitments.append(Fitment(make, model, year_from, year_to))
+    return fitments
+
+
+def _parse_object(item, make=None):
+    item = {str(key).lower(): value for key, value in item.items()}
+    make_words = ' '.join(tokenize(item.get('make'))) or make
+    make = MAKES.get(make_words, make_words)
+    if not make:
+        return []
+    years = item.get('years')
+    if isinstance(years, str):
+        year_from, year_to, _ = _years(years)
+    else:
+        year_from, year_to = item.get('year_from', item.get('year')), item.get('year_to', item.get('year'))
+    models = item.get('models', item.get('model'))
+    models = models if isinstance(models, list) else [models]
+    fitments = []
+    for model in models:
+        try:
+            fitments.append(Fitment(make, ' '.join(tokenize(model)) or None,
+                                    int(year_from) if year_from else None, int(year_to) if year_to else None))
+        except (TypeError, ValueError):
+            fitments.extend(_parse_text(str(model), make))
+    return fitments
+
+
+@lru_cache(maxsize=8192)
+def parse_compatibility(text):
+    """Fitment entries in a car_parts.compatibility value; unreadable parts of it are skipped
+
+    Many parts share a compatibility string, so results are memoised (as tuples).
+    """
+    if not text or not str(text).strip():
+        return ()
+    try:
+        value = json.loads(text)
+    except (TypeError, ValueError):
+        return tuple(_parse_text(str(text)))
+
+    items = value if isinstance(value, list) else [value]
+    fitments = []
+    for item in items:
+        if isinstance(item, dict) and {'make', 'model', 'models'} & {str(key).lower() for key in item}:
+            fitments.extend(_parse_object(item))
+        elif isinstance(item, dict):
+            # {"Toyota": ["Corolla 2010-2015", "Camry"]}
+            for make, models in item.items():
+                for model in models if isinstance(models, list) else [models]:
+                    fitments.extend(_parse_text(f'{make} {model}' if model else str(make)))
+        elif isinstance(item, str):
+            fitments.extend(_parse_text(item))
+        elif isinstance(item, (int, float)) and not isinstance(item, bool):
+            fitments.extend(_parse_text(str(item)))
+    return tuple(fitments)
+
+
+class _YearRanges:
+    """Parts per year range for one (make, model), queried through a lazily built segment table"""
+
+    def __init__(self):
+        self.ranges = {}        # part_id -> [(first, last)]
+        self._bounds = None     # sorted segment start years
+        self._segments = None   # frozenset of part ids fitting throughout each segment
+        self._all = None
+
+    def add(self, part_id, first, last):
+        self.ranges.setdefault(part_id, []).append((first, last))
+        self._bounds = None
+
+    def remove(self, part_id):
+        if self.ranges.pop(part_id, None) is not None:
+            self._bounds = None
+
+    def _build(self):
+        bounds = sorted({first for ranges in self.ranges.values() for first, _ in ranges}
+                        | {last + 1 for ranges in self.ranges.values() for _, last in ranges if last < MAX_YEAR})
+        starts, ends = {}, {}
+        for part_id, ranges in self.ranges.items():
+            for first, last in ranges:
+                starts.setdefault(first, []).append(part_id)
+                ends.setdefault(last + 1, []).append(part_id)
+        # Sweep the boundaries, counting overlapping ranges of the same part
+        active, segments = {}, []
+        for bound in bounds:
+            for part_id in ends.get(bound, ()):
+                active[part_id] -= 1
+                if not active[part_id]:
+                    del active[part_id]
+            for part_id in starts.get(bound, ()):
+                active[part_id] = active.get(part_id, 0) + 1
+            segments.append(frozenset(active))
+        self._bounds, self._segments = bounds, segments
+        self._all = frozenset(self.ranges)
+
+    def at(self, year):
+        """Parts fitting ``year`` (every part of this make and model when the year is unknown)"""
+        if self._bounds is None:
+            self._build()
+        if year is None:
+            return self._all
+        position = bisect_right(self._bounds, year) - 1
+        return self._segments[position] if position >= 0 else frozenset()
+
+
+class CompatibilityIndex:
+    """Active car parts by the vehicles they fit"""
+
+    def __init__(self):
+        self._ranges = {}       # (make, model key or None) -> _YearRanges
+        self._parts = {}        # part_id -> keys it is filed under
+        self._universal = set()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._parts)
+
+    def _file(self, part):
+        if not part.get('is_active'):
+            return
+        keys = set()
+        for fitment in parse_compatibility(part.get('compatibility')):
+            if fitment.make is None:
+                self._universal.add(part['id'])
+                continue
+            first = fitment.year_from or MIN_YEAR
+            last = fitment.year_to or MAX_YEAR
+            if first > last:
+                first, last = last, first
+            key = (fitment.make, model_key(fitment.model))
+            ranges = self._ranges.get(key)
+            if ranges is None:
+                ranges = self._ranges[key] = _YearRanges()
+            ranges.add(part['id'], first, last)
+            keys.add(key)
+        if keys or part['id'] in self._universal:
+            self._parts[part['id']] = keys
+
+    def _unfile(self, part_id):
+        for key in self._parts.pop(part_id, ()):
+            ranges = self._ranges[key]
+            ranges.remove(part_id)
+            if not ranges.ranges:
+                del self._ranges[key]
+        self._universal.discard(part_id)
+
+    def add(self, part):
+        """File (or re-file) one car_parts row; inactive parts are dropped"""
+        with self._lock:
+            self._unfile(part['id'])
+            self._file(part)
+
+    def remove(self, part_id):
+        with self._lock:
+            self._unfile(part_id)
+
+    def replace_all(self, parts):
+        """Rebuild from scratch (built aside, then swapped in under the lock)"""
+        fresh = CompatibilityIndex()
+        for part in parts:
+            fresh._file(part)
+        with self._lock:
+            self._ranges, self._parts, self._universal = fresh._ranges, fresh._parts, fresh._universal
+
+    def parts_for(self, vehicles):
+        """Ids of active parts fitting any of ``vehicles`` (rows with make, model and year)"""
+        fitting = set()
+        with self._lock:
+            for vehicle in vehicles:
+                make_words = ' '.join(tokenize(vehicle.get('make')))
+                make = MAKES.get(make_words, make_words)
+                if not make:
+                    continue
+                try:
+                    year = int(vehicle['year']) if vehicle.get('year') else None
+                except (TypeError, ValueError):
+                    year = None
+                # Parts for the whole make, and for the model by each leading run of its words,
+                # so a "Corolla Altis" gets parts listed for the "Corolla"
+                words = tokenize(vehicle.get('model'))
+                for key in [None] + [''.join(words[:length]) for length in range(1, len(words) + 1)]:
+                    ranges = self._ranges.get((make, key))
+                    if ranges is not None:
+                        fitting |= ranges.at(year)
+            if fitting or vehicles:
+                fitting |= self._universal
+        return fitting
@@ -14,24 +14,78 @@ class Config:
     MYSQL_PORT = int(os.getenv("MYSQL_ADDON_PORT", 3306))
     SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
 
+    # MySQL Connection Pool (per worker process)
+    MYSQL_POOL_MIN_SIZE = int(os.getenv("MYSQL_POOL_MIN_SIZE", 1))
+    MYSQL_POOL_MAX_SIZE = int(os.getenv("MYSQL_POOL_MAX_SIZE", 10))
+    MYSQL_POOL_TIMEOUT = float(os.getenv("MYSQL_POOL_TIMEOUT", 10))  # seconds to wait for a free connection
+    MYSQL_POOL_MAX_IDLE = int(os.getenv("MYSQL_POOL_MAX_IDLE", 300))  # close spare connections idle this long
+    MYSQL_POOL_MAX_LIFETIME = int(os.getenv("MYSQL_POOL_MAX_LIFETIME", 1800))  # recycle connections this old
+    MYSQL_POOL_PING_INTERVAL = int(os.getenv("MYSQL_POOL_PING_INTERVAL", 30))  # ping on borrow after this much idle time
+
+    
+    # Inventory reservations (cart holds)
+    RESERVATION_TTL_MINUTES = int(os.getenv("RESERVATION_TTL_MINUTES", 15))
+    RESERVATION_SWEEP_INTERVAL = int(os.getenv("RESERVATION_SWEEP_INTERVAL", 60))  # seconds
+    RESERVATION_SWEEPER_ENABLED = os.getenv("RESERVATION_SWEEPER_ENABLED", "true").lower() in ['true', 'on', '1']
+    
+    # Admin dashboard statistics cache (seconds)
+    ADMIN_STATS_TTL = int(os.getenv("ADMIN_STATS_TTL", 30))
+    ANALYTICS_TTL = int(os.getenv("ANALYTICS_TTL", 300))
+    
+    # Server-sent events (/api/events); streams hold a thread each, keep EVENTS_MAX_SUBSCRIBERS below gunicorn --threads
+    EVENTS_POLL_INTERVAL = float(os.getenv("EVENTS_POLL_INTERVAL", 1))  # seconds between reads of the events table per worker
+    EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", 48))  # open streams per worker; clients beyond this poll instead
+    EVENTS_HEARTBEAT = int(os.getenv("EVENTS_HEARTBEAT", 15))  # seconds between keep-alive comments
+    EVENTS_STREAM_MAX_AGE = int(os.getenv("EVENTS_STREAM_MAX_AGE", 300))  # seconds before a stream ends and the browser reconnects
+    EVENTS_RETENTION_HOURS = int(os.getenv("EVENTS_RETENTION_HOURS", 24))  # flask prune-events
     
     # Email Configuration (SMTP)
     MAIL_SERVER = os.environ.get('MAIL_SERVER') or 'smtp.gmail.com'
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 587)
     MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', 'true').lower() in ['true', 'on', '1']
-    MAIL_USERNAME = os.environ.get('MAIL_USERNAME') or 'your-email@gmail.com'
+    MAIL_USERNAME = os.environ.get('MAIL_USERNAME', 'your-email@gmail.com')  # empty to skip SMTP login
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD') or 'your-app-password'
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER') or 'noreply@futuremech.com'
+    MAIL_SMTP_TIMEOUT = int(os.getenv("MAIL_SMTP_TIMEOUT", 30))  # seconds
+    MAIL_SMTP_IDLE_TIMEOUT = int(os.getenv("MAIL_SMTP_IDLE_TIMEOUT", 60))  # close the worker's SMTP connection after this much idle time
+    
+    # Email outbox worker (flask send-emails)
+    MAIL_OUTBOX_BATCH_SIZE = int(os.getenv("MAIL_OUTBOX_BATCH_SIZE", 50))
+    MAIL_OUTBOX_POLL_INTERVAL = float(os.getenv("MAIL_OUTBOX_POLL_INTERVAL", 5))  # seconds
+    MAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("MAIL_OUTBOX_MAX_ATTEMPTS", 6))
+    MAIL_OUTBOX_RETRY_BACKOFF = int(os.getenv("MAIL_OUTBOX_RETRY_BACKOFF", 60))  # seconds, doubled per attempt
     
     # Stripe Configuration
     # Replace the Stripe keys with actual test keys
     STRIPE_PUBLIC_KEY = os.environ.get('STRIPE_PUBLIC_KEY') or 'pk_test_51PYourActualPublicKeyHere'
     STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY') or 'sk_test_51PYourActualSecretKeyHere'
     
+    # PDI report rendering (process pool per web worker)
+    REPORTS_DIR = os.getenv("REPORTS_DIR", "reports")
+    REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", 2))
+    REPORT_RETENTION_DAYS = int(os.getenv("REPORT_RETENTION_DAYS", 30))  # keep superseded versions this long (flask prune-reports)
+    # Internal nginx location that maps to REPORTS_DIR (e.g. /protected-reports/); empty streams from Flask
+    REPORTS_ACCEL_REDIRECT_PREFIX = os.getenv("REPORTS_ACCEL_REDIRECT_PREFIX", "")
+    
+    # Car parts search (in-process index per worker; false uses the MySQL FULLTEXT index instead)
+    SEARCH_INDEX_ENABLED = os.getenv("SEARCH_INDEX_ENABLED", "true").lower() in ['true', 'on', '1']
+    SEARCH_SYNC_INTERVAL = float(os.getenv("SEARCH_SYNC_INTERVAL", 1))  # seconds between catalog version checks
+    SEARCH_REBUILD_INTERVAL = int(os.getenv("SEARCH_REBUILD_INTERVAL", 3600))  # full rebuild, drops parts deleted by other workers
+    SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", 500))
+    SUGGEST_LIMIT = int(os.getenv("SUGGEST_LIMIT", 8))  # typeahead suggestions per prefix
+    SUGGEST_MAX_AGE = int(os.getenv("SUGGEST_MAX_AGE", 60))  # seconds browsers may reuse a suggestion list
+    
+    # Catalog page cache (services and car parts; cleared by the admin catalog APIs)
+    CATALOG_CACHE_TTL = int(os.getenv("CATALOG_CACHE_TTL", 60))  # seconds; also bounds how stale stock counts get
+    CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", 256))  # entries per worker
+    CATALOG_CACHE_DIR = os.getenv("CATALOG_CACHE_DIR", "cache/catalog")  # shared by this host's workers; empty keeps each worker's own
+    
     # File Upload Configuration
     UPLOAD_FOLDER = 'static/uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf'}
+    IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 1))  # processes resizing uploads into derivatives
+    IMAGE_GC_GRACE_MINUTES = int(os.getenv("IMAGE_GC_GRACE_MINUTES", 30))  # never delete images stored more recently than this
     
     # Security Configuration
     CSRF_ENABLED = True
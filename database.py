@@ -0,0 +1,347 @@
+"""
+Database access layer for Future Mech
+Pooled MySQLdb connections shared by every request in a worker process
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import MySQLdb
+import MySQLdb.cursors
+from flask import g
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be borrowed within the pool timeout"""
+
+
+class PooledConnection:
+    """A raw MySQLdb connection plus the bookkeeping the pool needs"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+    def age(self, now=None):
+        return (now or time.monotonic()) - self.created_at
+
+    def idle_for(self, now=None):
+        return (now or time.monotonic()) - self.last_used
+
+    def close(self):
+        try:
+            self.raw.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of MySQLdb connections
+
+    - keeps at least ``min_size`` connections open and never more than ``max_size``
+    - pings connections on borrow once they have been idle for ``ping_interval`` seconds
+    - closes spare connections idle longer than ``max_idle`` seconds
+    - recycles connections older than ``max_lifetime`` seconds
+    """
+
+    def __init__(self, connect_kwargs, min_size=1, max_size=10, timeout=10,
+                 max_idle=300, max_lifetime=1800, ping_interval=30, logger=None):
+        self.connect_kwargs = connect_kwargs
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size, 1)
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+        self.logger = logger
+
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+
+        # Counters exposed through stats()
+        self._borrows = 0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _connect(self):
+        return PooledConnection(MySQLdb.connect(**self.connect_kwargs))
+
+    def _is_healthy(self, conn, now):
+        if self.max_lifetime and conn.age(now) > self.max_lifetime:
+            return False
+        if conn.idle_for(now) >= self.ping_interval:
+            try:
+                conn.raw.ping()
+            except Exception:
+                return False
+        return True
+
+    def _discard(self, conn):
+        """Close a connection and give its slot back (caller holds the lock)"""
+        conn.close()
+        self._size -= 1
+        self._discarded += 1
+
+    def prefill(self):
+        """Open connections until the pool holds ``min_size`` of them"""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._created += 1
+                self._idle.append(conn)
+                self._cond.notify()
+
+    def acquire(self):
+        """Borrow a healthy connection, blocking up to ``timeout`` seconds"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        while True:
+            conn = self._reserve(deadline)
+            if conn is None:
+                break
+            # Ping outside the lock so a slow server never stalls other borrowers
+            if self._is_healthy(conn, time.monotonic()):
+                with self._cond:
+                    return self._checkout(conn, started)
+            with self._cond:
+                self._discard(conn)
+                self._cond.notify()
+
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._created += 1
+            return self._checkout(conn, started)
+
+    def _reserve(self, deadline):
+        """Pop an idle connection, or reserve a slot for a new one and return None"""
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    if self._idle:
+                        return self._idle.pop()
+
+                    if self._size < self.max_size:
+                        # Reserve the slot now and do the handshake outside the lock
+                        self._size += 1
+                        return None
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(f'No database connection available after {self.timeout}s')
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+    def _checkout(self, conn, started):
+        wait = time.monotonic() - started
+        self._in_use += 1
+        self._borrows += 1
+        self._total_wait += wait
+        self._max_wait = max(self._max_wait, wait)
+        conn.last_used = time.monotonic()
+        return conn
+
+    def release(self, conn, discard=False):
+        """Return a borrowed connection, resetting any open transaction"""
+        if not discard:
+            try:
+                conn.raw.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            now = time.monotonic()
+            if discard or (self.max_lifetime and conn.age(now) > self.max_lifetime):
+                self._discard(conn)
+            else:
+                conn.last_used = now
+                self._idle.append(conn)
+            self._evict_idle(now)
+            self._cond.notify()
+
+    def _evict_idle(self, now):
+        """Close spare connections idle longer than max_idle (caller holds the lock)"""
+        if not self.max_idle:
+            return
+        # The oldest idle connections sit at the left end of the deque
+        while self._idle and self._size > self.min_size and self._idle[0].idle_for(now) > self.max_idle:
+            self._discard(self._idle.popleft())
+
+    def evict_idle(self):
+        with self._cond:
+            self._evict_idle(time.monotonic())
+
+    def close_all(self):
+        with self._cond:
+            while self._idle:
+                self._discard(self._idle.popleft())
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for use outside a request context"""
+        conn = self.acquire()
+        try:
+            yield conn.raw
+        except MySQLdb.OperationalError:
+            self.release(conn, discard=True)
+            raise
+        except Exception:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'waiting': self._waiting,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'borrows': self._borrows,
+                'timeouts': self._timeouts,
+                'created': self._created,
+                'discarded': self._discarded,
+                'avg_wait_ms': round(self._total_wait / self._borrows * 1000, 3) if self._borrows else 0.0,
+                'max_wait_ms': round(self._max_wait * 1000, 3),
+            }
+
+
+class MySQLPool:
+    """Drop-in replacement for flask_mysqldb.MySQL backed by a ConnectionPool
+
+    ``mysql.connection`` borrows one connection per app context and hands it
+    back to the pool on teardown instead of closing it.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('MYSQL_POOL_MIN_SIZE', 1)
+        app.config.setdefault('MYSQL_POOL_MAX_SIZE', 10)
+        app.config.setdefault('MYSQL_POOL_TIMEOUT', 10)
+        app.config.setdefault('MYSQL_POOL_MAX_IDLE', 300)
+        app.config.setdefault('MYSQL_POOL_MAX_LIFETIME', 1800)
+        app.config.setdefault('MYSQL_POOL_PING_INTERVAL', 30)
+        app.teardown_appcontext(self.teardown)
+
+    def _connect_kwargs(self):
+        config = self.app.config
+        kwargs = {
+            'host': config['MYSQL_HOST'],
+            'user': config['MYSQL_USER'],
+            'passwd': config['MYSQL_PASSWORD'],
+            'db': config['MYSQL_DB'],
+            'port': config.get('MYSQL_PORT', 3306),
+            'charset': config.get('MYSQL_CHARSET', 'utf8mb4'),
+            'use_unicode': True,
+            'cursorclass': MySQLdb.cursors.DictCursor,
+            'autocommit': False,
+        }
+        if config.get('MYSQL_CONNECT_TIMEOUT'):
+            kwargs['connect_timeout'] = config['MYSQL_CONNECT_TIMEOUT']
+        if config.get('MYSQL_SSL'):
+            kwargs['ssl'] = config['MYSQL_SSL']
+        return kwargs
+
+    @property
+    def pool(self):
+        """The pool for this process; rebuilt after a fork so workers never share sockets"""
+        pid = os.getpid()
+        if self._pool is None or self._pid != pid:
+            with self._lock:
+                if self._pool is None or self._pid != pid:
+                    config = self.app.config
+                    pool = ConnectionPool(
+                        self._connect_kwargs(),
+                        min_size=config['MYSQL_POOL_MIN_SIZE'],
+                        max_size=config['MYSQL_POOL_MAX_SIZE'],
+                        timeout=config['MYSQL_POOL_TIMEOUT'],
+                        max_idle=config['MYSQL_POOL_MAX_IDLE'],
+                        max_lifetime=config['MYSQL_POOL_MAX_LIFETIME'],
+                        ping_interval=config['MYSQL_POOL_PING_INTERVAL'],
+                        logger=self.app.logger,
+                    )
+                    # Open MYSQL_POOL_MIN_SIZE connections once per worker; a
+                    # database that is down only fails the requests that need it
+                    try:
+                        pool.prefill()
+                    except Exception as e:
+                        self.app.logger.error(f'Database pool prefill error: {str(e)}')
+                    self._pool = pool
+                    self._pid = pid
+        return self._pool
+
+    @property
+    def connection(self):
+        """Connection borrowed for the current app context"""
+        conn = g.get('_db_conn')
+        if conn is None:
+            conn = self.pool.acquire()
+            g._db_conn = conn
+        return conn.raw
+
+    @contextmanager
+    def transaction(self):
+        """Run the enclosed statements on the request connection as one unit of work
+
+        Yields a cursor; commits once when the block exits cleanly and rolls
+        back if it raises, so a request pays a single COMMIT (one fsync)
+        however many statements it issues.
+        """
+        conn = self.connection
+        cur = conn.cursor()
+        try:
+            yield cur
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    def teardown(self, exception):
+        conn = g.pop('_db_conn', None)
+        if conn is not None:
+            self.pool.release(conn, discard=isinstance(exception, MySQLdb.OperationalError))
+
+    def stats(self):
+        return self.pool.stats()
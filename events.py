@@ -0,0 +1,262 @@
+"""
+Server-sent events for Future Mech
+Writes that other users should see straight away (new notifications, new
+bookings, booking status changes) insert a row into the events table in the
+same transaction. Each web worker runs one tail thread that reads new rows
+every ``poll_interval`` seconds and fans them out to the /api/events streams
+it holds, so the database sees one small indexed query per worker rather
+than one poll per open tab. A worker that commits an event wakes its own tail
+thread at once; the other workers pick it up on their next poll.
+
+Streams are held by a request thread for their whole life, so the web server
+must run threaded workers (gunicorn ``--worker-class gthread``) and
+``max_subscribers`` must stay below the thread count, leaving threads free
+for ordinary requests. Clients that are turned away fall back to polling.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+
+
+# Ids of events whose transaction may still be in flight are re-read for this long
+GAP_TIMEOUT = 10  # seconds
+MAX_TRACKED_GAP = 1000
+REPLAY_LIMIT = 100
+
+
+def publish_event(cur, event_type, payload, roles=(), user_id=None):
+    """Record one event for ``roles`` and/or one user; runs on the caller's cursor so it commits with the write"""
+    cur.execute("""
+        INSERT INTO events (event_type, audience_roles, audience_user_id, payload)
+        VALUES (%s, %s, %s, %s)
+    """, (event_type, ','.join(roles), user_id, json.dumps(payload, default=str)))
+    return cur.lastrowid
+
+
+def _event(row):
+    return {
+        'id': row['id'],
+        'type': row['event_type'],
+        'roles': row['audience_roles'].split(',') if row['audience_roles'] else [],
+        'user_id': row['audience_user_id'],
+        'data': row['payload'],
+    }
+
+
+def format_sse(event=None, comment=None, retry=None):
+    """One text/event-stream message"""
+    lines = []
+    if comment is not None:
+        lines.append(f': {comment}')
+    if retry is not None:
+        lines.append(f'retry: {retry}')
+    if event is not None:
+        lines.append(f"id: {event['id']}")
+        lines.append(f"event: {event['type']}")
+        lines.extend(f'data: {line}' for line in event['data'].splitlines() or [''])
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscriber:
+    """One open event stream: who it is for and the events waiting to be sent"""
+
+    def __init__(self, role, user_id, queue_size):
+        self.role = role
+        self.user_id = user_id
+        self.queue = queue.Queue(queue_size)
+        self.closed = False
+
+    def wants(self, event):
+        if self.user_id is not None and event['user_id'] == self.user_id:
+            return True
+        return self.role in event['roles'] or 'all' in event['roles']
+
+    def put(self, event):
+        """Queue an event; a stream that has fallen this far behind is closed (the client reconnects and replays)"""
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.closed = True
+
+
+class EventBroker:
+    """Per-process fan-out of the events table to open /api/events streams"""
+
+    def __init__(self, db, poll_interval=1.0, max_subscribers=50, heartbeat=15,
+                 max_stream_age=300, queue_size=100, logger=None):
+        self.db = db
+        self.poll_interval = poll_interval
+        self.max_subscribers = max_subscribers
+        self.heartbeat = heartbeat
+        self.max_stream_age = max_stream_age
+        self.queue_size = queue_size
+        self.logger = logger
+
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._last_id = None
+        self._gaps = {}  # event id -> monotonic time it was first found missing
+
+    def subscribe(self, role, user_id):
+        """Register a stream; returns None when this worker already holds ``max_subscribers``"""
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            subscriber = Subscriber(role, user_id, self.queue_size)
+            self._subscribers.add(subscriber)
+            self._ensure_thread()
+        self._wakeup.set()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def wake(self):
+        """Read new events now instead of at the next poll (call after committing one)"""
+        self._wakeup.set()
+
+    def _ensure_thread(self):
+        """Start the tail thread for this process (caller holds the lock)"""
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        # A forked worker starts from the current end of the table, not the master's position
+        self._last_id = None
+        self._gaps = {}
+        self._pid = pid
+        self._thread = threading.Thread(target=self._tail, name='event-broker', daemon=True)
+        self._thread.start()
+
+    def _tail(self):
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            with self._lock:
+                if not self._subscribers:
+                    # Idle workers stop querying; the next subscriber starts from the end of the table
+                    self._last_id = None
+                    self._gaps = {}
+                    continue
+            try:
+                with self.db.pool.connection() as conn:
+                    events = self._read_new(conn)
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f'Event broker error: {str(e)}')
+                continue
+            if events:
+                self._dispatch(events)
+
+    def _read_new(self, conn):
+        cur = conn.cursor()
+        try:
+            if self._last_id is None:
+                cur.execute("SELECT COALESCE(MAX(id), 0) AS last_id FROM events")
+                self._last_id = cur.fetchone()['last_id']
+                return []
+
+            # Auto-increment ids become visible in commit order, not id order, so
+            # ids skipped over are re-read for a while before being given up on
+            now = time.monotonic()
+            self._gaps = {event_id: seen for event_id, seen in self._gaps.items() if now - seen < GAP_TIMEOUT}
+            gaps = list(self._gaps)
+            if gaps:
+                placeholders = ','.join(['%s'] * len(gaps))
+                cur.execute(f"""
+                    SELECT id, event_type, audience_roles, audience_user_id, payload FROM events
+                    WHERE id > %s OR id IN ({placeholders}) ORDER BY id
+                """, [self._last_id] + gaps)
+            else:
+                cur.execute("""
+                    SELECT id, event_type, audience_roles, audience_user_id, payload FROM events
+                    WHERE id > %s ORDER BY id
+                """, (self._last_id,))
+            rows = cur.fetchall()
+        finally:
+            cur.close()
+
+        for row in rows:
+            event_id = row['id']
+            if event_id in self._gaps:
+                del self._gaps[event_id]
+            elif event_id > self._last_id:
+                if event_id - self._last_id <= MAX_TRACKED_GAP:
+                    for missing in range(self._last_id + 1, event_id):
+                        self._gaps[missing] = now
+                self._last_id = event_id
+        return [_event(row) for row in rows]
+
+    def _dispatch(self, events):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            for event in events:
+                if subscriber.wants(event):
+                    subscriber.put(event)
+
+    def replay(self, conn, subscriber, last_event_id):
+        """Events after ``last_event_id`` for a reconnecting client (the most recent REPLAY_LIMIT)"""
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT id, event_type, audience_roles, audience_user_id, payload FROM events
+                WHERE id > %s ORDER BY id DESC LIMIT %s
+            """, (last_event_id, REPLAY_LIMIT))
+            rows = cur.fetchall()
+        finally:
+            cur.close()
+        return [event for event in map(_event, reversed(rows)) if subscriber.wants(event)]
+
+    def stream(self, subscriber, backlog=()):
+        """text/event-stream body: backlog, then live events with heartbeats until the stream ages out"""
+        deadline = time.monotonic() + self.max_stream_age
+        sent = set()
+        try:
+            yield format_sse(comment='connected', retry=5000)
+            for event in backlog:
+                sent.add(event['id'])
+                yield format_sse(event)
+            while not subscriber.closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    event = subscriber.queue.get(timeout=min(self.heartbeat, remaining))
+                except queue.Empty:
+                    yield format_sse(comment='keep-alive')
+                    continue
+                if event['id'] not in sent:
+                    yield format_sse(event)
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self):
+        with self._lock:
+            return {'subscribers': len(self._subscribers), 'last_event_id': self._last_id,
+                    'pending_gaps': len(self._gaps)}
+
+
+def prune_events(conn, retention_hours, batch_size=5000):
+    """Delete events older than ``retention_hours`` in batches; returns the number deleted"""
+    deleted = 0
+    cur = conn.cursor()
+    try:
+        while True:
+            cur.execute("DELETE FROM events WHERE created_at < NOW() - INTERVAL %s HOUR LIMIT %s",
+                        (retention_hours, batch_size))
+            conn.commit()
+            deleted += cur.rowcount
+            if cur.rowcount < batch_size:
+                return deleted
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
@@ -0,0 +1,253 @@
+"""
+Content-addressed storage for uploaded images
+Uploads are named by the SHA-256 of their bytes, so the same photo uploaded
+for ten car parts is stored once. uploaded_images has one row per stored
+file and image_refs one row per service / car part that shows it; a file and
+its derivatives are deleted only once the last reference is gone.
+
+Storing and collecting the same hash are serialized with a MySQL named lock,
+so a new upload can never reuse a file that is being deleted. Collection also
+skips files stored within the grace period, which covers the gap between
+saving an upload and inserting the row that references it.
+"""
+
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+
+from images import derivative_files, url_to_path
+
+
+CHUNK_SIZE = 64 * 1024
+
+# Owner kinds recorded in image_refs
+OWNER_TABLES = {
+    'service': 'services',
+    'car_part': 'car_parts',
+}
+
+
+def hash_to_temp(stream, directory):
+    """Copy ``stream`` into a temporary file in ``directory`` while hashing it
+
+    The upload is read in CHUNK_SIZE pieces, so memory use does not grow with
+    the file. Returns (sha256 hex digest, size, temporary path).
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.upload')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        # mkstemp creates the file owner-only; uploads are served as static files
+        os.chmod(temp_path, 0o644)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return digest.hexdigest(), size, temp_path
+
+
+@contextmanager
+def image_lock(conn, sha256, timeout=10):
+    """Hold the MySQL named lock for one content hash (lock names are capped at 64 chars)"""
+    name = f'img:{sha256[:60]}'
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT GET_LOCK(%s, %s) AS acquired", (name, timeout))
+        if not cur.fetchone()['acquired']:
+            raise TimeoutError(f'Timed out waiting for image lock {name}')
+        try:
+            yield
+        finally:
+            cur.execute("SELECT RELEASE_LOCK(%s)", (name,))
+    finally:
+        cur.close()
+
+
+def store_upload(conn, stream, directory, url_prefix, ext):
+    """Store an upload under its content hash; returns (url, path, created)
+
+    ``created`` is False when an identical file was already stored, in which
+    case the new copy is discarded.
+    """
+    sha256, size, temp_path = hash_to_temp(stream, directory)
+    filename = f'{sha256}{ext}'
+    path = os.path.join(directory, filename)
+    url = f'{url_prefix}/{filename}'
+    try:
+        with image_lock(conn, sha256):
+            cur = conn.cursor()
+            try:
+                cur.execute("""
+                    INSERT INTO uploaded_images (url, sha256, size) VALUES (%s, %s, %s)
+                    ON DUPLICATE KEY UPDATE last_used_at = NOW()
+                """, (url, sha256, size))
+                created = not os.path.exists(path)
+                if created:
+                    os.replace(temp_path, path)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return url, path, created
+
+
+def attach_image(cur, owner_type, owner_id, url):
+    """Point an owner's image reference at ``url``; returns the URL it replaced, if any
+
+    Runs on the caller's cursor so it commits with the owner's row.
+    """
+    cur.execute("SELECT image_url FROM image_refs WHERE owner_type = %s AND owner_id = %s FOR UPDATE",
+                (owner_type, owner_id))
+    row = cur.fetchone()
+    cur.execute("""
+        INSERT INTO image_refs (owner_type, owner_id, image_url) VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE image_url = VALUES(image_url)
+    """, (owner_type, owner_id, url))
+    if row and row['image_url'] != url:
+        return row['image_url']
+    return None
+
+
+def detach_image(cur, owner_type, owner_id):
+    """Drop an owner's image reference; returns the URL it pointed at, if any"""
+    cur.execute("SELECT image_url FROM image_refs WHERE owner_type = %s AND owner_id = %s FOR UPDATE",
+                (owner_type, owner_id))
+    row = cur.fetchone()
+    if not row:
+        return None
+    cur.execute("DELETE FROM image_refs WHERE owner_type = %s AND owner_id = %s", (owner_type, owner_id))
+    return row['image_url']
+
+
+def collect_image(conn, url, static_root, grace_minutes):
+    """Delete a stored image and its derivatives if nothing references it any more
+
+    Returns True if the file was deleted.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT sha256 FROM uploaded_images WHERE url = %s", (url,))
+        row = cur.fetchone()
+        if not row:
+            return False
+        with image_lock(conn, row['sha256']):
+            try:
+                cur.execute("""
+                    DELETE FROM uploaded_images
+                    WHERE url = %s AND last_used_at < NOW() - INTERVAL %s MINUTE
+                      AND NOT EXISTS (SELECT 1 FROM image_refs WHERE image_url = %s)
+                """, (url, grace_minutes, url))
+                deleted = cur.rowcount > 0
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            # Files go while the lock is still held, so no upload can adopt them meanwhile
+            if deleted:
+                path = url_to_path(static_root, url)
+                for file_path in [path] + derivative_files(path):
+                    try:
+                        os.remove(file_path)
+                    except FileNotFoundError:
+                        pass
+        return deleted
+    finally:
+        cur.close()
+
+
+def collect_orphaned_images(conn, static_root, grace_minutes, batch_size=500):
+    """Collect every stored image without references; returns the URLs deleted"""
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT i.url FROM uploaded_images i
+            LEFT JOIN image_refs r ON r.image_url = i.url
+            WHERE r.image_url IS NULL AND i.last_used_at < NOW() - INTERVAL %s MINUTE
+            LIMIT %s
+        """, (grace_minutes, batch_size))
+        urls = [row['url'] for row in cur.fetchall()]
+    finally:
+        cur.close()
+    return [url for url in urls if collect_image(conn, url, static_root, grace_minutes)]
+
+
+def adopt_legacy_images(conn, static_root, on_stored=None):
+    """Move uuid-named uploads into the content-addressed store
+
+    Every service / car part image under /static/uploads/ without an
+    image_refs row is re-stored under its hash (sharing a file with any
+    identical upload), its owner is pointed at the new URL and referenced,
+    and the old file is removed once no owner uses it. ``on_stored(path)``
+    is called for each newly stored file. Returns (owners updated, files removed).
+    """
+    updated, legacy_paths = 0, set()
+    for owner_type, table in OWNER_TABLES.items():
+        cur = conn.cursor()
+        try:
+            cur.execute(f"""
+                SELECT t.id, t.image_url FROM {table} t
+                LEFT JOIN image_refs r ON r.owner_type = %s AND r.owner_id = t.id
+                WHERE r.owner_id IS NULL AND t.image_url LIKE '/static/uploads/%%'
+            """, (owner_type,))
+            owners = cur.fetchall()
+        finally:
+            cur.close()
+
+        for owner in owners:
+            legacy_path = url_to_path(static_root, owner['image_url'])
+            if not os.path.exists(legacy_path):
+                continue
+            directory = os.path.dirname(legacy_path)
+            url_prefix = owner['image_url'].rsplit('/', 1)[0]
+            ext = os.path.splitext(legacy_path)[1].lower()
+            with open(legacy_path, 'rb') as stream:
+                url, path, created = store_upload(conn, stream, directory, url_prefix, ext)
+            if created and on_stored:
+                on_stored(path)
+
+            cur = conn.cursor()
+            try:
+                cur.execute(f"UPDATE {table} SET image_url = %s WHERE id = %s", (url, owner['id']))
+                attach_image(cur, owner_type, owner['id'], url)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
+            updated += 1
+            if path != legacy_path:
+                legacy_paths.add((owner['image_url'], legacy_path))
+
+    removed = 0
+    cur = conn.cursor()
+    try:
+        for legacy_url, legacy_path in legacy_paths:
+            still_used = False
+            for table in OWNER_TABLES.values():
+                cur.execute(f"SELECT 1 FROM {table} WHERE image_url = %s LIMIT 1", (legacy_url,))
+                still_used = still_used or cur.fetchone() is not None
+            if still_used:
+                continue
+            for file_path in [legacy_path] + derivative_files(legacy_path):
+                try:
+                    os.remove(file_path)
+                except FileNotFoundError:
+                    pass
+            removed += 1
+    finally:
+        cur.close()
+    return updated, removed
@@ -0,0 +1,162 @@
+"""
+Image derivatives for Future Mech uploads
+Every uploaded service / car part image is resized into thumb, card and full
+derivatives in WebP and JPEG, with EXIF and other metadata stripped, so
+catalog pages never ship the multi-megabyte original.
+
+For an upload stored as static/uploads/car_parts/<name>.jpg the pipeline writes
+    <name>_thumb.webp, <name>_thumb.jpg, <name>_card.webp, ...
+next to it, then <name>.json (the manifest of sizes actually produced) once
+every derivative is in place. Templates only reference derivatives after the
+manifest exists, so a page rendered mid-resize falls back to the original.
+"""
+
+import json
+import os
+
+from PIL import Image, ImageOps
+
+from process_pool import ProcessPool
+
+
+# size name -> bounding box (px) of the longest side
+SIZES = {
+    'thumb': 160,
+    'card': 480,
+    'full': 1200,
+}
+
+# file extension -> (Pillow format, save options)
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+UPLOADS_URL_PREFIX = '/static/uploads/'
+
+
+def derivative_path(original_path, size, ext):
+    return f"{os.path.splitext(original_path)[0]}_{size}.{ext}"
+
+
+def manifest_path(original_path):
+    return f"{os.path.splitext(original_path)[0]}.json"
+
+
+def derivative_files(original_path):
+    """Every file the pipeline may write for one upload"""
+    paths = [derivative_path(original_path, size, ext) for size in SIZES for ext in FORMATS]
+    paths.append(manifest_path(original_path))
+    return paths
+
+
+def url_to_path(static_root, url):
+    """Filesystem path of an /static/uploads/ URL, or None for anything else"""
+    if not url or not url.startswith(UPLOADS_URL_PREFIX):
+        return None
+    return os.path.join(static_root, url[len('/static/'):])
+
+
+def _save_atomic(image, path, image_format, options):
+    partial = f"{path}.{os.getpid()}.tmp"
+    try:
+        image.save(partial, image_format, **options)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+def _flatten(image):
+    """RGB copy of ``image`` with any transparency composited onto white (for JPEG)"""
+    if image.mode == 'RGB':
+        return image
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+    return background
+
+
+def generate_derivatives(original_path):
+    """Write every size/format derivative of one upload, then its manifest
+
+    Runs in a pool process. Images are never upscaled; sizes larger than the
+    original are written at the original size. Returns the manifest.
+    """
+    with Image.open(original_path) as opened:
+        # Apply the EXIF orientation before the metadata is dropped
+        image = ImageOps.exif_transpose(opened)
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    # Derivatives are saved without exif/icc/comment info, which strips metadata
+    manifest = {'width': image.width, 'height': image.height, 'sizes': {}}
+    for size, box in SIZES.items():
+        variant = image.copy()
+        variant.thumbnail((box, box), Image.LANCZOS)
+        for ext, (image_format, options) in FORMATS.items():
+            output = _flatten(variant) if image_format == 'JPEG' else variant
+            _save_atomic(output, derivative_path(original_path, size, ext), image_format, options)
+        manifest['sizes'][size] = [variant.width, variant.height]
+
+    partial = f"{manifest_path(original_path)}.{os.getpid()}.tmp"
+    with open(partial, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(partial, manifest_path(original_path))
+    return manifest
+
+
+class ImagePipeline:
+    """Queues derivative generation and resolves derivative URLs for templates"""
+
+    def __init__(self, static_root, max_workers, logger):
+        self.static_root = static_root
+        self.pool = ProcessPool(max_workers)
+        self.logger = logger
+        # Uploads are named by content hash, so a manifest never changes once written
+        self._manifests = {}
+
+    def submit(self, original_path):
+        """Generate derivatives for a saved upload in the process pool"""
+        future = self.pool.submit(generate_derivatives, original_path)
+        future.add_done_callback(lambda f: self._log_failure(original_path, f))
+        return future
+
+    def _log_failure(self, original_path, future):
+        error = future.exception()
+        if error is not None:
+            self.logger.error(f'Error generating image derivatives for {original_path}: {str(error)}')
+
+    def forget(self, url):
+        """Drop the cached manifest of an upload that has been deleted"""
+        self._manifests.pop(url, None)
+
+    def manifest(self, url):
+        """The derivative manifest for an upload URL, or None until it is ready"""
+        manifest = self._manifests.get(url)
+        if manifest is None:
+            path = url_to_path(self.static_root, url)
+            if path is None:
+                return None
+            try:
+                with open(manifest_path(path)) as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                return None
+            self._manifests[url] = manifest
+        return manifest
+
+    def variant_url(self, url, size='card', ext='jpg'):
+        """URL of one derivative, or the original URL while derivatives are pending"""
+        if not self.manifest(url):
+            return url
+        return derivative_path(url, size, ext)
+
+    def srcset(self, url, ext='webp'):
+        """``srcset`` value listing every derivative width ('' while pending)"""
+        manifest = self.manifest(url)
+        if not manifest:
+            return ''
+        candidates = {}
+        for size, (width, _) in manifest['sizes'].items():
+            candidates.setdefault(width, derivative_path(url, size, ext))
+        return ', '.join(f'{candidate} {width}w' for width, candidate in sorted(candidates.items()))
@@ -0,0 +1,184 @@
+"""
+Inventory reservations for Future Mech
+Cart quantities are held against car_parts.stock for a limited time so
+concurrent buyers cannot oversell a part between add-to-cart and checkout.
+
+A hold takes its quantity out of car_parts.stock immediately (with a guarded
+``stock >= qty`` update) and records it in inventory_reservations. Checkout
+turns the holds into a sale, and the sweeper puts expired holds back.
+All writes are single-row or keyed UPDATEs, so only the affected rows are
+locked and busy parts do not serialize behind a table lock.
+"""
+
+import threading
+import time
+from collections import defaultdict
+
+
+class InsufficientStock(Exception):
+    """Raised when a stock decrement would take a part below zero"""
+
+
+def _stock_cases(items):
+    """CASE expression and parameters mapping part id to quantity"""
+    cases = ' '.join(['WHEN %s THEN %s'] * len(items))
+    params = [value for part_id, quantity in items for value in (part_id, quantity)]
+    return f'(CASE id {cases} END)', params
+
+
+def decrement_stock(cur, items):
+    """Decrement stock for (part_id, quantity) pairs with one guarded UPDATE
+
+    Every row must satisfy stock >= quantity; if any does not, nothing the
+    caller's transaction has done should be kept, so InsufficientStock is raised.
+    """
+    # Sorted so concurrent checkouts lock rows in the same order
+    items = sorted((part_id, quantity) for part_id, quantity in items if quantity > 0)
+    if not items:
+        return
+    case_sql, case_params = _stock_cases(items)
+    placeholders = ','.join(['%s'] * len(items))
+    cur.execute(f"""
+        UPDATE car_parts
+        SET stock = stock - {case_sql}
+        WHERE id IN ({placeholders}) AND stock >= {case_sql}
+    """, case_params + [part_id for part_id, _ in items] + case_params)
+    if cur.rowcount != len(items):
+        raise InsufficientStock(f'{len(items) - cur.rowcount} item(s) would oversell')
+
+
+def increment_stock(cur, items):
+    """Put (part_id, quantity) pairs back into stock with one UPDATE"""
+    items = sorted((part_id, quantity) for part_id, quantity in items if quantity > 0)
+    if not items:
+        return
+    case_sql, case_params = _stock_cases(items)
+    placeholders = ','.join(['%s'] * len(items))
+    cur.execute(f"""
+        UPDATE car_parts
+        SET stock = stock + {case_sql}
+        WHERE id IN ({placeholders})
+    """, case_params + [part_id for part_id, _ in items])
+
+
+def set_reservation(cur, user_id, part_id, quantity, ttl_minutes):
+    """Make the user's hold on a part exactly ``quantity`` and refresh its expiry
+
+    Only the difference from the current hold touches car_parts.stock.
+    Raises InsufficientStock if the extra quantity is not available.
+    """
+    cur.execute("""
+        SELECT id, quantity FROM inventory_reservations
+        WHERE user_id = %s AND part_id = %s
+        FOR UPDATE
+    """, (user_id, part_id))
+    reservation = cur.fetchone()
+    held = reservation['quantity'] if reservation else 0
+
+    delta = quantity - held
+    if delta > 0:
+        decrement_stock(cur, [(part_id, delta)])
+    elif delta < 0:
+        increment_stock(cur, [(part_id, -delta)])
+
+    if quantity <= 0:
+        if reservation:
+            cur.execute("DELETE FROM inventory_reservations WHERE id = %s", (reservation['id'],))
+    elif reservation:
+        cur.execute("""
+            UPDATE inventory_reservations
+            SET quantity = %s, expires_at = NOW() + INTERVAL %s MINUTE
+            WHERE id = %s
+        """, (quantity, ttl_minutes, reservation['id']))
+    else:
+        cur.execute("""
+            INSERT INTO inventory_reservations (user_id, part_id, quantity, expires_at)
+            VALUES (%s, %s, %s, NOW() + INTERVAL %s MINUTE)
+        """, (user_id, part_id, quantity, ttl_minutes))
+
+
+def convert_reservations(cur, user_id, items):
+    """Turn the user's holds into a sale of (part_id, quantity) pairs
+
+    Lines without a (large enough) hold are taken from stock with a guarded
+    decrement; holds larger than the sale, or for parts not being bought,
+    are returned to stock. All of the user's holds are consumed.
+    """
+    cur.execute("""
+        SELECT id, part_id, quantity FROM inventory_reservations
+        WHERE user_id = %s
+        FOR UPDATE
+    """, (user_id,))
+    reservations = cur.fetchall()
+    held = defaultdict(int)
+    for reservation in reservations:
+        held[reservation['part_id']] += reservation['quantity']
+
+    wanted = dict(items)
+    shortfall = [(part_id, quantity - held[part_id]) for part_id, quantity in wanted.items()]
+    surplus = [(part_id, quantity - wanted.get(part_id, 0)) for part_id, quantity in held.items()]
+    decrement_stock(cur, shortfall)
+    increment_stock(cur, surplus)
+
+    if reservations:
+        placeholders = ','.join(['%s'] * len(reservations))
+        cur.execute(f"DELETE FROM inventory_reservations WHERE id IN ({placeholders})",
+                    [reservation['id'] for reservation in reservations])
+
+
+def release_expired_reservations(conn, batch_size=500):
+    """Return expired holds to stock in bulk, one batch per transaction
+
+    SKIP LOCKED lets several workers sweep at once without waiting on each
+    other or on a checkout that is converting the same holds.
+    Returns the number of holds released.
+    """
+    released = 0
+    while True:
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT id, part_id, quantity FROM inventory_reservations
+                WHERE expires_at < NOW()
+                ORDER BY expires_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (batch_size,))
+            reservations = cur.fetchall()
+            if reservations:
+                totals = defaultdict(int)
+                for reservation in reservations:
+                    totals[reservation['part_id']] += reservation['quantity']
+                increment_stock(cur, list(totals.items()))
+
+                placeholders = ','.join(['%s'] * len(reservations))
+                cur.execute(f"DELETE FROM inventory_reservations WHERE id IN ({placeholders})",
+                            [reservation['id'] for reservation in reservations])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+        released += len(reservations)
+        if len(reservations) < batch_size:
+            return released
+
+
+def start_reservation_sweeper(db, interval, logger, batch_size=500):
+    """Run release_expired_reservations every ``interval`` seconds in a daemon thread"""
+    def sweep():
+        while True:
+            time.sleep(interval)
+            try:
+                with db.pool.connection() as conn:
+                    released = release_expired_reservations(conn, batch_size)
+                if released:
+                    logger.info(f'Released {released} expired inventory reservation(s)')
+            except Exception as e:
+                logger.error(f'Reservation sweeper error: {str(e)}')
+
+    thread = threading.Thread(target=sweep, name='reservation-sweeper', daemon=True)
+    thread.start()
+    return thread
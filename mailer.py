@@ -0,0 +1,211 @@
+"""
+Email outbox for Future Mech
+Request handlers only insert a row into email_outbox. A separate worker
+process (``flask send-emails``) drains it in batches over one reused SMTP
+connection and retries failed messages with exponential backoff, so a slow
+or unreachable SMTP server never adds latency to a request.
+"""
+
+import os
+import smtplib
+import time
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+
+MAX_BACKOFF = 3600  # seconds
+
+
+def enqueue_email(cur, to, subject, body, attachment=None):
+    """Queue one message; runs on the caller's cursor so it commits with the write"""
+    cur.execute("""
+        INSERT INTO email_outbox (recipient, subject, body, attachment_path)
+        VALUES (%s, %s, %s, %s)
+    """, (to, subject, body, attachment))
+    return cur.lastrowid
+
+
+def enqueue_emails(cur, messages):
+    """Queue many (to, subject, body, attachment) messages with one multi-row INSERT"""
+    if messages:
+        cur.executemany("""
+            INSERT INTO email_outbox (recipient, subject, body, attachment_path)
+            VALUES (%s, %s, %s, %s)
+        """, messages)
+
+
+def build_message(sender, row):
+    msg = MIMEMultipart()
+    msg['From'] = sender
+    msg['To'] = row['recipient']
+    msg['Subject'] = row['subject']
+    msg.attach(MIMEText(row['body'], 'html'))
+
+    attachment = row.get('attachment_path')
+    if attachment and os.path.exists(attachment):
+        with open(attachment, 'rb') as f:
+            attach = MIMEApplication(f.read(), _subtype="pdf")
+            attach.add_header('Content-Disposition', 'attachment', filename=os.path.basename(attachment))
+            msg.attach(attach)
+    return msg
+
+
+class SMTPSession:
+    """One SMTP connection kept open across batches
+
+    The connection is opened lazily, reopened once if the server has dropped
+    it, and closed after ``idle_timeout`` seconds without a send.
+    """
+
+    def __init__(self, host, port, use_tls=True, username=None, password=None,
+                 timeout=30, idle_timeout=60):
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._server = None
+        self._last_used = 0.0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config['MAIL_SERVER'],
+            config['MAIL_PORT'],
+            use_tls=config.get('MAIL_USE_TLS', True),
+            username=config.get('MAIL_USERNAME'),
+            password=config.get('MAIL_PASSWORD'),
+            timeout=config.get('MAIL_SMTP_TIMEOUT', 30),
+            idle_timeout=config.get('MAIL_SMTP_IDLE_TIMEOUT', 60),
+        )
+
+    def open(self):
+        if self._server is not None:
+            return
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                server.starttls()
+            if self.username and self.password:
+                server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+        self._server = server
+        self._last_used = time.monotonic()
+
+    def send(self, msg):
+        self.open()
+        try:
+            self._server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            self.close()
+            self.open()
+            self._server.send_message(msg)
+        self._last_used = time.monotonic()
+
+    def close_if_idle(self):
+        if self._server is not None and time.monotonic() - self._last_used >= self.idle_timeout:
+            self.close()
+
+    def close(self):
+        server, self._server = self._server, None
+        if server is None:
+            return
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+
+def deliver_batch(conn, smtp, sender, batch_size=50, max_attempts=6, backoff=60):
+    """Send up to ``batch_size`` due messages in one transaction
+
+    Rows are claimed with SKIP LOCKED so several workers can drain the outbox
+    side by side. A message that fails is retried after ``backoff`` seconds,
+    doubling per attempt, and marked failed after ``max_attempts``.
+    Returns (sent, failed).
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT id, recipient, subject, body, attachment_path, attempts
+            FROM email_outbox
+            WHERE status = 'pending' AND next_attempt_at <= NOW()
+            ORDER BY next_attempt_at, id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """, (batch_size,))
+        rows = cur.fetchall()
+        if not rows:
+            conn.commit()
+            return 0, 0
+        # Connect only once there is mail; if the server is unreachable the
+        # rollback below releases the claimed rows untouched
+        smtp.open()
+
+        sent, failures = [], []
+        for row in rows:
+            try:
+                smtp.send(build_message(sender, row))
+                sent.append(row['id'])
+            except Exception as e:
+                attempts = row['attempts'] + 1
+                delay = min(backoff * 2 ** row['attempts'], MAX_BACKOFF)
+                status = 'failed' if attempts >= max_attempts else 'pending'
+                failures.append((status, str(e)[:500], delay, row['id']))
+
+        if sent:
+            placeholders = ','.join(['%s'] * len(sent))
+            cur.execute(f"""
+                UPDATE email_outbox
+                SET status = 'sent', attempts = attempts + 1, sent_at = NOW(), last_error = NULL
+                WHERE id IN ({placeholders})
+            """, sent)
+        if failures:
+            cur.executemany("""
+                UPDATE email_outbox
+                SET status = %s, attempts = attempts + 1, last_error = %s,
+                    next_attempt_at = NOW() + INTERVAL %s SECOND
+                WHERE id = %s
+            """, failures)
+        conn.commit()
+        return len(sent), len(failures)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def run_outbox_worker(db, config, logger, once=False):
+    """Drain email_outbox until stopped (or until it is empty when ``once`` is set)"""
+    smtp = SMTPSession.from_config(config)
+    batch_size = config['MAIL_OUTBOX_BATCH_SIZE']
+    try:
+        while True:
+            try:
+                with db.pool.connection() as conn:
+                    sent, failed = deliver_batch(
+                        conn, smtp, config['MAIL_DEFAULT_SENDER'], batch_size,
+                        max_attempts=config['MAIL_OUTBOX_MAX_ATTEMPTS'],
+                        backoff=config['MAIL_OUTBOX_RETRY_BACKOFF'])
+                if sent or failed:
+                    logger.info(f'Email outbox: {sent} sent, {failed} failed')
+            except Exception as e:
+                logger.error(f'Email outbox worker error: {str(e)}')
+                smtp.close()
+                if once:
+                    raise
+                sent = failed = 0
+
+            if sent + failed < batch_size:
+                if once:
+                    return
+                smtp.close_if_idle()
+                time.sleep(config['MAIL_OUTBOX_POLL_INTERVAL'])
+    finally:
+        smtp.close()
@@ -0,0 +1,227 @@
+"""
+Notification read state for Future Mech
+Notifications are addressed to a role ('admin', 'service', 'client' or 'all').
+Instead of one notification_reads row per click, each user has a single
+notification_read_state row holding
+
+- read_through_id: every notification the user can see up to this id is read
+- read_ids: the few ids above the watermark read out of order
+- read_count: how many visible notifications the user has read in total
+
+Marking a notification read adds it to read_ids and then moves the watermark
+past every read id that directly follows it, so read_ids stays small. Ids
+younger than SETTLE_SECONDS stay in read_ids: a lower id from a concurrent
+insert may not have committed yet, and passing it would hide it for good.
+Unread lookups only scan notifications above the watermark, and the unread
+count is the role's running total from notification_counts minus read_count:
+two primary-key lookups however long the user's read history is.
+
+Deploying this over the old one-row-per-read notification_reads table
+requires running ``flask backfill-notifications``, which rebuilds the role
+totals and seeds each reader's state from their notification_reads rows.
+Until it has run, every user sees their whole history as unread.
+"""
+
+import json
+
+
+MAX_READ_IDS = 500  # ids kept above the watermark; older ones are folded into it
+SETTLE_SECONDS = 5  # the watermark only passes notifications at least this old
+
+
+def _visible_roles(role):
+    return (role, 'all') if role != 'all' else ('all',)
+
+
+def record_notification(cur, role, message, notification_type, related_id=None):
+    """Insert a notification and bump its role's running total; runs on the caller's cursor"""
+    cur.execute("""
+        INSERT INTO notifications (role, message, type, related_id, created_at)
+        VALUES (%s, %s, %s, %s, NOW())
+    """, (role, message, notification_type, related_id))
+    notification_id = cur.lastrowid
+    cur.execute("""
+        INSERT INTO notification_counts (role, total) VALUES (%s, 1)
+        ON DUPLICATE KEY UPDATE total = total + 1
+    """, (role,))
+    return notification_id
+
+
+def load_read_state(cur, user_id, for_update=False):
+    """(read_through_id, set of read ids above it, read_count) for one user"""
+    cur.execute(f"""
+        SELECT read_through_id, read_ids, read_count FROM notification_read_state
+        WHERE user_id = %s{' FOR UPDATE' if for_update else ''}
+    """, (user_id,))
+    row = cur.fetchone()
+    if not row:
+        return 0, set(), 0
+    return row['read_through_id'], set(json.loads(row['read_ids'] or '[]')), row['read_count']
+
+
+def _save_read_state(cur, user_id, read_through_id, read_ids, read_count):
+    cur.execute("""
+        INSERT INTO notification_read_state (user_id, read_through_id, read_ids, read_count)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE read_through_id = VALUES(read_through_id),
+                                read_ids = VALUES(read_ids), read_count = VALUES(read_count)
+    """, (user_id, read_through_id, json.dumps(sorted(read_ids)), read_count))
+
+
+def unread_notifications(cur, user_id, role, limit=10):
+    """Newest unread notifications visible to ``role``, scanning only ids above the watermark"""
+    read_through_id, read_ids, _ = load_read_state(cur, user_id)
+    roles = _visible_roles(role)
+    placeholders = ','.join(['%s'] * len(roles))
+    cur.execute(f"""
+        SELECT id, role, message, type, related_id, created_at FROM notifications
+        WHERE role IN ({placeholders}) AND id > %s
+        ORDER BY id DESC LIMIT %s
+    """, list(roles) + [read_through_id, limit + len(read_ids)])
+    return [n for n in cur.fetchall() if n['id'] not in read_ids][:limit]
+
+
+def unread_count(cur, user_id, role):
+    """Number of unread notifications visible to ``role`` (two primary-key lookups)"""
+    roles = _visible_roles(role)
+    placeholders = ','.join(['%s'] * len(roles))
+    cur.execute(f"""
+        SELECT (SELECT COALESCE(SUM(total), 0) FROM notification_counts WHERE role IN ({placeholders})) AS total,
+               (SELECT read_count FROM notification_read_state WHERE user_id = %s) AS read_count
+    """, list(roles) + [user_id])
+    row = cur.fetchone()
+    return max(int(row['total']) - (row['read_count'] or 0), 0)
+
+
+def _advance_watermark(cur, role, read_through_id, read_ids):
+    """Move the watermark past settled read ids that directly follow it; returns (watermark, remaining ids)"""
+    roles = _visible_roles(role)
+    placeholders = ','.join(['%s'] * len(roles))
+    while read_ids:
+        cur.execute(f"""
+            SELECT id, created_at < NOW() - INTERVAL %s SECOND AS settled
+            FROM notifications WHERE role IN ({placeholders}) AND id > %s
+            ORDER BY id LIMIT %s
+        """, [SETTLE_SECONDS] + list(roles) + [read_through_id, min(len(read_ids), 100)])
+        next_rows = cur.fetchall()
+        for row in next_rows:
+            if row['id'] not in read_ids or not row['settled']:
+                return read_through_id, read_ids
+            read_ids.discard(row['id'])
+            read_through_id = row['id']
+        if not next_rows:
+            break
+    # Nothing visible lies above the watermark, so any ids left over have been deleted
+    return read_through_id, set()
+
+
+def mark_read(cur, user_id, role, notification_id):
+    """Mark one notification read for a user; returns False if it was already read or is not visible"""
+    roles = _visible_roles(role)
+    placeholders = ','.join(['%s'] * len(roles))
+    cur.execute(f"SELECT id FROM notifications WHERE id = %s AND role IN ({placeholders})",
+                [notification_id] + list(roles))
+    if not cur.fetchone():
+        return False
+
+    # Creates the row if needed so the FOR UPDATE below always has something to lock
+    cur.execute("INSERT IGNORE INTO notification_read_state (user_id) VALUES (%s)", (user_id,))
+    read_through_id, read_ids, read_count = load_read_state(cur, user_id, for_update=True)
+    if notification_id <= read_through_id or notification_id in read_ids:
+        return False
+
+    read_ids.add(notification_id)
+    read_through_id, read_ids = _advance_watermark(cur, role, read_through_id, read_ids)
+    if len(read_ids) > MAX_READ_IDS:
+        # Fold the oldest exceptions into the watermark, treating the unread ids below them as read
+        cutoff = sorted(read_ids)[-MAX_READ_IDS - 1]
+        cur.execute(f"""
+            SELECT COUNT(*) AS skipped FROM notifications
+            WHERE role IN ({placeholders}) AND id > %s AND id <= %s
+        """, list(roles) + [read_through_id, cutoff])
+        skipped = cur.fetchone()['skipped'] - sum(1 for i in read_ids if i <= cutoff)
+        read_count += skipped
+        read_ids = {i for i in read_ids if i > cutoff}
+        read_through_id = cutoff
+    _save_read_state(cur, user_id, read_through_id, read_ids, read_count + 1)
+    return True
+
+
+def rebuild_notification_read_state(conn):
+    """Seed notification_read_state from the legacy notification_reads table; returns the number of users
+
+    Merges with any state already recorded, so it is safe to run again after
+    users have marked notifications read under the new scheme.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("SHOW TABLES LIKE 'notification_reads'")
+        if not cur.fetchone():
+            return 0
+        cur.execute("""
+            SELECT r.user_id, u.role, r.notification_id
+            FROM notification_reads r
+            JOIN users u ON r.user_id = u.id
+        """)
+        readers = {}
+        for row in cur.fetchall():
+            readers.setdefault(row['user_id'], (row['role'], set()))[1].add(row['notification_id'])
+
+        visible = {}  # role -> [(id, settled)] in id order
+        for user_id, (role, read) in readers.items():
+            if role not in visible:
+                roles = _visible_roles(role)
+                placeholders = ','.join(['%s'] * len(roles))
+                cur.execute(f"""
+                    SELECT id, created_at < NOW() - INTERVAL %s SECOND AS settled
+                    FROM notifications WHERE role IN ({placeholders}) ORDER BY id
+                """, [SETTLE_SECONDS] + list(roles))
+                visible[role] = [(row['id'], bool(row['settled'])) for row in cur.fetchall()]
+
+            old_through_id, old_ids, _ = load_read_state(cur, user_id, for_update=True)
+            read |= old_ids
+            read_through_id, read_ids, read_count, contiguous = 0, set(), 0, True
+            for notification_id, settled in visible[role]:
+                if notification_id <= old_through_id or notification_id in read:
+                    read_count += 1
+                    if contiguous and settled:
+                        read_through_id = notification_id
+                    else:
+                        read_ids.add(notification_id)
+                else:
+                    contiguous = False
+            if len(read_ids) > MAX_READ_IDS:
+                # Same folding as mark_read: unread ids below the cutoff count as read
+                cutoff = sorted(read_ids)[-MAX_READ_IDS - 1]
+                read_count += sum(1 for notification_id, _ in visible[role]
+                                  if read_through_id < notification_id <= cutoff and notification_id not in read_ids)
+                read_ids = {i for i in read_ids if i > cutoff}
+                read_through_id = cutoff
+            _save_read_state(cur, user_id, read_through_id, read_ids, read_count)
+            # One user per transaction, so live mark_read calls only wait on their own row
+            conn.commit()
+        return len(readers)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def rebuild_notification_counts(conn):
+    """Recompute notification_counts from the notifications table; returns the number of roles"""
+    cur = conn.cursor()
+    try:
+        cur.execute("DELETE FROM notification_counts")
+        cur.execute("""
+            INSERT INTO notification_counts (role, total)
+            SELECT role, COUNT(*) FROM notifications GROUP BY role
+        """)
+        roles = cur.rowcount
+        conn.commit()
+        return roles
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
@@ -0,0 +1,145 @@
+"""
+Keyset (cursor) pagination for Future Mech list pages
+Pages are addressed by the sort key of the last row seen rather than an
+OFFSET, so every page is an index range scan no matter how deep it is.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+
+class Page:
+    """One page of rows plus the cursors to reach its neighbours"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None, page_size=DEFAULT_PAGE_SIZE):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.page_size = page_size
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Clamp a requested page size to 1..maximum"""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
+
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD filter value, returning None if it is missing or malformed"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def encode_cursor(values, direction):
+    payload = json.dumps({'v': values, 'd': direction}, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return (values, direction) or (None, 'next') for a missing or tampered cursor"""
+    if not token:
+        return None, 'next'
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values, direction = payload['v'], payload['d']
+        if not isinstance(values, list) or direction not in ('next', 'prev'):
+            raise ValueError('bad cursor')
+        return values, direction
+    except (ValueError, KeyError, TypeError):
+        return None, 'next'
+
+
+def _seek_condition(columns, descending):
+    """Expanded row comparison (a, b) </> (x, y) that MySQL can drive from an index
+
+    Returns SQL with two parameters per level, e.g. for two columns:
+    (a < %s OR (a = %s AND b < %s))
+    """
+    op = '<' if descending else '>'
+    clauses = []
+    for i, column in enumerate(columns):
+        equals = [f'{prev} = %s' for prev in columns[:i]]
+        clauses.append('(' + ' AND '.join(equals + [f'{column} {op} %s']) + ')')
+    return '(' + ' OR '.join(clauses) + ')'
+
+
+def _seek_params(values):
+    params = []
+    for i in range(len(values)):
+        params.extend(values[:i])
+        params.append(values[i])
+    return params
+
+
+def fetch_page(cur, select_sql, sort_keys, conditions=None, params=None,
+               cursor=None, page_size=DEFAULT_PAGE_SIZE, descending=True):
+    """Run ``select_sql`` as one keyset page
+
+    ``select_sql`` is a SELECT ... FROM ... JOIN ... without WHERE/ORDER BY.
+    ``sort_keys`` is a list of (sql_column, row_key) pairs that together are
+    unique, e.g. [('b.created_at', 'created_at'), ('b.id', 'id')]; a matching
+    composite index makes each page a short range scan.
+    """
+    conditions = list(conditions or [])
+    params = list(params or [])
+    columns = [column for column, _ in sort_keys]
+    values, direction = decode_cursor(cursor)
+    if values is not None and len(values) != len(columns):
+        values, direction = None, 'next'
+
+    # Walking backwards flips both the seek comparison and the sort order
+    backwards = direction == 'prev' and values is not None
+    scan_descending = descending != backwards
+    if values is not None:
+        conditions.append(_seek_condition(columns, scan_descending))
+        params.extend(_seek_params(values))
+
+    order = ' DESC' if scan_descending else ' ASC'
+    sql = select_sql
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += ' ORDER BY ' + ', '.join(column + order for column in columns)
+    sql += ' LIMIT %s'
+    params.append(page_size + 1)
+
+    cur.execute(sql, params)
+    rows = list(cur.fetchall())
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    def key(row):
+        return [row[row_key] for _, row_key in sort_keys]
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if backwards:
+            next_cursor = encode_cursor(key(rows[-1]), 'next')
+            prev_cursor = encode_cursor(key(rows[0]), 'prev') if has_more else None
+        else:
+            next_cursor = encode_cursor(key(rows[-1]), 'next') if has_more else None
+            prev_cursor = encode_cursor(key(rows[0]), 'prev') if values is not None else None
+    return Page(rows, next_cursor, prev_cursor, page_size)
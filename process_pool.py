@@ -0,0 +1,65 @@
+"""
+Process pools for Future Mech
+CPU-heavy work (report rendering, image resizing) runs in a
+ProcessPoolExecutor owned by each web worker process, so it never competes
+with request handling for the GIL.
+
+Children are started through a forkserver (spawn where that is missing)
+rather than forked from the web worker, which by then runs request, SSE and
+outbox threads: a fork can copy a lock one of them holds and leave the child
+deadlocked on it. Submitted functions must therefore be module-level and
+live in modules that import without the Flask app.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+def process_context():
+    """Multiprocessing context for worker children: forkserver, or spawn where that is missing"""
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method)
+
+
+class ProcessPool:
+    """ProcessPoolExecutor created on first use and rebuilt after a fork
+
+    Like the MySQL pool, each gunicorn worker gets its own executor rather
+    than inheriting the master's, and a pool broken by a dead child process
+    (e.g. OOM-killed) is replaced on the next submit.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        pid = os.getpid()
+        if self._executor is None or self._pid != pid:
+            with self._lock:
+                if self._executor is None or self._pid != pid:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=process_context())
+                    self._pid = pid
+        return self._executor
+
+    def _reset(self, broken):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False)
+
+    def submit(self, fn, *args):
+        executor = self.executor
+        try:
+            return executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._reset(executor)
+            return self.executor.submit(fn, *args)
@@ -0,0 +1,434 @@
+"""
+PDI report generation for Future Mech
+Reports are rendered with ReportLab in a process pool so a burst of
+end-of-day reports never ties up the web workers. Every request becomes a
+row in report_jobs that the status endpoint polls; when rendering finishes
+the PDF is recorded in reports and emailed through the outbox.
+
+PDFs are content-addressed: the file name carries a hash of every booking
+field that feeds the report, so an unchanged booking reuses its existing
+PDF instead of rendering a new one.
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.lib.enums import TA_CENTER
+
+from mailer import enqueue_email, enqueue_emails
+from process_pool import ProcessPool, process_context
+
+
+BOOKING_QUERY = """
+    SELECT b.*, u.username, u.email, u.phone, s.name as service_name, s.price, s.description
+    FROM bookings b
+    JOIN users u ON b.user_id = u.id
+    JOIN services s ON b.service_id = s.id
+    WHERE b.id = %s
+"""
+
+
+# Bump when the report layout changes so existing PDFs stop matching
+TEMPLATE_VERSION = 1
+
+# Booking row fields rendered into the PDI report
+FINGERPRINT_FIELDS = ('id', 'username', 'email', 'phone', 'scheduled_date', 'service_name',
+                      'description', 'price', 'status', 'notes')
+
+
+def report_fingerprint(booking):
+    """SHA-256 of the template version and every booking field the report shows"""
+    payload = [TEMPLATE_VERSION] + [booking.get(field) for field in FINGERPRINT_FIELDS]
+    return hashlib.sha256(json.dumps(payload, default=str).encode()).hexdigest()
+
+
+def report_filename(booking_id, content_hash):
+    return f"PDI_Report_{booking_id}_{content_hash[:16]}.pdf"
+
+
+class ReportTemplate:
+    """Styles and static flowables shared by every PDI report
+
+    Building the sample stylesheet, ParagraphStyles and TableStyles is a
+    noticeable share of the cost of a one-page report, so they are built once
+    per process (see report_template) and reused by every render.
+    """
+
+    def __init__(self):
+        styles = getSampleStyleSheet()
+
+        self.title_style = ParagraphStyle(
+            'Title',
+            parent=styles['Heading1'],
+            fontSize=20,
+            textColor=colors.HexColor('#1e40af'),
+            spaceAfter=30,
+            alignment=TA_CENTER
+        )
+        self.footer_style = ParagraphStyle(
+            'Footer',
+            parent=styles['Normal'],
+            fontSize=10,
+            textColor=colors.HexColor('#6b7280'),
+            alignment=TA_CENTER
+        )
+        # Customer and service tables share one style
+        self.table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e5e7eb')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1e40af')),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+            ('GRID', (0, 0), (-1, -1), 1, colors.grey)
+        ])
+        self.col_widths = [2*inch, 4*inch]
+
+        # Static text never splits across pages, so the same flowables can be
+        # laid out again by each (sequential) build in this process
+        self.header = [
+            Paragraph("FUTURE MECH - SERVICE REPORT", self.title_style),
+            Spacer(1, 20),
+        ]
+        self.footer = [
+            Spacer(1, 30),
+            Paragraph("Thank you for choosing Future Mech!", self.footer_style),
+            Paragraph("Drive the Future with Precision and Power", self.footer_style),
+        ]
+
+    def table(self, data):
+        table = Table(data, colWidths=self.col_widths)
+        table.setStyle(self.table_style)
+        return table
+
+
+@lru_cache(maxsize=None)
+def report_template():
+    """The ReportTemplate for this process"""
+    return ReportTemplate()
+
+
+def build_pdi_story(booking, template):
+    """Flowables for one booking's PDI report"""
+    booking_id = booking['id']
+    story = list(template.header)
+
+    # Customer Information
+    story.append(template.table([
+        ['Customer Information', ''],
+        ['Name:', booking['username']],
+        ['Email:', booking['email']],
+        ['Phone:', booking['phone'] or 'N/A'],
+        ['Service Date:', booking['scheduled_date'].strftime('%B %d, %Y') if booking['scheduled_date'] else 'N/A'],
+        ['Report ID:', f'FM-{booking_id:06d}']
+    ]))
+    story.append(Spacer(1, 20))
+
+    # Service Details
+    story.append(template.table([
+        ['Service Details', ''],
+        ['Service:', booking['service_name']],
+        ['Description:', booking['description']],
+        ['Price:', f"${booking['price']}"],
+        ['Status:', booking['status'].replace('_', ' ').title()],
+        ['Notes:', booking['notes'] or 'No additional notes']
+    ]))
+    story.append(Spacer(1, 20))
+
+    story.extend(template.footer)
+    story.append(Paragraph(f"Generated on: {datetime.now().strftime('%B %d, %Y at %I:%M %p')}", template.footer_style))
+    return story
+
+
+def write_pdi_report(booking, target, template=None):
+    """Build the PDI report for one booking row into a filename or file object"""
+    doc = SimpleDocTemplate(target, pagesize=A4)
+    doc.build(build_pdi_story(booking, template or report_template()))
+
+
+def render_pdi_report(booking, output_dir, content_hash):
+    """Write the PDI report PDF for one booking row and return its path
+
+    Runs in a pool process, so it only touches its arguments and the filesystem.
+    The PDF is written to a temporary name and moved into place, so two renders
+    of the same version never expose a half-written file.
+    """
+    filename = os.path.join(output_dir, report_filename(booking['id'], content_hash))
+    if os.path.exists(filename):
+        return filename
+    partial = f"{filename}.{os.getpid()}.tmp"
+    try:
+        write_pdi_report(booking, partial)
+        os.replace(partial, filename)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return filename
+
+
+def find_cached_report(cur, booking_id, content_hash):
+    """Id and path of an existing PDF for this booking version, marking it as used"""
+    cur.execute("""
+        SELECT id, pdf_path FROM reports
+        WHERE booking_id = %s AND report_type = 'pdi' AND content_hash = %s
+    """, (booking_id, content_hash))
+    report = cur.fetchone()
+    if not report or not os.path.exists(report['pdf_path']):
+        return None
+    cur.execute("UPDATE reports SET last_requested_at = NOW() WHERE id = %s", (report['id'],))
+    return report
+
+
+def record_report(cur, booking_id, path, content_hash, generated_by):
+    """Insert (or refresh) the reports row for one PDF version and return its id"""
+    cur.execute("""
+        INSERT INTO reports (booking_id, report_type, pdf_path, content_hash, generated_by)
+        VALUES (%s, 'pdi', %s, %s, %s)
+        ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id), pdf_path = VALUES(pdf_path),
+                                last_requested_at = NOW()
+    """, (booking_id, path, content_hash, generated_by))
+    return cur.lastrowid
+
+
+def report_email(booking, path):
+    """(to, subject, body, attachment) for a finished report"""
+    email_body = f"""
+    <h2>Your Service Report is Ready</h2>
+    <p>Your report for {booking['service_name']} is attached.</p>
+    """
+    return booking['email'], 'Service Report - Future Mech', email_body, path
+
+
+def queue_report_email(cur, booking, path, report_id):
+    enqueue_email(cur, *report_email(booking, path))
+    cur.execute("UPDATE reports SET status = 'sent' WHERE id = %s AND status = 'generated'", (report_id,))
+
+
+def evict_stale_reports(conn, retention_days, batch_size=500):
+    """Delete superseded report versions and their files
+
+    For each booking the most recently requested version is always kept;
+    older versions (including pre-hash timestamped PDFs) go once they have not
+    been requested for ``retention_days``. Returns the number evicted.
+    """
+    evicted = 0
+    while True:
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT id, pdf_path FROM (
+                    SELECT id, pdf_path, last_requested_at,
+                           ROW_NUMBER() OVER (PARTITION BY booking_id, report_type
+                                              ORDER BY last_requested_at DESC, id DESC) AS version_rank
+                    FROM reports
+                ) versions
+                WHERE version_rank > 1 AND last_requested_at < NOW() - INTERVAL %s DAY
+                LIMIT %s
+            """, (retention_days, batch_size))
+            stale = cur.fetchall()
+            if stale:
+                placeholders = ','.join(['%s'] * len(stale))
+                cur.execute(f"DELETE FROM reports WHERE id IN ({placeholders})", [report['id'] for report in stale])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+        # Files go only after their rows are gone, so a download never finds a row without a file
+        for report in stale:
+            try:
+                os.remove(report['pdf_path'])
+            except FileNotFoundError:
+                pass
+        evicted += len(stale)
+        if len(stale) < batch_size:
+            return evicted
+
+
+COMPLETED_BOOKINGS_QUERY = """
+    SELECT b.*, u.username, u.email, u.phone, s.name as service_name, s.price, s.description
+    FROM bookings b
+    JOIN users u ON b.user_id = u.id
+    JOIN services s ON b.service_id = s.id
+    WHERE b.status = 'completed' AND b.completed_at >= %s AND b.completed_at < %s
+    ORDER BY b.completed_at, b.id
+"""
+
+
+def _report_statuses(cur, booking_ids, chunk_size=1000):
+    """{(booking_id, content_hash): status} for existing PDI report versions"""
+    statuses = {}
+    for i in range(0, len(booking_ids), chunk_size):
+        chunk = booking_ids[i:i + chunk_size]
+        placeholders = ','.join(['%s'] * len(chunk))
+        cur.execute(f"""
+            SELECT booking_id, content_hash, status FROM reports
+            WHERE report_type = 'pdi' AND content_hash IS NOT NULL AND booking_id IN ({placeholders})
+        """, chunk)
+        for row in cur.fetchall():
+            statuses[(row['booking_id'], row['content_hash'])] = row['status']
+    return statuses
+
+
+def _record_batch(conn, finished, generated_by):
+    """Record and email one chunk of rendered reports in a single transaction"""
+    cur = conn.cursor()
+    try:
+        cur.executemany("""
+            INSERT INTO reports (booking_id, report_type, pdf_path, content_hash, generated_by, status)
+            VALUES (%s, 'pdi', %s, %s, %s, 'sent')
+            ON DUPLICATE KEY UPDATE pdf_path = VALUES(pdf_path), last_requested_at = NOW(),
+                                    status = IF(status = 'generated', 'sent', status)
+        """, [(booking['id'], path, content_hash, generated_by) for booking, content_hash, path in finished])
+        enqueue_emails(cur, [report_email(booking, path) for booking, _, path in finished])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def generate_report_batch(conn, date_from, date_to, output_dir, generated_by,
+                          workers=None, resend=False, chunk_size=50, progress=None):
+    """Render and email PDI reports for every booking completed in [date_from, date_to]
+
+    Bookings come from one query and render across ``workers`` processes
+    (default: one per CPU). Results are committed every ``chunk_size``
+    reports, and a booking whose current version was already sent is skipped
+    unless ``resend`` is set, so an interrupted run can simply be repeated.
+    ``progress(done, total, elapsed)`` is called after each chunk.
+    Returns a dict of counts and timings.
+    """
+    started = time.monotonic()
+    cur = conn.cursor()
+    try:
+        cur.execute(COMPLETED_BOOKINGS_QUERY, (date_from, date_to + timedelta(days=1)))
+        bookings = cur.fetchall()
+        statuses = _report_statuses(cur, [booking['id'] for booking in bookings])
+    finally:
+        cur.close()
+
+    pending, skipped = [], 0
+    for booking in bookings:
+        content_hash = report_fingerprint(booking)
+        if not resend and statuses.get((booking['id'], content_hash)) in ('sent', 'downloaded'):
+            skipped += 1
+        else:
+            pending.append((booking, content_hash))
+
+    result = {'selected': len(bookings), 'skipped': skipped, 'rendered': 0, 'reused': 0,
+              'emailed': 0, 'failed': 0}
+    finished = []
+    # The CLI has imported the app and its background threads, so don't fork
+    with ProcessPoolExecutor(max_workers=workers, mp_context=process_context()) as executor:
+        futures = {}
+        for booking, content_hash in pending:
+            # An interrupted run leaves finished PDFs behind; those only need recording
+            exists = os.path.exists(os.path.join(output_dir, report_filename(booking['id'], content_hash)))
+            future = executor.submit(render_pdi_report, booking, output_dir, content_hash)
+            futures[future] = (booking, content_hash, exists)
+
+        done = 0
+        for future in as_completed(futures):
+            booking, content_hash, exists = futures[future]
+            done += 1
+            try:
+                finished.append((booking, content_hash, future.result()))
+                result['reused' if exists else 'rendered'] += 1
+            except Exception:
+                result['failed'] += 1
+            if len(finished) >= chunk_size or done == len(futures):
+                if finished:
+                    _record_batch(conn, finished, generated_by)
+                    result['emailed'] += len(finished)
+                    finished = []
+                if progress:
+                    progress(done, len(futures), time.monotonic() - started)
+
+    result['elapsed'] = time.monotonic() - started
+    return result
+
+
+class ReportJobQueue:
+    """Renders reports off the request thread in a per-worker process pool
+
+    Job state lives in report_jobs so any worker can answer a status poll.
+    """
+
+    def __init__(self, db, max_workers, output_dir, logger):
+        self.db = db
+        self.pool = ProcessPool(max_workers)
+        self.output_dir = output_dir
+        self.logger = logger
+
+    def submit(self, booking, requested_by):
+        """Start a report job for ``booking``; returns (job_id, report_id)
+
+        If a PDF for this exact booking version already exists, the job is
+        recorded as done straight away and its report id is returned;
+        otherwise report_id is None and rendering continues in the pool.
+        """
+        content_hash = report_fingerprint(booking)
+        with self.db.transaction() as cur:
+            cached = find_cached_report(cur, booking['id'], content_hash)
+            if cached:
+                cur.execute("""
+                    INSERT INTO report_jobs (booking_id, report_type, requested_by, status, report_id, finished_at)
+                    VALUES (%s, 'pdi', %s, 'done', %s, NOW())
+                """, (booking['id'], requested_by, cached['id']))
+                queue_report_email(cur, booking, cached['pdf_path'], cached['id'])
+                return cur.lastrowid, cached['id']
+
+            cur.execute("""
+                INSERT INTO report_jobs (booking_id, report_type, requested_by)
+                VALUES (%s, 'pdi', %s)
+            """, (booking['id'], requested_by))
+            job_id = cur.lastrowid
+
+        future = self.pool.submit(render_pdi_report, booking, self.output_dir, content_hash)
+        future.add_done_callback(lambda f: self._finish(job_id, booking, content_hash, requested_by, f))
+        return job_id, None
+
+    def _finish(self, job_id, booking, content_hash, requested_by, future):
+        """Record the outcome of a render; runs on the executor's callback thread"""
+        error = future.exception()
+        try:
+            with self.db.pool.connection() as conn:
+                cur = conn.cursor()
+                try:
+                    if error is not None:
+                        cur.execute("""
+                            UPDATE report_jobs SET status = 'failed', error = %s, finished_at = NOW()
+                            WHERE id = %s
+                        """, (str(error)[:500], job_id))
+                    else:
+                        path = future.result()
+                        report_id = record_report(cur, booking['id'], path, content_hash, requested_by)
+                        cur.execute("""
+                            UPDATE report_jobs SET status = 'done', report_id = %s, finished_at = NOW()
+                            WHERE id = %s
+                        """, (report_id, job_id))
+                        queue_report_email(cur, booking, path, report_id)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    cur.close()
+        except Exception as e:
+            self.logger.error(f'Error recording report job {job_id}: {str(e)}')
+        if error is not None:
+            self.logger.error(f'Error generating PDI report for booking {booking["id"]}: {str(error)}')
@@ -0,0 +1,93 @@
+"""
+HTTP response helpers for Future Mech
+Compact JSON encoding, ETag / If-None-Match revalidation, gzip, and
+streamed file downloads.
+"""
+
+import gzip
+import json
+import os
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from urllib.parse import quote
+
+from flask import request, current_app, send_file
+
+
+GZIP_MIN_SIZE = 1024
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8', 'replace')
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def dumps(payload):
+    """Compact JSON: no whitespace, ISO dates, decimals as numbers"""
+    return json.dumps(payload, default=_default, separators=(',', ':'))
+
+
+def gzip_response(response):
+    """Gzip a response body in place when the client accepts it and it is worth it"""
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or 'gzip' not in request.headers.get('Accept-Encoding', '').lower()):
+        return response
+    body = response.get_data()
+    if len(body) < GZIP_MIN_SIZE:
+        return response
+    response.set_data(gzip.compress(body, compresslevel=6))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def json_response(payload, max_age=0, public=False):
+    """JSON response that answers 304 to a matching If-None-Match and is gzipped otherwise
+
+    The ETag is computed from the uncompressed body and marked weak so it
+    stays valid across the gzip and identity encodings. ``public`` lets
+    shared caches keep it too (only for payloads that are the same for
+    every user).
+    """
+    response = current_app.response_class(dumps(payload), mimetype='application/json')
+    response.add_etag(weak=True)
+    if public:
+        response.cache_control.public = True
+    else:
+        response.cache_control.private = True
+    if max_age:
+        response.cache_control.max_age = max_age
+    else:
+        response.cache_control.no_cache = True
+    response.make_conditional(request)
+    return gzip_response(response)
+
+
+def file_response(path, mimetype, download_name, accel_root=None, accel_prefix=None):
+    """Download response for a file on disk that never reads it into Python
+
+    With ``accel_prefix`` set the body is handed to the front proxy: nginx
+    gets an X-Accel-Redirect to ``accel_prefix`` plus the path relative to
+    ``accel_root`` and serves it (sendfile, Range and conditional GET) itself.
+    Otherwise send_file streams it through wsgi.file_wrapper, which gunicorn
+    turns into sendfile(), and answers If-None-Match, If-Modified-Since and
+    Range requests with 304 / 206.
+    """
+    if accel_prefix:
+        relative = os.path.relpath(os.path.abspath(path), os.path.abspath(accel_root or '.'))
+        response = current_app.response_class(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + quote(relative.replace(os.sep, '/'))
+        response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+    else:
+        response = send_file(os.path.abspath(path), mimetype=mimetype, as_attachment=True,
+                             download_name=download_name, conditional=True, etag=True, max_age=0)
+    response.cache_control.private = True
+    return response
@@ -38,7 +38,8 @@ CREATE TABLE services (
     is_featured BOOLEAN DEFAULT FALSE,
     image_url VARCHAR(255),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    change_version BIGINT NOT NULL DEFAULT 0
 );
 
 -- Car parts table
@@ -51,11 +52,15 @@ CREATE TABLE car_parts (
     category VARCHAR(100),
     brand VARCHAR(100),
     part_number VARCHAR(100),
-    compatibility TEXT, -- JSON string for vehicle compatibility
+    compatibility TEXT, -- free text or JSON list of vehicles the part fits (parsed by compatibility.py)
     image_url VARCHAR(255),
     is_active BOOLEAN DEFAULT TRUE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    change_version BIGINT NOT NULL DEFAULT 0,
+    KEY idx_car_parts_change_version (change_version),
+    -- Fallback search when SEARCH_INDEX_ENABLED is off
+    FULLTEXT KEY ft_car_parts_search (name, part_number, brand, compatibility, description)
 );
 
 -- Vehicles table
@@ -77,6 +82,7 @@ CREATE TABLE bookings (
     service_id INT NOT NULL,
     vehicle_id INT,
     assigned_to INT, -- service person
+    previous_assigned_to INT, -- service person before the last reassignment, so their dashboard drops the job
     status ENUM('pending', 'confirmed', 'in_progress', 'completed', 'cancelled') DEFAULT 'pending',
     scheduled_date DATETIME,
     completed_at TIMESTAMP NULL,
@@ -86,10 +92,12 @@ CREATE TABLE bookings (
     payment_status ENUM('pending', 'paid', 'refunded') DEFAULT 'pending',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    change_version BIGINT NOT NULL DEFAULT 0,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (service_id) REFERENCES services(id) ON DELETE CASCADE,
     FOREIGN KEY (vehicle_id) REFERENCES vehicles(id) ON DELETE SET NULL,
-    FOREIGN KEY (assigned_to) REFERENCES users(id) ON DELETE SET NULL
+    FOREIGN KEY (assigned_to) REFERENCES users(id) ON DELETE SET NULL,
+    FOREIGN KEY (previous_assigned_to) REFERENCES users(id) ON DELETE SET NULL
 );
 
 -- Orders table
@@ -107,6 +115,7 @@ CREATE TABLE orders (
     notes TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    change_version BIGINT NOT NULL DEFAULT 0,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
@@ -122,6 +131,97 @@ CREATE TABLE order_items (
     FOREIGN KEY (part_id) REFERENCES car_parts(id) ON DELETE CASCADE
 );
 
+-- Inventory reservations table (time-limited cart holds already taken out of car_parts.stock)
+CREATE TABLE inventory_reservations (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    part_id INT NOT NULL,
+    quantity INT NOT NULL,
+    expires_at DATETIME NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_reservations_user_part (user_id, part_id),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (part_id) REFERENCES car_parts(id) ON DELETE CASCADE
+);
+
+-- Daily revenue rollup (one row per order day, updated when an order is paid)
+CREATE TABLE daily_revenue (
+    day DATE PRIMARY KEY,
+    paid_revenue DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    paid_orders INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Daily metrics rollup for admin analytics (bookings, service_bookings per service, new_customers)
+CREATE TABLE daily_metrics (
+    day DATE NOT NULL,
+    metric VARCHAR(32) NOT NULL,
+    dimension VARCHAR(64) NOT NULL DEFAULT '',
+    value DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, metric, dimension)
+);
+
+-- Outgoing email queue, drained by the outbox worker (flask send-emails)
+CREATE TABLE email_outbox (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    recipient VARCHAR(255) NOT NULL,
+    subject VARCHAR(255) NOT NULL,
+    body MEDIUMTEXT NOT NULL,
+    attachment_path VARCHAR(500),
+    status ENUM('pending', 'sent', 'failed') DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    last_error VARCHAR(500),
+    next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Last change version handed out per entity (see changes.py)
+CREATE TABLE change_versions (
+    entity VARCHAR(32) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+-- Deleted car parts, stamped with the car_parts version of the delete so
+-- every worker's search index drops them on its next sync (see search.py)
+CREATE TABLE car_part_deletions (
+    part_id INT PRIMARY KEY,
+    change_version BIGINT NOT NULL,
+    deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    KEY idx_car_part_deletions_change_version (change_version)
+);
+
+-- Events pushed to open /api/events streams (pruned by flask prune-events)
+CREATE TABLE events (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    event_type VARCHAR(32) NOT NULL,
+    audience_roles VARCHAR(64) NOT NULL DEFAULT '',
+    audience_user_id INT NULL,
+    payload TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    KEY idx_events_created_at (created_at)
+);
+
+-- Content-addressed image uploads (one row per stored file)
+CREATE TABLE uploaded_images (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    url VARCHAR(255) NOT NULL UNIQUE,
+    sha256 CHAR(64) NOT NULL,
+    size INT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Services and car parts using each stored image; a file is deleted with its last reference
+CREATE TABLE image_refs (
+    owner_type ENUM('service', 'car_part') NOT NULL,
+    owner_id INT NOT NULL,
+    image_url VARCHAR(255) NOT NULL,
+    PRIMARY KEY (owner_type, owner_id),
+    KEY idx_image_refs_url (image_url)
+);
+
 -- Discounts table
 CREATE TABLE discounts (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -174,13 +274,32 @@ CREATE TABLE reports (
     booking_id INT NOT NULL,
     report_type ENUM('pdi', 'job_card', 'inspection') DEFAULT 'pdi',
     pdf_path VARCHAR(500) NOT NULL,
+    content_hash CHAR(64),  -- SHA-256 of the booking fields rendered into the PDF
     generated_by INT NOT NULL,
     status ENUM('generated', 'sent', 'downloaded') DEFAULT 'generated',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_requested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_reports_version (booking_id, report_type, content_hash),
     FOREIGN KEY (booking_id) REFERENCES bookings(id) ON DELETE CASCADE,
     FOREIGN KEY (generated_by) REFERENCES users(id) ON DELETE CASCADE
 );
 
+-- Report generation jobs (rendered off-request by the report process pool)
+CREATE TABLE report_jobs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    booking_id INT NOT NULL,
+    report_type ENUM('pdi', 'job_card', 'inspection') DEFAULT 'pdi',
+    requested_by INT NOT NULL,
+    status ENUM('queued', 'done', 'failed') DEFAULT 'queued',
+    report_id INT,
+    error VARCHAR(500),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP NULL,
+    FOREIGN KEY (booking_id) REFERENCES bookings(id) ON DELETE CASCADE,
+    FOREIGN KEY (requested_by) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (report_id) REFERENCES reports(id) ON DELETE SET NULL
+);
+
 -- Inspection reports table
 CREATE TABLE inspection_reports (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -211,13 +330,27 @@ CREATE TABLE booking_parts (
 -- Notifications table
 CREATE TABLE notifications (
     id INT AUTO_INCREMENT PRIMARY KEY,
-    user_id INT NOT NULL,
-    title VARCHAR(255) NOT NULL,
+    role VARCHAR(20) NOT NULL,
     message TEXT NOT NULL,
-    type ENUM('info', 'success', 'warning', 'error') DEFAULT 'info',
-    is_read BOOLEAN DEFAULT FALSE,
-    action_url VARCHAR(500),
+    type VARCHAR(32) NOT NULL DEFAULT 'system',
+    related_id INT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    change_version BIGINT NOT NULL DEFAULT 0
+);
+
+-- Running number of notifications per audience role (unread count = total - read_count)
+CREATE TABLE notification_counts (
+    role VARCHAR(20) PRIMARY KEY,
+    total INT NOT NULL DEFAULT 0
+);
+
+-- Per-user read state: everything visible up to read_through_id is read, plus the sparse read_ids above it
+CREATE TABLE notification_read_state (
+    user_id INT PRIMARY KEY,
+    read_through_id INT NOT NULL DEFAULT 0,
+    read_ids TEXT,
+    read_count INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
@@ -236,17 +369,39 @@ CREATE INDEX idx_users_role ON users(role);
 CREATE INDEX idx_bookings_user_id ON bookings(user_id);
 CREATE INDEX idx_bookings_status ON bookings(status);
 CREATE INDEX idx_bookings_scheduled_date ON bookings(scheduled_date);
+CREATE INDEX idx_bookings_status_completed_at ON bookings(status, completed_at);
 CREATE INDEX idx_orders_user_id ON orders(user_id);
 CREATE INDEX idx_orders_payment_status ON orders(payment_status);
+CREATE INDEX idx_orders_created_at ON orders(created_at);
 CREATE INDEX idx_car_parts_category ON car_parts(category);
 CREATE INDEX idx_car_parts_is_active ON car_parts(is_active);
+CREATE INDEX idx_reservations_expires_at ON inventory_reservations(expires_at);
+CREATE INDEX idx_email_outbox_status_next ON email_outbox(status, next_attempt_at);
 CREATE INDEX idx_services_is_active ON services(is_active);
 CREATE INDEX idx_services_is_featured ON services(is_featured);
 CREATE INDEX idx_vehicles_user_id ON vehicles(user_id);
 CREATE INDEX idx_payments_order_id ON payments(order_id);
 CREATE INDEX idx_payments_booking_id ON payments(booking_id);
-CREATE INDEX idx_notifications_user_id ON notifications(user_id);
-CREATE INDEX idx_notifications_is_read ON notifications(is_read);
+CREATE INDEX idx_notifications_role_id ON notifications(role, id);
+
+-- Dashboard change feeds (/api/dashboard/changes)
+CREATE INDEX idx_bookings_change_version ON bookings(change_version);
+CREATE INDEX idx_bookings_assigned_change_version ON bookings(assigned_to, change_version);
+CREATE INDEX idx_bookings_previous_assigned_change_version ON bookings(previous_assigned_to, change_version);
+CREATE INDEX idx_bookings_user_change_version ON bookings(user_id, change_version);
+CREATE INDEX idx_orders_change_version ON orders(change_version);
+CREATE INDEX idx_orders_user_change_version ON orders(user_id, change_version);
+CREATE INDEX idx_notifications_change_version ON notifications(change_version);
+
+-- Composite indexes for keyset pagination of admin list pages
+CREATE INDEX idx_users_created_id ON users(created_at, id);
+CREATE INDEX idx_users_role_created_id ON users(role, created_at, id);
+CREATE INDEX idx_bookings_created_id ON bookings(created_at, id);
+CREATE INDEX idx_bookings_status_created_id ON bookings(status, created_at, id);
+CREATE INDEX idx_orders_status_created_id ON orders(payment_status, created_at, id);
+CREATE INDEX idx_car_parts_name_id ON car_parts(name, id);
+CREATE INDEX idx_services_name_id ON services(name, id);
+CREATE INDEX idx_discounts_created_id ON discounts(created_at, id);
 
 -- Insert default services
 INSERT INTO services (name, description, price, duration, service_type, is_featured) VALUES
@@ -0,0 +1,533 @@
+"""
+Car parts search for Future Mech
+An in-process inverted index over name, part number, brand, compatibility
+and description replaces ``LIKE '%term%'`` table scans. Every query word is
+matched as a prefix (so "brak pa" finds "Brake Pads"), all words must match,
+and results are ranked by field weight and term rarity.
+
+Each web worker holds its own index. Writes stamp car_parts.change_version
+(see changes.py); before searching, a worker compares its version with
+change_versions at most once per ``sync_interval`` seconds and re-indexes
+only the rows that changed. Deleted parts are dropped at once by the worker
+that deleted them and by the others through the car_part_deletions
+tombstones, which carry the car_parts version of the delete.
+
+The same sync feeds the vehicle CompatibilityIndex (see compatibility.py)
+and SuggestIndex, which answers /api/search/suggest from
+sorted key lists of part names, part numbers, brands and service names
+without touching MySQL. Services carry their own change version and are
+reloaded in full (there are only a handful) whenever it moves.
+"""
+
+import heapq
+import math
+import operator
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from operator import itemgetter
+
+from compatibility import CompatibilityIndex
+
+
+# Relative weight of a match in each indexed column
+FIELD_WEIGHTS = {
+    'name': 5.0,
+    'part_number': 4.0,
+    'brand': 3.0,
+    'compatibility': 2.0,
+    'description': 1.0,
+}
+INDEX_FIELDS = tuple(FIELD_WEIGHTS)
+
+# A prefix match scores this fraction of an exact word match
+PREFIX_FACTOR = 0.7
+# Query words shorter than this only match whole words
+MIN_PREFIX_LENGTH = 2
+# Most index terms one query word may expand to
+MAX_PREFIX_TERMS = 500
+# Recent results kept per index (cleared on every change)
+RESULT_CACHE_SIZE = 256
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+INDEX_QUERY = f"SELECT id, category, is_active, {', '.join(INDEX_FIELDS)} FROM car_parts"
+SERVICES_QUERY = "SELECT id, name, is_active FROM services"
+
+# Suggestion kinds, most important first
+SUGGEST_KINDS = {'service': 4, 'part': 3, 'brand': 2, 'part_number': 1}
+# Shortest prefix worth suggesting for
+SUGGEST_MIN_LENGTH = 2
+# Keys examined per kind for one prefix
+SUGGEST_SCAN = 1000
+# Recent suggestion lists kept (cleared on every change)
+SUGGEST_CACHE_SIZE = 1024
+
+
+def tokenize(text):
+    """Lower-case, accent-free alphanumeric words of ``text``"""
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii')
+    return TOKEN_RE.findall(text.lower())
+
+
+def document_terms(part):
+    """term -> weight for one part (the heaviest field a term appears in wins)"""
+    terms = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        words = tokenize(part.get(field))
+        if field == 'part_number' and len(words) > 1:
+            # "BP-1234" is also searchable as "bp1234"
+            words.append(''.join(words))
+        for word in words:
+            if terms.get(word, 0) < weight:
+                terms[word] = weight
+    return terms
+
+
+class SearchIndex:
+    """Inverted index of car parts with prefix lookup over a sorted term list"""
+
+    def __init__(self):
+        self._postings = {}     # term -> {part_id: weight}
+        self._terms = []        # sorted list of every term, for prefix ranges
+        self._docs = {}         # part_id -> terms
+        self._categories = {}   # category -> set of part ids
+        self._inactive = set()
+        self._results = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, part):
+        """Index (or re-index) one car_parts row"""
+        with self._lock:
+            self._remove(part['id'])
+            self._results.clear()
+            terms = document_terms(part)
+            for term, weight in terms.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    insort(self._terms, term)
+                postings[part['id']] = weight
+            self._docs[part['id']] = terms
+            self._categories.setdefault(part.get('category'), set()).add(part['id'])
+            if not part.get('is_active'):
+                self._inactive.add(part['id'])
+
+    def remove(self, part_id):
+        with self._lock:
+            self._remove(part_id)
+
+    def _remove(self, part_id):
+        terms = self._docs.pop(part_id, None)
+        if terms is None:
+            return
+        self._results.clear()
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(part_id, None)
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect_left(self._terms, term)]
+        for category, ids in list(self._categories.items()):
+            ids.discard(part_id)
+            if not ids:
+                del self._categories[category]
+        self._inactive.discard(part_id)
+
+    def replace_all(self, parts):
+        """Rebuild from scratch (built aside, then swapped in under the lock)"""
+        postings, docs, categories, inactive = {}, {}, {}, set()
+        for part in parts:
+            terms = document_terms(part)
+            for term, weight in terms.items():
+                postings.setdefault(term, {})[part['id']] = weight
+            docs[part['id']] = terms
+            categories.setdefault(part.get('category'), set()).add(part['id'])
+            if not part.get('is_active'):
+                inactive.add(part['id'])
+        terms = sorted(postings)
+        with self._lock:
+            self._postings, self._terms, self._docs = postings, terms, docs
+            self._categories, self._inactive = categories, inactive
+            self._results.clear()
+
+    def category_ids(self, category):
+        """Ids of the indexed parts in one category"""
+        with self._lock:
+            return set(self._categories.get(category, ()))
+
+    def _expand(self, word):
+        """Index terms matching one query word: (term, score factor) pairs"""
+        if len(word) < MIN_PREFIX_LENGTH:
+            return [(word, 1.0)] if word in self._postings else []
+        start = bisect_left(self._terms, word)
+        matches = []
+        for term in self._terms[start:start + MAX_PREFIX_TERMS]:
+            if not term.startswith(word):
+                break
+            matches.append((term, 1.0 if term == word else PREFIX_FACTOR))
+        return matches
+
+    def _matches(self, word, total):
+        """(boost, postings) of every index term matching one query word, lowest boost first"""
+        matches = []
+        for term, factor in self._expand(word):
+            postings = self._postings[term]
+            matches.append((factor * math.log(1 + total / len(postings)), postings))
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+    def search(self, query, category=None, limit=None, include_inactive=False):
+        """Part ids matching every word of ``query``, best first
+
+        Candidates are narrowed with set operations and scores are built with
+        map/zip over the survivors, so the per-part work stays in C. For each
+        word a part scores by the rarest index term it matches.
+        """
+        words = tuple(dict.fromkeys(tokenize(query)))
+        if not words:
+            return []
+        key = (words, category, limit, include_inactive)
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                self._results.move_to_end(key)
+                return list(cached)
+            ids = self._search(words, category, limit, include_inactive)
+            self._results[key] = ids
+            if len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+        return list(ids)
+
+    def _search(self, words, category, limit, include_inactive):
+        """Uncached search (caller holds the lock)"""
+        total = len(self._docs) or 1
+        expansions = []
+        for word in words:
+            matches = self._matches(word, total)
+            if not matches:
+                return []
+            expansions.append(matches)
+        # Intersect starting from the most selective word
+        expansions.sort(key=lambda matches: sum(len(postings) for _, postings in matches))
+
+        candidates = None
+        for matches in expansions:
+            if len(matches) == 1:
+                ids = matches[0][1].keys()
+            else:
+                ids = set().union(*(postings.keys() for _, postings in matches))
+            candidates = set(ids) if candidates is None else candidates & ids
+            if not candidates:
+                return []
+        if not include_inactive:
+            candidates -= self._inactive
+        if category:
+            candidates &= self._categories.get(category, set())
+        if not candidates:
+            return []
+
+        ids = list(candidates)
+        totals = None
+        for matches in expansions:
+            if len(matches) == 1:
+                boost, postings = matches[0]
+                scores = map(boost.__mul__, map(postings.__getitem__, ids))
+            else:
+                # Later (rarer) terms overwrite earlier ones
+                best = {}
+                for boost, postings in matches:
+                    hits = candidates & postings.keys()
+                    best.update(zip(hits, map(boost.__mul__, map(postings.__getitem__, hits))))
+                scores = map(best.__getitem__, ids)
+            totals = scores if totals is None else map(operator.add, totals, scores)
+        # Ties go to the lower id, so result order is stable
+        ranked = zip(totals, map(operator.neg, ids))
+        ranked = heapq.nlargest(limit, ranked) if limit else sorted(ranked, reverse=True)
+        return [-negated for _, negated in ranked]
+
+
+def normalize(text):
+    """Search words of ``text`` joined by single spaces"""
+    return ' '.join(tokenize(text))
+
+
+def _suggest_keys(kind, label_key):
+    """Keys a label is found under: itself and every word-suffix ("pads" finds "brake pads")"""
+    words = label_key.split(' ')
+    keys = {' '.join(words[i:]) for i in range(len(words))}
+    if kind == 'part_number' and len(words) > 1:
+        keys.add(''.join(words))
+    return keys
+
+
+def _contributions(source, row):
+    """(kind, label) suggestions one car_parts or services row provides"""
+    if not row.get('is_active'):
+        return []
+    if source == 'service':
+        return [('service', row.get('name'))]
+    return [('part', row.get('name')), ('brand', row.get('brand')), ('part_number', row.get('part_number'))]
+
+
+class SuggestIndex:
+    """Typeahead over catalog labels: one sorted (key, label) list per kind, searched with bisect
+
+    Identical labels are stored once with the number of rows sharing them,
+    which ranks a brand carried by many parts above one carried by few.
+    """
+
+    def __init__(self):
+        self._keys = {kind: [] for kind in SUGGEST_KINDS}  # kind -> sorted [(key, label_key)]
+        self._entries = {}    # (kind, label_key) -> [label, row count, first row id]
+        self._sources = {}    # ('part' | 'service', row id) -> entries the row contributes
+        self._results = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _add(self, kind, label, row_id):
+        label_key = normalize(label)
+        if not label_key:
+            return None
+        entry = self._entries.get((kind, label_key))
+        if entry is None:
+            self._entries[(kind, label_key)] = [str(label).strip(), 1, row_id]
+            for key in _suggest_keys(kind, label_key):
+                insort(self._keys[kind], (key, label_key))
+        else:
+            entry[1] += 1
+        return kind, label_key
+
+    def _release(self, source):
+        for kind, label_key in self._sources.pop(source, ()):
+            entry = self._entries[(kind, label_key)]
+            entry[1] -= 1
+            if entry[1]:
+                continue
+            del self._entries[(kind, label_key)]
+            keys = self._keys[kind]
+            for key in _suggest_keys(kind, label_key):
+                position = bisect_left(keys, (key, label_key))
+                if position < len(keys) and keys[position] == (key, label_key):
+                    del keys[position]
+
+    def _set(self, source, row):
+        self._release((source, row['id']))
+        added = [self._add(kind, label, row['id']) for kind, label in _contributions(source, row)]
+        self._sources[(source, row['id'])] = [entry for entry in added if entry]
+
+    def set_part(self, part):
+        with self._lock:
+            self._set('part', part)
+            self._results.clear()
+
+    def remove_part(self, part_id):
+        with self._lock:
+            self._release(('part', part_id))
+            self._results.clear()
+
+    def set_services(self, services):
+        """Replace every service suggestion with ``services``"""
+        with self._lock:
+            for source in [source for source in self._sources if source[0] == 'service']:
+                self._release(source)
+            for service in services:
+                self._set('service', service)
+            self._results.clear()
+
+    def replace_all(self, parts, services):
+        """Rebuild from scratch (built aside, then swapped in under the lock)"""
+        entries, sources = {}, {}
+        for source, rows in (('part', parts), ('service', services)):
+            for row in rows:
+                contributed = []
+                for kind, label in _contributions(source, row):
+                    label_key = normalize(label)
+                    if not label_key:
+                        continue
+                    entry = entries.get((kind, label_key))
+                    if entry is None:
+                        entries[(kind, label_key)] = [str(label).strip(), 1, row['id']]
+                    else:
+                        entry[1] += 1
+                    contributed.append((kind, label_key))
+                sources[(source, row['id'])] = contributed
+        keys = {kind: [] for kind in SUGGEST_KINDS}
+        for kind, label_key in entries:
+            keys[kind].extend((key, label_key) for key in _suggest_keys(kind, label_key))
+        for kind_keys in keys.values():
+            kind_keys.sort()
+        with self._lock:
+            self._keys, self._entries, self._sources = keys, entries, sources
+            self._results.clear()
+
+    def suggest(self, query, limit=8):
+        """Up to ``limit`` {'text', 'kind'} suggestions (plus 'id' for services) for what has been typed so far"""
+        prefix = normalize(query)
+        if len(prefix) < SUGGEST_MIN_LENGTH:
+            return []
+        key = (prefix, limit)
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is None:
+                cached = self._results[key] = self._suggest(prefix, limit)
+                if len(self._results) > SUGGEST_CACHE_SIZE:
+                    self._results.popitem(last=False)
+            else:
+                self._results.move_to_end(key)
+        return [dict(suggestion) for suggestion in cached]
+
+    def _suggest(self, prefix, limit):
+        """Uncached lookup (caller holds the lock)
+
+        Labels that start with the prefix beat those matched on a later
+        word, then kind, then how many rows share the label, then length.
+        """
+        ranked = []
+        for kind, weight in SUGGEST_KINDS.items():
+            keys = self._keys[kind]
+            start = bisect_left(keys, (prefix,))
+            seen = set()
+            for key, label_key in keys[start:start + SUGGEST_SCAN]:
+                if not key.startswith(prefix):
+                    break
+                if label_key in seen:
+                    continue
+                seen.add(label_key)
+                label, count, row_id = self._entries[(kind, label_key)]
+                ranked.append((label_key.startswith(prefix), weight, count, -len(label_key), label, kind, row_id))
+        suggestions = []
+        for *_, label, kind, row_id in heapq.nlargest(limit, ranked, key=itemgetter(0, 1, 2, 3)):
+            suggestion = {'text': label, 'kind': kind}
+            if kind == 'service':
+                suggestion['id'] = row_id
+            suggestions.append(suggestion)
+        return suggestions
+
+
+class CatalogSearch:
+    """A worker's search, compatibility and suggestion indexes kept in step with the catalog through change versions"""
+
+    def __init__(self, sync_interval=1.0, rebuild_interval=3600, logger=None):
+        self.index = SearchIndex()
+        self.fitments = CompatibilityIndex()
+        self.suggestions = SuggestIndex()
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self.logger = logger
+        self.version = None
+        self.services_version = None
+        self._checked_at = 0.0
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    def sync_due(self):
+        """Whether the next lookup should check change_versions first"""
+        return self.version is None or time.monotonic() - self._checked_at >= self.sync_interval
+
+    def sync(self, conn_factory):
+        """Bring the indexes up to date if the catalog changed (one key lookup, at most every sync_interval)
+
+        ``conn_factory`` is only called when a check is due, so lookups in
+        between never touch the database.
+        """
+        if not self.sync_due():
+            return
+        with self._lock:
+            if not self.sync_due():
+                return
+            now = time.monotonic()
+            cur = conn_factory().cursor()
+            try:
+                cur.execute("SELECT entity, version FROM change_versions WHERE entity IN ('car_parts', 'services')")
+                versions = {row['entity']: row['version'] for row in cur.fetchall()}
+                version, services_version = versions.get('car_parts', 0), versions.get('services', 0)
+                if self.version is None or now - self._built_at >= self.rebuild_interval:
+                    cur.execute(INDEX_QUERY)
+                    parts = cur.fetchall()
+                    cur.execute(SERVICES_QUERY)
+                    self.index.replace_all(parts)
+                    self.fitments.replace_all(parts)
+                    self.suggestions.replace_all(parts, cur.fetchall())
+                    self._built_at = now
+                    if self.logger:
+                        self.logger.info(f'Built car parts search index: {len(self.index)} part(s)')
+                else:
+                    if version > self.version:
+                        cur.execute(f"{INDEX_QUERY} WHERE change_version > %s", (self.version,))
+                        for part in cur.fetchall():
+                            self.index.add(part)
+                            self.fitments.add(part)
+                            self.suggestions.set_part(part)
+                        cur.execute("SELECT part_id FROM car_part_deletions WHERE change_version > %s", (self.version,))
+                        for row in cur.fetchall():
+                            self.forget_part(row['part_id'])
+                    if services_version != self.services_version:
+                        cur.execute(SERVICES_QUERY)
+                        self.suggestions.set_services(cur.fetchall())
+                self.version, self.services_version = version, services_version
+                self._checked_at = now
+            finally:
+                cur.close()
+
+    def expire(self):
+        """Check change_versions on the next lookup (call after a write this worker cannot apply itself)"""
+        self._checked_at = 0.0
+
+    def refresh_part(self, part):
+        """Re-index a part this worker has just written"""
+        self.index.add(part)
+        self.fitments.add(part)
+        self.suggestions.set_part(part)
+
+    def forget_part(self, part_id):
+        """Drop a part this worker has just deleted"""
+        self.index.remove(part_id)
+        self.fitments.remove(part_id)
+        self.suggestions.remove_part(part_id)
+
+    def search(self, conn_factory, query, category=None, limit=None):
+        self.sync(conn_factory)
+        return self.index.search(query, category=category, limit=limit)
+
+    def parts_for(self, conn_factory, vehicles, category=None):
+        """Ids of active parts that fit any of ``vehicles`` (optionally in one category)"""
+        self.sync(conn_factory)
+        part_ids = self.fitments.parts_for(vehicles)
+        if category:
+            part_ids &= self.index.category_ids(category)
+        return part_ids
+
+    def suggest(self, conn_factory, query, limit=8):
+        """Typeahead suggestions, served from memory"""
+        self.sync(conn_factory)
+        return self.suggestions.suggest(query, limit)
+
+
+def fulltext_search(cur, query, category=None, limit=None):
+    """MySQL FULLTEXT fallback with the same prefix-per-word semantics"""
+    words = tokenize(query)
+    if not words:
+        return []
+    sql = f"""
+        SELECT id FROM car_parts
+        WHERE is_active = TRUE AND MATCH({', '.join(INDEX_FIELDS)}) AGAINST (%s IN BOOLEAN MODE)
+    """
+    params = [' '.join(f'+{word}*' for word in words)]
+    if category:
+        sql += " AND category = %s"
+        params.append(category)
+    sql += f" ORDER BY MATCH({', '.join(INDEX_FIELDS)}) AGAINST (%s IN BOOLEAN MODE) DESC"
+    params.append(params[0])
+    if limit:
+        sql += " LIMIT %s"
+        params.append(limit)
+    cur.execute(sql, params)
+    return [row['id'] for row in cur.fetchall()]
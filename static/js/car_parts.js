@@ -9,11 +9,34 @@ $(document).ready(function() {
     });
     
     $('#clearFilters').on('click', function() {
+        if ($('#vehicleFilter').val()) {
+            // The vehicle filter is applied by the server
+            window.location.href = '/car_parts';
+            return;
+        }
         $('#partsSearch').val('');
         $('#categoryFilter').val('');
         filterParts();
     });
     
+    // Parts for my vehicle: reload with the vehicle (and category) applied on the server
+    $('#vehicleFilter').on('change', function() {
+        const params = new URLSearchParams(window.location.search);
+        const vehicle = $(this).val();
+        const category = $('#categoryFilter').val();
+        if (vehicle) {
+            params.set('vehicle', vehicle);
+        } else {
+            params.delete('vehicle');
+        }
+        if (category) {
+            params.set('category', category);
+        } else {
+            params.delete('category');
+        }
+        window.location.href = '/car_parts?' + params.toString();
+    });
+    
     function filterParts() {
         const searchTerm = $('#partsSearch').val().toLowerCase();
         const selectedCategory = $('#categoryFilter').val();
@@ -45,6 +68,124 @@ $(document).ready(function() {
         }
     }
     
+    // Typeahead: suggestions come from memory on the server and are cached by
+    // the browser, so the prefix is normalised to keep repeat URLs identical
+    const SUGGEST_MIN_LENGTH = 2;
+    const SUGGEST_DELAY = 150;
+    const SUGGESTION_KINDS = { service: 'Service', part: 'Part', brand: 'Brand', part_number: 'Part number' };
+    const $suggestions = $('#partsSuggestions');
+    let suggestTimer = null;
+    let suggestRequest = null;
+    let suggestionItems = [];
+    let activeSuggestion = -1;
+    
+    $('#partsSearch').on('input', function() {
+        clearTimeout(suggestTimer);
+        const prefix = $(this).val().trim().toLowerCase().replace(/\s+/g, ' ');
+        if (prefix.length < SUGGEST_MIN_LENGTH) {
+            hideSuggestions();
+            return;
+        }
+        suggestTimer = setTimeout(function() {
+            loadSuggestions(prefix);
+        }, SUGGEST_DELAY);
+    });
+    
+    $('#partsSearch').on('keydown', function(e) {
+        if (e.key === 'ArrowDown' || e.key === 'ArrowUp') {
+            if (!suggestionItems.length) return;
+            e.preventDefault();
+            const step = e.key === 'ArrowDown' ? 1 : -1;
+            activeSuggestion = (activeSuggestion + step + suggestionItems.length) % suggestionItems.length;
+            $suggestions.children().removeClass('active').eq(activeSuggestion).addClass('active');
+        } else if (e.key === 'Enter') {
+            e.preventDefault();
+            if (activeSuggestion >= 0) {
+                chooseSuggestion(suggestionItems[activeSuggestion]);
+            } else if ($(this).val().trim()) {
+                searchCatalog($(this).val().trim());
+            }
+        } else if (e.key === 'Escape') {
+            hideSuggestions();
+        }
+    });
+    
+    $('#partsSearch').on('blur', function() {
+        hideSuggestions();
+    });
+    
+    // mousedown rather than click so the choice lands before the input's blur hides the list
+    $suggestions.on('mousedown', '.list-group-item', function(e) {
+        e.preventDefault();
+        chooseSuggestion(suggestionItems[$(this).data('index')]);
+    });
+    
+    function loadSuggestions(prefix) {
+        if (suggestRequest) {
+            suggestRequest.abort();
+        }
+        suggestRequest = $.ajax({
+            url: '/api/search/suggest',
+            data: { q: prefix },
+            dataType: 'json',
+            success: function(response) {
+                if (response.success) {
+                    showSuggestions(response.suggestions);
+                }
+            },
+            complete: function() {
+                suggestRequest = null;
+            }
+        });
+    }
+    
+    function showSuggestions(suggestions) {
+        suggestionItems = suggestions;
+        activeSuggestion = -1;
+        $suggestions.empty();
+        suggestions.forEach(function(suggestion, index) {
+            $('<button type="button" class="list-group-item list-group-item-action" role="option">')
+                .attr('data-index', index)
+                .append($('<span>').text(suggestion.text))
+                .append($('<span class="suggestion-kind">').text(SUGGESTION_KINDS[suggestion.kind] || ''))
+                .appendTo($suggestions);
+        });
+        $suggestions.prop('hidden', suggestions.length === 0);
+    }
+    
+    function hideSuggestions() {
+        clearTimeout(suggestTimer);
+        if (suggestRequest) {
+            suggestRequest.abort();
+        }
+        suggestionItems = [];
+        activeSuggestion = -1;
+        $suggestions.prop('hidden', true).empty();
+    }
+    
+    function chooseSuggestion(suggestion) {
+        hideSuggestions();
+        if (suggestion.kind === 'service') {
+            window.location.href = '/services#service-' + suggestion.id;
+        } else {
+            $('#partsSearch').val(suggestion.text);
+            searchCatalog(suggestion.text);
+        }
+    }
+    
+    function searchCatalog(term) {
+        const params = new URLSearchParams({ search: term });
+        const category = $('#categoryFilter').val();
+        const vehicle = $('#vehicleFilter').val();
+        if (category) {
+            params.set('category', category);
+        }
+        if (vehicle) {
+            params.set('vehicle', vehicle);
+        }
+        window.location.href = '/car_parts?' + params.toString();
+    }
+    
     // Add to cart functionality
     $('.add-to-cart-btn').on('click', function() {
         const partId = $(this).data('part-id');
@@ -1,5 +1,9 @@
 // Admin Dashboard JavaScript
 $(document).ready(function() {
+    // Loaded bookings and orders, kept so pushed changes can be merged in
+    let bookingsData = [];
+    let ordersData = [];
+    
     // Initialize dashboard
     initializeDashboard();
     
@@ -201,7 +205,8 @@ $(document).ready(function() {
             url: '/api/admin/bookings',
             method: 'GET',
             success: function(data) {
-                renderBookingsGrid(data.bookings);
+                bookingsData = data.bookings;
+                renderBookingsGrid(bookingsData);
             },
             error: function(xhr, status, error) {
                 console.error('Error loading bookings:', error);
@@ -215,7 +220,8 @@ $(document).ready(function() {
             url: '/api/admin/orders',
             method: 'GET',
             success: function(data) {
-                renderOrdersTable(data.orders);
+                ordersData = data.orders;
+                renderOrdersTable(ordersData);
             },
             error: function(xhr, status, error) {
                 console.error('Error loading orders:', error);
@@ -750,13 +756,22 @@ $(document).ready(function() {
             loadAnalyticsData();
         });
         
-        // Auto-refresh data every 5 minutes
-        setInterval(function() {
-            const activeSection = $('.menu-item.active').data('section');
-            if (activeSection) {
-                loadSectionData(activeSection);
+        // Merge changed bookings and orders into the loaded lists instead of reloading them
+        futureMech.watchChanges(function(changes, reset) {
+            if (reset.includes('bookings')) {
+                loadBookingsData();
+            } else if (changes.bookings) {
+                bookingsData = futureMech.mergeRows(bookingsData, changes.bookings);
+                renderBookingsGrid(bookingsData);
+            }
+            
+            if (reset.includes('orders')) {
+                loadOrdersData();
+            } else if (changes.orders) {
+                ordersData = futureMech.mergeRows(ordersData, changes.orders);
+                renderOrdersTable(ordersData);
             }
-        }, 300000); // 5 minutes
+        });
     }
     
     function showNotifications() {
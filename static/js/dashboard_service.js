@@ -1,5 +1,10 @@
 // Service Person Dashboard JavaScript
 $(document).ready(function() {
+    // Loaded job lists, kept so pushed changes can be merged in
+    let assignedJobs = [];
+    let completedJobs = [];
+    let jobsLoaded = false;
+    
     // Initialize dashboard
     initializeDashboard();
     
@@ -113,13 +118,34 @@ $(document).ready(function() {
     }
     
     function initializeRealTimeUpdates() {
-        // Auto-refresh data every 2 minutes
-        setInterval(function() {
-            const activeSection = $('.menu-item.active').data('section');
-            if (activeSection) {
-                loadSectionData(activeSection);
+        // Merge changed bookings into the job lists instead of reloading them
+        futureMech.watchChanges(function(changes, reset) {
+            if (!jobsLoaded || reset.includes('bookings')) {
+                loadAssignedJobs();
+                loadCompletedJobs();
+            } else if (changes.bookings) {
+                applyJobChanges(changes.bookings);
             }
-        }, 120000); // 2 minutes
+        });
+    }
+    
+    function applyJobChanges(changed) {
+        changed.forEach(job => {
+            assignedJobs = assignedJobs.filter(j => j.id !== job.id);
+            completedJobs = completedJobs.filter(j => j.id !== job.id);
+            if (job.assigned_to !== userId) {
+                // Reassigned to someone else; the server only sends the id
+                return;
+            }
+            if (job.status === 'completed') {
+                completedJobs.unshift(job);
+            } else if (job.status !== 'cancelled') {
+                assignedJobs.push(job);
+            }
+        });
+        assignedJobs.sort((a, b) => new Date(a.scheduled_date) - new Date(b.scheduled_date));
+        renderAssignedJobs(assignedJobs);
+        renderCompletedJobs(completedJobs);
     }
     
     function loadSectionData(section) {
@@ -152,7 +178,9 @@ $(document).ready(function() {
             url: '/api/service/assigned_jobs',
             method: 'GET',
             success: function(data) {
-                renderAssignedJobs(data.jobs);
+                assignedJobs = data.jobs;
+                jobsLoaded = true;
+                renderAssignedJobs(assignedJobs);
             },
             error: function(xhr, status, error) {
                 console.error('Error loading assigned jobs:', error);
@@ -166,7 +194,8 @@ $(document).ready(function() {
             url: '/api/service/completed_jobs',
             method: 'GET',
             success: function(data) {
-                renderCompletedJobs(data.jobs);
+                completedJobs = data.jobs;
+                renderCompletedJobs(completedJobs);
             },
             error: function(xhr, status, error) {
                 console.error('Error loading completed jobs:', error);
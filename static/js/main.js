@@ -222,7 +222,6 @@ $(document).ready(function() {
             toast.fadeOut(() => toast.remove());
         }, duration);
     };
-}
 
 // Dark mode functions
 function initializeDarkMode() {
@@ -344,6 +343,57 @@ window.futureMech = {
         }
     },
     
+    // True while the /api/events stream is connected
+    liveUpdates: false,
+    
+    // Poll /api/dashboard/changes and call onChange(changes, reset) whenever something changed.
+    // Pushed events trigger a check at once; the timer only matters while the event stream is down.
+    watchChanges: function(onChange) {
+        let version = null;
+        let lastCheck = 0;
+        let pending = null;
+        
+        function check() {
+            lastCheck = Date.now();
+            $.ajax({
+                url: '/api/dashboard/changes',
+                method: 'GET',
+                data: version ? { since: version } : {},
+                success: function(data) {
+                    if (!data.success) return;
+                    const baseline = version === null;
+                    version = data.version;
+                    if (!baseline && (data.reset.length || Object.keys(data.changes).length)) {
+                        onChange(data.changes, data.reset);
+                    }
+                }
+            });
+        }
+        
+        $(document).on('futuremech:booking_created futuremech:booking_status futuremech:notification', function() {
+            // Coalesce bursts of events into one check
+            clearTimeout(pending);
+            pending = setTimeout(check, 300);
+        });
+        
+        setInterval(function() {
+            if (!futureMech.liveUpdates || Date.now() - lastCheck > 300000) {
+                check();
+            }
+        }, 30000);
+        
+        check();
+    },
+    
+    // Replace rows by id and put rows not seen before first (newest first)
+    mergeRows: function(rows, changed) {
+        const byId = {};
+        changed.forEach(row => byId[row.id] = row);
+        const known = new Set(rows.map(row => row.id));
+        const added = changed.filter(row => !known.has(row.id)).reverse();
+        return added.concat(rows.map(row => byId[row.id] || row));
+    },
+    
     // Hide loading overlay
     hideLoading: function() {
         $('.loading-overlay').fadeOut(() => $('.loading-overlay').remove());
@@ -376,14 +426,58 @@ window.futureMech = {
     }
 };
 
-// Add this to your main.js file
+// Live updates: notifications and booking changes arrive over /api/events.
+// Each event is re-triggered on document as 'futuremech:<type>' for dashboards;
+// futureMech.liveUpdates tells them whether they still need to poll.
+let notificationPoller = null;
+
 function setupNotifications() {
-    // Check for new notifications every 30 seconds
-    setInterval(checkNotifications, 30000);
+    if (!window.EventSource) {
+        startNotificationPolling();
+        return;
+    }
+    
+    const source = new EventSource('/api/events');
+    
+    source.addEventListener('open', function() {
+        futureMech.liveUpdates = true;
+        stopNotificationPolling();
+    });
+    
+    source.addEventListener('notification', function(e) {
+        const notification = JSON.parse(e.data);
+        showNotifications([notification]);
+        $(document).trigger('futuremech:notification', [notification]);
+    });
+    
+    ['booking_created', 'booking_status'].forEach(function(type) {
+        source.addEventListener(type, function(e) {
+            $(document).trigger('futuremech:' + type, [JSON.parse(e.data)]);
+        });
+    });
+    
+    source.addEventListener('error', function() {
+        // The browser reconnects by itself unless the server refused the stream
+        if (source.readyState === EventSource.CLOSED) {
+            futureMech.liveUpdates = false;
+            startNotificationPolling();
+        }
+    });
+}
+
+function startNotificationPolling() {
+    if (notificationPoller) return;
+    // Fallback: check for new notifications every 30 seconds
+    notificationPoller = setInterval(checkNotifications, 30000);
     // Initial check
     checkNotifications();
 }
 
+function stopNotificationPolling() {
+    clearInterval(notificationPoller);
+    notificationPoller = null;
+}
+
 function checkNotifications() {
     if (userRole === 'admin' || userRole === 'service') {
         $.ajax({
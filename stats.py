@@ -0,0 +1,169 @@
+"""
+Admin statistics for Future Mech
+All dashboard counters come from one conditional-aggregation query and are
+cached per worker process for a short time. Revenue figures come from the
+daily_revenue rollup, which is updated as orders are paid.
+"""
+
+import threading
+import time
+
+
+class SnapshotCache:
+    """Holds one computed value for ``ttl`` seconds with single-flight refresh
+
+    When the value is stale, the first caller recomputes it while concurrent
+    callers wait on the lock and then reuse the fresh value, so a burst of
+    requests triggers one computation.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._value = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def _fresh(self):
+        return self._value is not None and time.monotonic() < self._expires_at
+
+    def get(self, compute):
+        if self._fresh():
+            return self._value
+        with self._lock:
+            if not self._fresh():
+                self._value = compute()
+                self._expires_at = time.monotonic() + self.ttl
+            return self._value
+
+    def invalidate(self):
+        with self._lock:
+            self._value = None
+            self._expires_at = 0.0
+
+
+COUNTERS_QUERY = """
+    SELECT u.*, b.*, o.*, r.*
+    FROM (
+        SELECT COUNT(*) AS all_users,
+               COALESCE(SUM(role = 'client'), 0) AS all_clients,
+               COALESCE(SUM(role = 'service'), 0) AS all_service_persons,
+               COALESCE(SUM(role = 'client' AND is_active), 0) AS active_clients,
+               COALESCE(SUM(role = 'service' AND is_active), 0) AS active_service_persons,
+               COALESCE(SUM(role = 'admin' AND is_active), 0) AS active_admins
+        FROM users
+    ) u
+    CROSS JOIN (
+        SELECT COUNT(*) AS total_bookings,
+               COALESCE(SUM(status = 'pending'), 0) AS pending_bookings,
+               COALESCE(SUM(status = 'confirmed'), 0) AS confirmed_bookings,
+               COALESCE(SUM(status = 'in_progress'), 0) AS in_progress_bookings,
+               COALESCE(SUM(status = 'completed'), 0) AS completed_bookings,
+               COALESCE(SUM(status = 'cancelled'), 0) AS cancelled_bookings,
+               COALESCE(SUM(scheduled_date >= CURDATE() AND scheduled_date < CURDATE() + INTERVAL 1 DAY), 0) AS bookings_today
+        FROM bookings
+    ) b
+    CROSS JOIN (
+        SELECT COUNT(*) AS total_orders,
+               COALESCE(SUM(payment_status = 'pending'), 0) AS pending_orders,
+               COALESCE(SUM(payment_status = 'paid'), 0) AS paid_orders
+        FROM orders
+    ) o
+    CROSS JOIN (
+        SELECT COALESCE(SUM(paid_revenue), 0) AS total_revenue,
+               COALESCE(SUM(CASE WHEN day > CURDATE() - INTERVAL 30 DAY
+                                 THEN paid_revenue END), 0) AS monthly_revenue,
+               COALESCE(SUM(CASE WHEN day >= CURDATE() - INTERVAL (DAYOFMONTH(CURDATE()) - 1) DAY
+                                 THEN paid_revenue END), 0) AS revenue_this_month
+        FROM daily_revenue
+    ) r
+"""
+
+RECENT_BOOKINGS_QUERY = """
+    SELECT b.id, b.status, b.scheduled_date, b.total_amount, b.created_at,
+           u.username AS customer_name, u.username AS client_name, s.name AS service_name
+    FROM bookings b
+    JOIN users u ON b.user_id = u.id
+    JOIN services s ON b.service_id = s.id
+    ORDER BY b.created_at DESC LIMIT 5
+"""
+
+RECENT_ORDERS_QUERY = """
+    SELECT o.id, o.total_price, o.payment_status, o.shipping_status, o.created_at,
+           u.username, u.username AS customer_name
+    FROM orders o
+    JOIN users u ON o.user_id = u.id
+    ORDER BY o.created_at DESC LIMIT 5
+"""
+
+REVENUE_FIELDS = ('total_revenue', 'monthly_revenue', 'revenue_this_month')
+
+
+def load_admin_stats(conn):
+    """Compute the full admin statistics snapshot
+
+    Every counter comes from the single COUNTERS_QUERY; the two recent-activity
+    lists are small indexed LIMIT queries.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(COUNTERS_QUERY)
+        row = cur.fetchone()
+        stats = {key: (float(value) if key in REVENUE_FIELDS else int(value)) for key, value in row.items()}
+
+        cur.execute(RECENT_BOOKINGS_QUERY)
+        stats['recent_bookings'] = cur.fetchall()
+
+        cur.execute(RECENT_ORDERS_QUERY)
+        stats['recent_orders'] = cur.fetchall()
+    finally:
+        cur.close()
+    return stats
+
+
+def record_paid_order(cur, order_id):
+    """Add a newly paid order to its day's daily_revenue row
+
+    Runs on the caller's cursor so it commits with the status change.
+    """
+    cur.execute("""
+        INSERT INTO daily_revenue (day, paid_revenue, paid_orders)
+        SELECT DATE(created_at), total_price, 1 FROM orders WHERE id = %s
+        ON DUPLICATE KEY UPDATE
+            paid_revenue = paid_revenue + VALUES(paid_revenue),
+            paid_orders = paid_orders + VALUES(paid_orders)
+    """, (order_id,))
+
+
+def rebuild_daily_revenue(conn, since=None):
+    """Recompute daily_revenue from paid orders, optionally only from ``since`` onwards
+
+    Returns the number of days written.
+    """
+    cur = conn.cursor()
+    try:
+        if since:
+            cur.execute("DELETE FROM daily_revenue WHERE day >= %s", (since,))
+            cur.execute("""
+                INSERT INTO daily_revenue (day, paid_revenue, paid_orders)
+                SELECT DATE(created_at), SUM(total_price), COUNT(*)
+                FROM orders
+                WHERE payment_status = 'paid' AND created_at >= %s
+                GROUP BY DATE(created_at)
+            """, (since,))
+        else:
+            cur.execute("DELETE FROM daily_revenue")
+            cur.execute("""
+                INSERT INTO daily_revenue (day, paid_revenue, paid_orders)
+                SELECT DATE(created_at), SUM(total_price), COUNT(*)
+                FROM orders
+                WHERE payment_status = 'paid'
+                GROUP BY DATE(created_at)
+            """)
+        days = cur.rowcount
+        conn.commit()
+        return days
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()